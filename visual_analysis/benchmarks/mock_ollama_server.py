@@ -0,0 +1,222 @@
+"""
+Local stand-in for the Ollama HTTP API, for benchmarks without a GPU.
+
+Implements GET /, POST /api/chat and POST /api/generate (streaming NDJSON and
+non-streaming), with configurable prefill latency, generation speed, reply
+length, parallel slots (like OLLAMA_NUM_PARALLEL) and a one-time model load
+delay. Multi-image requests get a JSON array with one entry per image, the
+format generate_batch() asks for.
+
+Usage:
+    python visual_analysis/benchmarks/mock_ollama_server.py --port 11500 --latency 0.2 --tokens-per-sec 60
+
+    # or from Python
+    server = MockOllamaServer(latency=0.05, tokens_per_sec=500).start()
+    client = OllamaClient(base_url=server.url)
+    ...
+    server.stop()
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+
+class MockOllamaServer:
+    """Threaded fake Ollama server with tunable timing."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.05,
+                 latency_per_image: float = 0.0, tokens_per_sec: float = 200.0, reply_tokens: int = 40,
+                 num_parallel: int = 1, load_delay: float = 0.0):
+        """
+        Args:
+            host (str): Bind address
+            port (int): Port (0 picks a free one)
+            latency (float): Prefill time per request in seconds
+            latency_per_image (float): Extra prefill time per attached image
+            tokens_per_sec (float): Generation speed (also the NDJSON chunk rate)
+            reply_tokens (int): Tokens per reply (per image for multi-image requests)
+            num_parallel (int): Requests processed at once; others wait in a queue
+            load_delay (float): Delay added to the first request (cold model load)
+        """
+        self.latency = latency
+        self.latency_per_image = latency_per_image
+        self.tokens_per_sec = tokens_per_sec
+        self.reply_tokens = reply_tokens
+        self.load_delay = load_delay
+        self.slots = threading.BoundedSemaphore(max(1, num_parallel))
+        self.stats_lock = threading.Lock()
+        self.stats: Dict[str, int] = {"requests": 0, "images": 0, "pings": 0}
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockOllamaServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def _count(self, key: str, n: int = 1):
+        with self.stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + n
+
+    def _load_duration(self) -> float:
+        """Simulate the model being loaded by the first request."""
+        with self._load_lock:
+            if self._loaded:
+                return 0.0
+            time.sleep(self.load_delay)
+            self._loaded = True
+            return self.load_delay
+
+    def _reply_words(self, n_images: int, num_predict: int = 0) -> List[str]:
+        """Reply split into whitespace tokens (one JSON array entry per image for batches)."""
+        if n_images > 1:
+            items = [{"image": i, "analysis": " ".join(["frame"] * self.reply_tokens)} for i in range(1, n_images + 1)]
+            return json.dumps(items).split(" ")
+        words = ["mock"] * self.reply_tokens
+        return words[:num_predict] if num_predict > 0 else words
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, code: int, body: Any):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_chunk(self, body: Dict[str, Any]):
+                data = (json.dumps(body) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                server._count("pings")
+                if self.path == "/stats":
+                    with server.stats_lock:
+                        return self._send_json(200, dict(server.stats))
+                data = b"Ollama is running"
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    req = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    return self._send_json(400, {"error": "invalid JSON"})
+                if self.path not in ("/api/chat", "/api/generate"):
+                    return self._send_json(404, {"error": "not found"})
+
+                chat = self.path == "/api/chat"
+                if chat:
+                    messages = req.get("messages", [])
+                    n_images = sum(len(m.get("images") or []) for m in messages)
+                    prompt = " ".join(str(m.get("content", "")) for m in messages)
+                else:
+                    n_images = len(req.get("images") or [])
+                    prompt = str(req.get("prompt", ""))
+                server._count("requests")
+                server._count("images", n_images)
+
+                options = req.get("options") or {}
+                words = server._reply_words(n_images, int(options.get("num_predict") or 0))
+                if not prompt.strip() and not n_images:
+                    words = []  # warm-up request: load only
+
+                started = time.perf_counter()
+                with server.slots:
+                    load = server._load_duration()
+                    prefill = server.latency + server.latency_per_image * n_images
+                    time.sleep(prefill)
+                    token_time = 1.0 / server.tokens_per_sec if server.tokens_per_sec > 0 else 0.0
+
+                    def final(extra: Dict[str, Any]) -> Dict[str, Any]:
+                        body = {
+                            "model": req.get("model"), "done": True, "done_reason": "stop",
+                            "total_duration": int((time.perf_counter() - started) * 1e9),
+                            "load_duration": int(load * 1e9),
+                            "prompt_eval_count": len(prompt.split()) + 256 * n_images,
+                            "prompt_eval_duration": int(prefill * 1e9),
+                            "eval_count": len(words),
+                            "eval_duration": int(len(words) * token_time * 1e9),
+                        }
+                        body.update(extra)
+                        return body
+
+                    def piece(text: str) -> Dict[str, Any]:
+                        if chat:
+                            return {"message": {"role": "assistant", "content": text}}
+                        return {"response": text}
+
+                    if not req.get("stream", True):
+                        time.sleep(token_time * len(words))
+                        return self._send_json(200, final(piece(" ".join(words))))
+
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for i, word in enumerate(words):
+                        time.sleep(token_time)
+                        self._send_chunk({**piece(word if i == 0 else " " + word), "done": False})
+                    self._send_chunk(final(piece("")))
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a mock Ollama server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency", type=float, default=0.05, help="Prefill seconds per request")
+    parser.add_argument("--latency-per-image", type=float, default=0.0, help="Extra prefill seconds per image")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0, help="Generation speed")
+    parser.add_argument("--reply-tokens", type=int, default=40, help="Tokens per reply")
+    parser.add_argument("--num-parallel", type=int, default=1, help="Concurrent requests (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--load-delay", type=float, default=0.0, help="Cold-load delay on first request")
+    args = parser.parse_args()
+
+    server = MockOllamaServer(host=args.host, port=args.port, latency=args.latency,
+                              latency_per_image=args.latency_per_image, tokens_per_sec=args.tokens_per_sec,
+                              reply_tokens=args.reply_tokens, num_parallel=args.num_parallel,
+                              load_delay=args.load_delay)
+    print(f"Mock Ollama server listening on {server.url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
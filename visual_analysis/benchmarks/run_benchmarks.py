@@ -0,0 +1,264 @@
+"""
+Pipeline benchmarks against the mock Ollama server (no GPU or model needed).
+
+Generates synthetic test videos with OpenCV, then measures throughput
+(frames/s), latency percentiles (p50/p95) and peak RSS for:
+
+    extract_frames  - decode + sample only
+    analyze_frame   - one frame per request, sequential
+    analyze_video   - full pipeline (decode, encode, requests, merge)
+
+Results are written as JSON so runs can be compared for regressions.
+
+Usage:
+    python visual_analysis/benchmarks/run_benchmarks.py
+    python visual_analysis/benchmarks/run_benchmarks.py --duration 120 --width 1920 --height 1080
+    python visual_analysis/benchmarks/run_benchmarks.py --workers 4 --num-parallel 4 --batch 2
+    python visual_analysis/benchmarks/run_benchmarks.py --decoder ffmpeg --decode-threads 4
+    python visual_analysis/benchmarks/run_benchmarks.py --compare visual_analysis/benchmarks/results/baseline.json
+"""
+import sys
+import os
+import argparse
+import json
+import platform
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+from visual_analysis.benchmarks.mock_ollama_server import MockOllamaServer
+from visual_analysis.src.analyze_video_cli import VideoAnalyzer, is_failed_analysis
+from visual_analysis.src.decoders import DECODERS
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def make_synthetic_video(path: str, duration: float = 30.0, fps: float = 30.0,
+                         width: int = 640, height: int = 360, shot_length: float = 5.0) -> str:
+    """
+    Write a test video: a moving box over a background that changes every
+    `shot_length` seconds (so shot detection and dedup have work to do).
+    """
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    rng = np.random.default_rng(0)
+    total = int(duration * fps)
+    shot_frames = max(1, int(shot_length * fps))
+    background = None
+    for i in range(total):
+        if i % shot_frames == 0:
+            color = rng.integers(0, 256, size=3, dtype=np.uint8)
+            background = np.empty((height, width, 3), dtype=np.uint8)
+            background[:] = color
+            background[::8] //= 2  # a few stripes so frames are not trivially compressible
+        frame = background.copy()
+        x = int((i % shot_frames) / shot_frames * (width - 60))
+        cv2.rectangle(frame, (x, height // 3), (x + 60, height // 3 + 60), (255, 255, 255), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes (None if it cannot be read)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+@contextmanager
+def track_peak_rss(interval: float = 0.01) -> Iterator[Dict[str, Optional[int]]]:
+    """Sample RSS in a background thread; yields a dict filled with start/peak bytes on exit."""
+    result: Dict[str, Optional[int]] = {"start": current_rss(), "peak": None}
+    stop = threading.Event()
+
+    def sample():
+        peak = result["start"]
+        while True:
+            rss = current_rss()
+            if rss is not None and (peak is None or rss > peak):
+                peak = rss
+            result["peak"] = peak
+            if stop.wait(interval):
+                break
+
+    thread = threading.Thread(target=sample, daemon=True)
+    thread.start()
+    try:
+        yield result
+    finally:
+        stop.set()
+        thread.join()
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    return {
+        "mean": round(float(np.mean(values)), 4),
+        "p50": round(float(np.percentile(values, 50)), 4),
+        "p95": round(float(np.percentile(values, 95)), 4),
+    }
+
+
+def run_stage(name: str, fn: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """Run one benchmark stage, adding wall time and memory figures to its result."""
+    print(f"  {name}...", end="", flush=True)
+    with track_peak_rss() as rss:
+        started = time.perf_counter()
+        # The analyzer prints status and progress bars; keep the benchmark output readable
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull), redirect_stderr(devnull):
+            result = fn()
+        elapsed = time.perf_counter() - started
+    result["elapsed_s"] = round(elapsed, 4)
+    if result.get("frames"):
+        result["frames_per_s"] = round(result["frames"] / elapsed, 3)
+    if rss["peak"] is not None:
+        result["peak_rss_mb"] = round(rss["peak"] / 2 ** 20, 1)
+        result["rss_growth_mb"] = round((rss["peak"] - (rss["start"] or 0)) / 2 ** 20, 1)
+    print(f" {result.get('frames_per_s', 0):.2f} frames/s, {result['elapsed_s']:.2f}s")
+    return result
+
+
+def bench_extract_frames(analyzer: VideoAnalyzer, video: str, interval: int) -> Dict[str, Any]:
+    gaps = []
+    last = time.perf_counter()
+    frames = 0
+    for _ in analyzer.iter_frames(video, frame_interval=interval):
+        now = time.perf_counter()
+        gaps.append(now - last)
+        last = now
+        frames += 1
+    return {"frames": frames, "frame_latency_s": percentiles(gaps)}
+
+
+def bench_analyze_frame(analyzer: VideoAnalyzer, video: str, interval: int, limit: int) -> Dict[str, Any]:
+    latencies = []
+    for i, (frame, _) in enumerate(analyzer.iter_frames(video, frame_interval=interval)):
+        if i >= limit:
+            break
+        started = time.perf_counter()
+        analyzer.analyze_frame(frame)
+        latencies.append(time.perf_counter() - started)
+    return {"frames": len(latencies), "request_latency_s": percentiles(latencies)}
+
+
+def bench_analyze_video(analyzer: VideoAnalyzer, video: str, interval: int, **kwargs) -> Dict[str, Any]:
+    results = analyzer.analyze_video(video, frame_interval=interval, **kwargs)
+    latencies = [r["metrics"]["total_s"] for r in results if r.get("metrics", {}).get("total_s") is not None]
+    return {
+        "frames": len(results),
+        "requests": len({id(r["metrics"]) for r in results if r.get("metrics")}),
+        "failed": sum(1 for r in results if is_failed_analysis(r["analysis"])),
+        "request_latency_s": percentiles(latencies),
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]):
+    """Print frames/s and p95 changes relative to an earlier results file."""
+    print("\nComparison with baseline:")
+    for name, stage in current["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if not base or not base.get("frames_per_s"):
+            continue
+        change = (stage["frames_per_s"] - base["frames_per_s"]) / base["frames_per_s"] * 100
+        line = f"  {name:16s} {base['frames_per_s']:8.2f} -> {stage['frames_per_s']:8.2f} frames/s ({change:+.1f}%)"
+        key = "request_latency_s" if "request_latency_s" in stage else "frame_latency_s"
+        if stage.get(key, {}).get("p95") is not None and base.get(key, {}).get("p95") is not None:
+            line += f", p95 {base[key]['p95']:.4f}s -> {stage[key]['p95']:.4f}s"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the video pipeline against a mock Ollama server')
+    parser.add_argument('--duration', type=float, default=30.0, help='Synthetic video length in seconds (default: 30)')
+    parser.add_argument('--fps', type=float, default=30.0, help='Synthetic video frame rate (default: 30)')
+    parser.add_argument('--width', type=int, default=640, help='Synthetic video width (default: 640)')
+    parser.add_argument('--height', type=int, default=360, help='Synthetic video height (default: 360)')
+    parser.add_argument('--video', default=None, help='Benchmark this video instead of a synthetic one')
+    parser.add_argument('--interval', type=int, default=30, help='Frame interval (default: 30)')
+    parser.add_argument('--frames', type=int, default=20, help='Frames for the analyze_frame stage (default: 20)')
+    parser.add_argument('--latency', type=float, default=0.05, help='Mock prefill latency per request in seconds')
+    parser.add_argument('--latency-per-image', type=float, default=0.01, help='Mock extra latency per image')
+    parser.add_argument('--tokens-per-sec', type=float, default=2000.0, help='Mock generation speed')
+    parser.add_argument('--reply-tokens', type=int, default=40, help='Mock reply length in tokens')
+    parser.add_argument('--num-parallel', type=int, default=1, help='Mock server parallel slots')
+    parser.add_argument('--workers', type=int, default=1, help='analyze_video workers (default: 1)')
+    parser.add_argument('--batch', type=int, default=1, help='analyze_video frames per request (default: 1)')
+    parser.add_argument('--decoder', choices=DECODERS, default='opencv', help='Frame decode backend')
+    parser.add_argument('--decode-threads', type=int, default=0, help='Decoder threads (default: backend decides)')
+    parser.add_argument('--stages', default='extract_frames,analyze_frame,analyze_video',
+                        help='Comma-separated stages to run')
+    parser.add_argument('--output', default=None, help='Results JSON path (default: results/benchmark_<time>.json)')
+    parser.add_argument('--compare', default=None, help='Earlier results JSON to compare against')
+    args = parser.parse_args()
+
+    server = MockOllamaServer(latency=args.latency, latency_per_image=args.latency_per_image,
+                              tokens_per_sec=args.tokens_per_sec, reply_tokens=args.reply_tokens,
+                              num_parallel=args.num_parallel).start()
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video = args.video
+        if video is None:
+            print(f"Generating {args.duration:.0f}s {args.width}x{args.height} synthetic video...")
+            video = make_synthetic_video(os.path.join(tmp, "synthetic.mp4"), duration=args.duration,
+                                         fps=args.fps, width=args.width, height=args.height)
+
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            analyzer = VideoAnalyzer(ollama_base_url=server.url, use_cache=False, decoder=args.decoder,
+                                     decoder_options={"threads": args.decode_threads})
+
+        print(f"Mock server: {server.url}")
+        report: Dict[str, Any] = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "platform": {"python": platform.python_version(), "system": platform.platform(),
+                         "opencv": cv2.__version__, "cpus": os.cpu_count()},
+            "video": {"path": args.video or "synthetic", "duration": args.duration, "fps": args.fps,
+                      "width": args.width, "height": args.height},
+            "settings": {k: getattr(args, k) for k in ("interval", "frames", "latency", "latency_per_image",
+                                                     "tokens_per_sec", "reply_tokens", "num_parallel",
+                                                     "workers", "batch", "decoder", "decode_threads")},
+            "stages": {},
+        }
+
+        if "extract_frames" in stages:
+            report["stages"]["extract_frames"] = run_stage(
+                "extract_frames", lambda: bench_extract_frames(analyzer, video, args.interval))
+        if "analyze_frame" in stages:
+            report["stages"]["analyze_frame"] = run_stage(
+                "analyze_frame", lambda: bench_analyze_frame(analyzer, video, args.interval, args.frames))
+        if "analyze_video" in stages:
+            report["stages"]["analyze_video"] = run_stage(
+                "analyze_video", lambda: bench_analyze_video(analyzer, video, args.interval,
+                                                             workers=args.workers, batch_size=args.batch))
+        analyzer.ollama.close()
+    server.stop()
+    report["server"] = dict(server.stats)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✓ Results saved to: {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+"""
+Resident analysis service with a persistent job queue.
+
+Keeps one VideoAnalyzer and one image OllamaClient (connection pools, warm
+model, cache) alive and runs submitted image and video jobs one at a time,
+highest priority first, so a single scheduler owns the GPU. Jobs are kept in
+a SQLite file (config.json "daemon.jobs_db") and survive restarts.
+
+HTTP API (JSON, bound to localhost by default; POST bodies must be sent as
+application/json and, on a loopback address, the Host header must name it,
+so web pages can't submit jobs):
+    GET    /                  service status and job counts
+    POST   /jobs              submit {"kind": "image"|"video", "path": ..., "priority": 0, "params": {...}}
+    GET    /jobs              recent jobs (?status=queued&limit=50)
+    GET    /jobs/<id>         one job with progress
+    GET    /jobs/<id>/result  the job's output file contents
+    DELETE /jobs/<id>         cancel (running jobs stop at their next frame/image)
+
+Video params are analyze_video arguments (frame_interval, workers, sampling,
+batch_size, dedup, tiered, session, ...) plus "start"/"end" as mm:ss and
+"output". Image params are "workers", "force" and "output"; a directory,
+glob pattern or manifest path runs a batch. "output" is a file name inside
+the results directory (paths outside it are rejected).
+
+Usage:
+    python -m visual_analysis.src.analysis_daemon
+    python -m visual_analysis.src.analysis_daemon --port 8765 --keep-alive -1
+
+Submit jobs with daemon_client.py.
+"""
+import argparse
+import inspect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from .analyze_image_cli import (RESULTS_DIR, analyze_image, build_client, collect_images, is_batch_source,
+                                result_path_for, run_batch)
+from .analyze_video_cli import VideoAnalyzer, parse_time, summarize_metrics
+from .job_queue import JOB_STATUSES, JobQueue
+from .ollama_client import is_failed_analysis
+from .settings import Settings, load_settings, parse_option_overrides
+
+# analyze_video arguments a video job may set (checkpointing, progress and
+# console streaming are managed by the daemon)
+VIDEO_JOB_PARAMS = (set(inspect.signature(VideoAnalyzer.analyze_video).parameters)
+                    - {"self", "video_path", "start_time", "end_time", "checkpoint_path", "stream", "progress"}
+                    | {"start", "end", "output"})
+IMAGE_JOB_PARAMS = {"workers", "force", "output"}
+
+# Host header values accepted when the daemon listens on a loopback address
+_LOOPBACK_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+
+def resolve_output(output: str) -> Optional[str]:
+    """`output` as a path inside RESULTS_DIR, or None if it points anywhere else."""
+    root = os.path.realpath(RESULTS_DIR)
+    path = os.path.realpath(os.path.join(root, output))
+    if path == root or os.path.commonpath([root, path]) != root:
+        return None
+    return path
+
+
+class JobCancelled(Exception):
+    """Raised from a progress callback to stop a job that was cancelled while running."""
+
+
+class AnalysisDaemon:
+    """Job scheduler plus HTTP front end around a resident analyzer."""
+
+    def __init__(self, settings: Settings, host: Optional[str] = None, port: Optional[int] = None,
+                 model_name: Optional[str] = None, use_cache: bool = True,
+                 options: Optional[Dict[str, Any]] = None, keep_alive: Optional[str] = None,
+                 ollama_base_url: Optional[Any] = None):
+        """
+        Args:
+            settings (Settings): Loaded config.json
+            host (str|None): Bind address (default: daemon.host)
+            port (int|None): Port, 0 picks a free one (default: daemon.port)
+            model_name (str|None): Ollama model (default: model.name)
+            use_cache (bool): Use the response cache
+            options (dict|None): Ollama options overriding model.parameters for every job
+            keep_alive (str|None): Override ollama.keep_alive (e.g. "-1" keeps the model loaded)
+            ollama_base_url (str|list|None): Ollama endpoint(s) (default: ollama.endpoints)
+        """
+        jobs_db = settings.jobs_db
+        if not os.path.isabs(jobs_db):
+            jobs_db = os.path.join(settings.base_dir, jobs_db)
+        self.jobs = JobQueue(jobs_db)
+
+        self.analyzer = VideoAnalyzer(model_name=model_name, ollama_base_url=ollama_base_url,
+                                      use_cache=use_cache, options=options)
+        self.image_client = build_client(settings, model_name, use_cache=use_cache, options=options,
+                                         base_url=ollama_base_url)
+        if keep_alive is not None:
+            value: Any = int(keep_alive) if keep_alive.lstrip("-").isdigit() else keep_alive
+            self.analyzer.ollama.keep_alive = value
+            self.image_client.keep_alive = value
+            # Re-send so the new keep_alive applies right away
+            self.analyzer.ollama.warm_up()
+
+        self.current: Optional[int] = None
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._httpd = ThreadingHTTPServer((host or settings.daemon_host,
+                                           settings.daemon_port if port is None else port), self._handler_class())
+        self._httpd.daemon_threads = True
+        bind_host = self._httpd.server_address[0]
+        # Only a loopback daemon can be reached through DNS rebinding; one bound to the
+        # network was opened up on purpose and is addressed by whatever name resolves to it
+        self.allowed_hosts = _LOOPBACK_HOSTS if bind_host in _LOOPBACK_HOSTS else None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "AnalysisDaemon":
+        """Start the scheduler and serve HTTP in background threads."""
+        self._worker.start()
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        self._worker.start()
+        self._httpd.serve_forever()
+
+    def stop(self):
+        """Stop accepting requests; a running job is re-queued on the next start."""
+        self._stop.set()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def validate(self, kind: str, path: str, params: Dict[str, Any]) -> Optional[str]:
+        """Error message for an invalid submission, or None."""
+        if kind not in ("image", "video"):
+            return f"Unknown job kind: {kind} (expected image or video)"
+        if not path or not isinstance(path, str):
+            return "Missing path"
+        if not isinstance(params, dict):
+            return "params must be a JSON object"
+        allowed = VIDEO_JOB_PARAMS if kind == "video" else IMAGE_JOB_PARAMS
+        unknown = set(params) - allowed
+        if unknown:
+            return f"Unknown {kind} job params: {', '.join(sorted(unknown))}"
+        if kind == "video" or not is_batch_source(path):
+            if not os.path.isfile(path):
+                return f"File not found: {path}"
+        if "output" in params:
+            if not isinstance(params["output"], str) or resolve_output(params["output"]) is None:
+                return f"output must be a file name inside {os.path.realpath(RESULTS_DIR)}"
+        try:
+            for key in ("start", "end"):
+                if params.get(key) is not None:
+                    parse_time(str(params[key]))
+        except ValueError:
+            return "start/end must be mm:ss or seconds"
+        return None
+
+    def _run(self):
+        while not self._stop.is_set():
+            job = self.jobs.next(timeout=1.0)
+            if job is None:
+                continue
+            self.current = job["id"]
+            print(f"Job {job['id']}: {job['kind']} {job['path']} (priority {job['priority']})")
+            started = time.perf_counter()
+            try:
+                if job["kind"] == "video":
+                    summary = self.run_video(job)
+                else:
+                    summary = self.run_image(job)
+                self.jobs.update(job["id"], status="done", summary=summary)
+                print(f"Job {job['id']}: done in {time.perf_counter() - started:.1f}s")
+            except JobCancelled:
+                self.jobs.update(job["id"], status="cancelled")
+                print(f"Job {job['id']}: cancelled")
+            except Exception as e:
+                self.jobs.update(job["id"], status="failed", error=f"{type(e).__name__}: {e}")
+                print(f"Job {job['id']}: failed ({e})")
+            finally:
+                self.current = None
+
+    def _progress(self, job_id: int):
+        def progress(done: int, total: Optional[int]):
+            self.jobs.update(job_id, progress=done, total=total)
+            if self.jobs.get(job_id)["cancel_requested"]:
+                raise JobCancelled()
+        return progress
+
+    def run_video(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        params = dict(job["params"])
+        output = params.pop("output", None)
+        if output:
+            output = resolve_output(output)
+        if not output:
+            name = os.path.splitext(os.path.basename(job["path"]))[0]
+            output = os.path.join(RESULTS_DIR, f"{name}_analysis.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        self.jobs.update(job["id"], output=output)
+        start = params.pop("start", None)
+        end = params.pop("end", None)
+        params.setdefault("frame_interval", self.analyzer.settings.frame_interval)
+
+        results = self.analyzer.analyze_video(
+            job["path"], start_time=parse_time(str(start)) if start else 0,
+            end_time=parse_time(str(end)) if end else None,
+            checkpoint_path=os.path.splitext(output)[0] + ".jsonl", progress=self._progress(job["id"]),
+            **params)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        return {"frames": len(results), "failed": sum(1 for r in results if is_failed_analysis(r["analysis"])),
+                "timing": summarize_metrics(results)}
+
+    def run_image(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        params = job["params"]
+        path = job["path"]
+        progress = self._progress(job["id"])
+        if not is_batch_source(path):
+            output = resolve_output(params["output"]) if params.get("output") else result_path_for(path)
+            os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+            self.jobs.update(job["id"], output=output, total=1)
+            record = analyze_image(self.image_client, path)
+            if is_failed_analysis(record["analysis"]):
+                raise RuntimeError(record["analysis"])
+            with open(output, "w", encoding="utf-8") as f:
+                json.dump(record, f, indent=2, ensure_ascii=False)
+            progress(1, 1)
+            return {"analyzed": 1, "metrics": record["metrics"]}
+
+        images = collect_images(path)
+        if not images:
+            raise RuntimeError(f"No images found for: {path}")
+        output = resolve_output(params["output"]) if params.get("output") else None
+        if not output:
+            name = os.path.splitext(os.path.basename(path.rstrip("/\\")))[0]
+            output = os.path.join(RESULTS_DIR, f"{name}_batch_analysis.jsonl")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        self.jobs.update(job["id"], output=output, total=len(images))
+        return run_batch(self.image_client, images, output, workers=params.get("workers", 4),
+                         force=params.get("force", False), progress=progress)
+
+    def _handler_class(self):
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, code: int, body: Any):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _host_allowed(self) -> bool:
+                """Whether the Host header names this daemon (guards a loopback daemon against DNS rebinding)."""
+                if daemon.allowed_hosts is None:
+                    return True
+                host = self.headers.get("Host", "")
+                host = host[1:host.find("]")] if host.startswith("[") else host.split(":")[0]
+                if host in daemon.allowed_hosts:
+                    return True
+                self._send_json(403, {"error": f"Host not allowed: {host}"})
+                return False
+
+            def _job_id(self, parts) -> Optional[int]:
+                try:
+                    return int(parts[1])
+                except (IndexError, ValueError):
+                    return None
+
+            def do_GET(self):
+                if not self._host_allowed():
+                    return
+                url = urlsplit(self.path)
+                parts = [p for p in url.path.split("/") if p]
+                if not parts:
+                    return self._send_json(200, {"status": "ok", "model": daemon.analyzer.model_name,
+                                                 "running": daemon.current, "jobs": daemon.jobs.counts()})
+                if parts[0] != "jobs":
+                    return self._send_json(404, {"error": "not found"})
+                if len(parts) == 1:
+                    query = parse_qs(url.query)
+                    status = query.get("status", [None])[0]
+                    if status is not None and status not in JOB_STATUSES:
+                        return self._send_json(400, {"error": f"Unknown status: {status}"})
+                    try:
+                        limit = int(query.get("limit", ["100"])[0])
+                    except ValueError:
+                        return self._send_json(400, {"error": "limit must be an integer"})
+                    if limit < 1:
+                        return self._send_json(400, {"error": "limit must be at least 1"})
+                    return self._send_json(200, {"jobs": daemon.jobs.list(status, limit)})
+                job = daemon.jobs.get(self._job_id(parts))
+                if job is None:
+                    return self._send_json(404, {"error": "no such job"})
+                if len(parts) == 2:
+                    return self._send_json(200, job)
+                if parts[2] != "result":
+                    return self._send_json(404, {"error": "not found"})
+                if not job["output"] or not os.path.exists(job["output"]):
+                    return self._send_json(409, {"error": f"job is {job['status']}, no result yet"})
+                with open(job["output"], "r", encoding="utf-8") as f:
+                    if job["output"].endswith(".jsonl"):
+                        result = [json.loads(line) for line in f if line.strip()]
+                    else:
+                        result = json.load(f)
+                return self._send_json(200, {"job": job, "result": result})
+
+            def do_POST(self):
+                if not self._host_allowed():
+                    return
+                if urlsplit(self.path).path.rstrip("/") != "/jobs":
+                    return self._send_json(404, {"error": "not found"})
+                # Browsers only send JSON cross-origin after a CORS preflight, which is never granted
+                if self.headers.get_content_type() != "application/json":
+                    return self._send_json(415, {"error": "Content-Type must be application/json"})
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    req = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    return self._send_json(400, {"error": "invalid JSON"})
+                if not isinstance(req, dict):
+                    return self._send_json(400, {"error": "request body must be a JSON object"})
+                kind, path = req.get("kind", ""), req.get("path", "")
+                params = req.get("params") or {}
+                error = daemon.validate(kind, path, params)
+                if error:
+                    return self._send_json(400, {"error": error})
+                priority = req.get("priority", 0)
+                if isinstance(priority, bool) or not isinstance(priority, int):
+                    return self._send_json(400, {"error": "priority must be an integer"})
+                job = daemon.jobs.submit(kind, path, params, priority=priority)
+                self._send_json(201, job)
+
+            def do_DELETE(self):
+                if not self._host_allowed():
+                    return
+                parts = [p for p in urlsplit(self.path).path.split("/") if p]
+                if len(parts) != 2 or parts[0] != "jobs":
+                    return self._send_json(404, {"error": "not found"})
+                job = daemon.jobs.cancel(self._job_id(parts))
+                if job is None:
+                    return self._send_json(404, {"error": "no such job"})
+                self._send_json(200, job)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the Qwen3-VL analysis daemon')
+    parser.add_argument('--host', default=None, help='Bind address (default: daemon.host in config.json)')
+    parser.add_argument('--port', type=int, default=None, help='Port (default: daemon.port in config.json)')
+    parser.add_argument('--model', default=None, help='Model name (default: from config.json)')
+    parser.add_argument('--ollama', action='append', default=None, metavar='URL',
+                        help='Ollama endpoint; repeat for several servers (default: ollama.endpoints in config.json)')
+    parser.add_argument('--no-cache', action='store_true', help='Ignore and do not update the result cache')
+    parser.add_argument('--option', action='append', default=None, metavar='KEY=VALUE',
+                        help='Override an Ollama option from config.json model.parameters (repeatable)')
+    parser.add_argument('--keep-alive', default=None,
+                        help='How long Ollama keeps the model loaded between jobs, e.g. 2h or -1 for '
+                             'always (default: ollama.keep_alive in config.json)')
+    args = parser.parse_args()
+    try:
+        options = parse_option_overrides(args.option)
+    except ValueError as e:
+        parser.error(str(e))
+
+    daemon = AnalysisDaemon(load_settings(), host=args.host, port=args.port, model_name=args.model,
+                            use_cache=not args.no_cache, options=options, keep_alive=args.keep_alive,
+                            ollama_base_url=args.ollama)
+    counts = daemon.jobs.counts()
+    print(f"Analysis daemon listening on {daemon.url} (Ctrl+C to stop)")
+    print(f"Job queue: {daemon.jobs.path} ({counts['queued']} queued)")
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
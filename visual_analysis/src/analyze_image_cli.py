@@ -5,42 +5,38 @@ Analyzes images to describe people, environment, actions, style, camera, lightin
 Usage:
     python visual_analysis/src/analyze_image_cli.py image.jpg
     python visual_analysis/src/analyze_image_cli.py image.jpg qwen3-vl-8b-ctx32k:latest
+    python visual_analysis/src/analyze_image_cli.py image.jpg --no-cache
+    python visual_analysis/src/analyze_image_cli.py image.jpg --no-stream
+
+Batch mode (directory, glob pattern or manifest file with one path per line):
+    python visual_analysis/src/analyze_image_cli.py data/photos/ --workers 4
+    python visual_analysis/src/analyze_image_cli.py "data/**/*.jpg" --output results/photos.jsonl
+    python visual_analysis/src/analyze_image_cli.py manifest.txt
 """
 import sys
 import os
+import argparse
+import glob
 import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Set, Union
 
-from .ollama_client import OllamaClient
+from tqdm import tqdm
 
+from .image_encoding import VISUAL_TOKEN_PRESETS
+from .ollama_client import OllamaClient, is_failed_analysis
+from .result_cache import cache_from_config
+from .settings import Settings, load_settings, parse_option_overrides
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python analyze_image_cli.py <image_path> [model_name]")
-        print("\nExamples:")
-        print("  python visual_analysis/src/analyze_image_cli.py data/image.jpg")
-        print("  python video_analysis/src/analyze_image_cli.py data/image.jpg qwen3-vl-8b-ctx32k:latest")
-        sys.exit(1)
+# Reply length when config.json doesn't set model.parameters.max_new_tokens
+DEFAULT_MAX_TOKENS = 3000
 
-    image_path = sys.argv[1]
-    model_name = sys.argv[2] if len(sys.argv) > 2 else None
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".tif", ".tiff")
 
-    if not os.path.exists(image_path):
-        print(f"Error: Image not found: {image_path}")
-        sys.exit(1)
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), '..', 'results')
 
-    # Load model name from config if not provided
-    if model_name is None:
-        config_path = os.path.join(os.path.dirname(__file__), "..", "config.json")
-        if os.path.exists(config_path):
-            with open(config_path, "r", encoding="utf-8") as f:
-                cfg = json.load(f)
-                model_name = cfg.get("model", {}).get("name", "qwen3-vl-8b-ctx32k-explicit:latest")
-        else:
-            model_name = "qwen3-vl-8b-ctx32k-explicit:latest"
-
-    client = OllamaClient(model=model_name)
-
-    prompt = """Analyze this image in detail:
+IMAGE_PROMPT = """Analyze this image in detail:
 
 1. People: Who is present? Describe appearance, clothing, pose, expression, body language, age, gender, ethnicity, physical body type (e.g., slender, muscular, overweight) and emotional state.
 
@@ -58,40 +54,302 @@ def main():
 
 Provide clear, specific descriptions."""
 
+
+def format_metrics(metrics: dict) -> str:
+    """One-line timing summary for a request's metrics."""
+    if metrics.get("cached"):
+        return "Timing: answered from cache"
+    parts = [f"total {metrics.get('total_s', 0):.2f}s"]
+    if "ttft_s" in metrics:
+        parts.append(f"first token {metrics['ttft_s']:.2f}s")
+    if "tokens_per_s" in metrics:
+        parts.append(f"{metrics.get('eval_count', 0)} tokens at {metrics['tokens_per_s']:.1f} tokens/s")
+    return "Timing: " + ", ".join(parts)
+
+
+def build_client(settings: Settings, model_name: Optional[str], use_cache: bool = True,
+                 options: Optional[Dict[str, Any]] = None, base_url: Optional[Any] = None,
+                 max_visual_tokens: Optional[Union[int, str]] = None) -> OllamaClient:
+    """
+    Create an OllamaClient from config.json settings (model, endpoints, encoding,
+    cache, generation options), with `options` overriding model.parameters,
+    `base_url` (one or more endpoints) overriding ollama.endpoints and
+    `max_visual_tokens` (count or preset) overriding image_encoding.max_visual_tokens.
+    """
+    cache = cache_from_config(settings.raw, settings.base_dir) if use_cache else None
+    kwargs = settings.client_kwargs()
+    model_options = settings.options.with_overrides(**(options or {}))
+    if model_options.num_predict is None:
+        model_options = model_options.with_overrides(num_predict=DEFAULT_MAX_TOKENS)
+    kwargs["options"] = model_options
+    if base_url is not None:
+        kwargs["base_url"] = base_url
+    if max_visual_tokens is not None:
+        kwargs["max_visual_tokens"] = max_visual_tokens
+    return OllamaClient(model=model_name or settings.model_name, cache=cache, **kwargs)
+
+
+def result_path_for(image_path: str) -> str:
+    """Per-image result file written by single-image mode."""
+    image_basename = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(RESULTS_DIR, f"{image_basename}_analysis.json")
+
+
+def is_batch_source(source: str) -> bool:
+    """Whether `source` names several images (directory, glob pattern or manifest)."""
+    if os.path.isdir(source) or glob.has_magic(source):
+        return True
+    return os.path.isfile(source) and source.lower().endswith((".txt", ".lst", ".jsonl"))
+
+
+def collect_images(source: str) -> List[str]:
+    """
+    Expand a directory (recursively), glob pattern or manifest into image paths.
+
+    Manifests list one path per line (.txt/.lst) or one {"image": path} object
+    per line (.jsonl); relative paths are resolved against the manifest's folder.
+    """
+    if os.path.isdir(source):
+        paths = [os.path.join(root, name) for root, _, names in os.walk(source) for name in names]
+    elif glob.has_magic(source):
+        paths = glob.glob(source, recursive=True)
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        paths = []
+        with open(source, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if source.lower().endswith(".jsonl"):
+                    line = json.loads(line).get("image", "")
+                paths.append(line if os.path.isabs(line) else os.path.join(base, line))
+        return [p for p in paths if os.path.isfile(p)]
+    return sorted(p for p in paths if p.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(p))
+
+
+def load_done(output_path: str) -> Set[str]:
+    """Images already analyzed successfully in an existing batch JSONL output."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if (isinstance(record, dict) and record.get("image")
+                    and not is_failed_analysis(str(record.get("analysis", "")))):
+                done.add(os.path.abspath(record["image"]))
+    return done
+
+
+def has_single_result(image_path: str) -> bool:
+    """
+    Whether single-image mode already saved a successful result for this very
+    image (result files are named by basename only, so the recorded path is checked).
+    """
+    try:
+        with open(result_path_for(image_path), "r", encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return (isinstance(record, dict) and isinstance(record.get("image"), str)
+            and os.path.abspath(record["image"]) == os.path.abspath(image_path)
+            and not is_failed_analysis(str(record.get("analysis", ""))))
+
+
+def analyze_image(client: OllamaClient, path: str, max_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """Analyze one image into a result record (failures become an error marker, not an exception)."""
+    metrics: Dict[str, Any] = {}
+    try:
+        result = client.generate(IMAGE_PROMPT, image_path=path, max_tokens=max_tokens, metrics=metrics)
+    except Exception as e:
+        result = f"<error> {e}"
+    return {"image": path, "model": client.model, "analysis": result, "metrics": metrics}
+
+
+def run_batch(client: OllamaClient, images: List[str], output_path: str, workers: int = 4,
+              max_tokens: Optional[int] = None, force: bool = False,
+              progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    Analyze many images through a bounded concurrent pipeline.
+
+    Each worker reads, resizes/encodes and sends one image at a time, so
+    decoding and encoding overlap with inference on other images. At most
+    2 * workers images are in flight. Results are appended to `output_path`
+    (JSON Lines) as they finish; images already in that file or with a
+    per-image result in results/ are skipped unless `force`. `max_tokens`
+    defaults to the client's num_predict. `progress(done, total)` is called
+    after every finished image; an exception it raises stops the batch.
+    """
+    skipped = 0
+    if not force:
+        done = load_done(output_path)
+        todo = []
+        for path in images:
+            if os.path.abspath(path) in done or has_single_result(path):
+                skipped += 1
+            else:
+                todo.append(path)
+        images = todo
+
+    failed = 0
+    started = time.perf_counter()
+    max_pending = max(1, workers) * 2
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="image") as pool, \
+            open(output_path, "a", encoding="utf-8") as out, \
+            tqdm(total=len(images), unit="img") as bar:
+        remaining = iter(images)
+        pending = set()
+        while True:
+            for path in remaining:
+                pending.add(pool.submit(analyze_image, client, path, max_tokens))
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                record = fut.result()
+                if is_failed_analysis(record["analysis"]):
+                    failed += 1
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                bar.update(1)
+                elapsed = time.perf_counter() - started
+                bar.set_postfix(img_per_s=f"{bar.n / elapsed:.2f}", failed=failed)
+                if progress is not None:
+                    progress(bar.n, len(images))
+
+    elapsed = time.perf_counter() - started
+    return {
+        "analyzed": len(images),
+        "skipped": skipped,
+        "failed": failed,
+        "elapsed_s": round(elapsed, 2),
+        "images_per_s": round(len(images) / elapsed, 3) if elapsed > 0 else 0.0,
+    }
+
+
+def analyze_single(client: OllamaClient, image_path: str, stream: bool = True) -> None:
+    """Analyze one image, print the result and save it to results/<name>_analysis.json."""
     print(f"Analyzing: {image_path}")
     print(f"Using model: {client.model}")
     print(f"HTTP available: {client.http_available()}")
     print("\nProcessing...\n")
 
-    result = client.generate(
-        prompt, 
-        image_path=image_path, 
-        max_tokens=3000,
-        debug=False
-    )
-
     print("=" * 70)
     print("ANALYSIS RESULT")
     print("=" * 70)
-    print(result)
+
+    # Stream the reply to the terminal as it is generated
+    metrics = {}
+    result = client.generate(
+        IMAGE_PROMPT,
+        image_path=image_path,
+        debug=False,
+        on_token=(lambda t: print(t, end="", flush=True)) if stream else None,
+        metrics=metrics
+    )
+    if stream:
+        print()
+    else:
+        print(result)
     print("=" * 70)
+    print(format_metrics(metrics))
+    if metrics.get("image_sizes"):
+        print(f"Image: {metrics['image_sizes'][0]} ({metrics['visual_tokens']} visual tokens)")
 
-    if "<error>" in result or "<ollama-cli-error>" in result:
+    if is_failed_analysis(result):
         print("\nAnalysis failed. Check that Ollama is running and the model is loaded.")
         sys.exit(1)
     else:
         # Save result to JSON file
-        image_basename = os.path.splitext(os.path.basename(image_path))[0]
-        results_dir = os.path.join(os.path.dirname(__file__), '..', 'results')
-        os.makedirs(results_dir, exist_ok=True)
-        output_path = os.path.join(results_dir, f"{image_basename}_analysis.json")
-        
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output_path = result_path_for(image_path)
+
         with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump({"image": image_path, "model": model_name, "analysis": result}, f, indent=2, ensure_ascii=False)
-        
+            json.dump({"image": os.path.abspath(image_path), "model": client.model, "analysis": result, "metrics": metrics},
+                      f, indent=2, ensure_ascii=False)
+
         print(f"\n✓ Results saved to: {output_path}")
         print("✓ Analysis completed successfully!")
 
 
+def main():
+    parser = argparse.ArgumentParser(description='Analyze images using Qwen3-VL')
+    parser.add_argument('image_path', help='Image file, or a directory / glob pattern / manifest for batch mode')
+    parser.add_argument('model_name', nargs='?', default=None, help='Model name (default: from config.json)')
+    parser.add_argument('--no-cache', action='store_true', help='Ignore and do not update the result cache')
+    parser.add_argument('--no-stream', action='store_true', help='Print the result only when complete')
+    parser.add_argument('--workers', type=int, default=4, help='Batch mode: images analyzed concurrently (default: 4)')
+    parser.add_argument('--output', default=None, help='Batch mode: JSONL output path (default: auto in results/)')
+    parser.add_argument('--force', action='store_true', help='Batch mode: re-analyze images that already have results')
+    parser.add_argument('--visual-tokens', default=None, metavar='N|PRESET',
+                        help=f'Visual token budget per image; images are resized to the model\'s token grid '
+                             f'within it. A number, a preset ({", ".join(VISUAL_TOKEN_PRESETS)}) or off '
+                             f'(default: image_encoding.max_visual_tokens in config.json)')
+    parser.add_argument('--option', action='append', default=None, metavar='KEY=VALUE',
+                        help='Override an Ollama option from config.json model.parameters, e.g. '
+                             '--option num_predict=500 --option temperature=0.2 (repeatable)')
+    args = parser.parse_args()
+    try:
+        options = parse_option_overrides(args.option)
+    except ValueError as e:
+        parser.error(str(e))
+
+    settings = load_settings()
+    try:
+        client = build_client(settings, args.model_name, use_cache=not args.no_cache, options=options,
+                              max_visual_tokens=args.visual_tokens)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if not is_batch_source(args.image_path):
+        if not os.path.exists(args.image_path):
+            print(f"Error: Image not found: {args.image_path}")
+            sys.exit(1)
+        analyze_single(client, args.image_path, stream=not args.no_stream)
+        return
+
+    images = collect_images(args.image_path)
+    if not images:
+        print(f"Error: No images found for: {args.image_path}")
+        sys.exit(1)
+
+    if args.output is None:
+        source = args.image_path.rstrip("/\\")
+        name = "glob" if glob.has_magic(source) else os.path.splitext(os.path.basename(source))[0]
+        args.output = os.path.join(RESULTS_DIR, f"{name}_batch_analysis.jsonl")
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+
+    print(f"Batch analysis: {len(images)} images from {args.image_path}")
+    print(f"Using model: {client.model}")
+    print(f"Workers: {args.workers}")
+    print(f"Writing results to: {args.output}")
+    if settings.warm_up:
+        # Load the model once before the workers start, instead of every worker waiting on it
+        for url, seconds in client.warm_up().items():
+            print(f"Model ready on {url} (warm-up {seconds:.2f}s)")
+    print()
+
+    summary = run_batch(client, images, args.output, workers=args.workers, force=args.force)
+
+    print(f"\n✓ Analyzed {summary['analyzed']} images in {summary['elapsed_s']}s "
+          f"({summary['images_per_s']} images/s)")
+    concurrency = client.concurrency_stats()
+    if concurrency and args.workers > 1:
+        print(f"✓ Concurrency: limit {concurrency['limit']} (raised {concurrency['increases']}x, "
+              f"lowered {concurrency['decreases']}x), peak queue {concurrency['peak_queued']}, "
+              f"{concurrency['timeouts']} timeouts")
+    if summary["skipped"]:
+        print(f"✓ Skipped {summary['skipped']} already-analyzed images (use --force to redo)")
+    if summary["failed"]:
+        print(f"✗ {summary['failed']} images failed; rerun to retry them")
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     main()
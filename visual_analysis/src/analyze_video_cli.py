@@ -12,128 +12,1019 @@ import argparse
 import json
 import cv2
 import numpy as np
-from PIL import Image
 from tqdm import tqdm
+import math
+import multiprocessing
+import queue
+import re
 import tempfile
-from typing import List, Dict, Any
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Callable, Iterable, Iterator, List, Dict, Any, Optional, Tuple, Union
 
-from .ollama_client import OllamaClient
+from .decoders import DECODERS, make_decoder
+from .frame_index import FrameIndex, build_frame_index, index_path, load_frame_index
+from .frame_similarity import FrameDeduplicator, frame_distance, signature
+from .image_encoding import VISUAL_TOKEN_PRESETS, token_grid_size
+from .ollama_client import ChatSession, OllamaClient, estimate_tokens, is_failed_analysis
+from .profiling import Profiler, frame_breakdown
+from .result_cache import cache_from_config
+from .settings import load_settings, parse_option_overrides
+from .video_summary import VideoSummarizer, print_summary
+
+FRAME_PROMPT = (
+    "Analyze this video frame and describe:\n"
+    "1. People present (number, age, gender, clothing)\n"
+    "2. Environment (indoor/outdoor, setting, lighting)\n"
+    "3. Actions being performed\n"
+    "4. Camera style (wide shot, close-up, etc.)\n"
+    "5. Camera movement (pan, zoom, shake, etc.)\n\n"
+    "Be concise and specific in your descriptions."
+)
+
+# Session mode: FRAME_PROMPT becomes the shared system prompt and each request
+# only names the frame; earlier frames are summarized within this many tokens
+SESSION_FRAME_PROMPT = (
+    "This is the video frame at {timestamp:.2f}s. Use the summary of earlier frames "
+    "(if any) to judge camera movement and what changed."
+)
+SESSION_CONTEXT_TOKENS = 1024
+
+# Cheap first pass of the tiered mode (see iter_tiered_analyses)
+TRIAGE_PROMPT = (
+    "Describe this video frame in one short sentence: setting, people, "
+    "main action and shot type."
+)
+TRIAGE_MAX_SIDE = 448
+# Triage captions sharing less than this fraction of words with the last
+# detailed frame's caption count as new content
+CAPTION_SIMILARITY = 0.5
+# The detailed pass runs at least this often (seconds), even on static footage
+TIER_MAX_GAP = 60.0
+
+# A request whose load_duration exceeds this (seconds) had to load the model
+COLD_LOAD_THRESHOLD = 1.0
 
 
 class VideoAnalyzer:
     """Video analyzer using Qwen3-VL via Ollama HTTP API"""
     
-    def __init__(self, model_name: str = None, config_path: str = "../config.json", ollama_base_url: str = "http://127.0.0.1:11434"):
+    def __init__(self, model_name: str = None, config_path: str = "../config.json",
+                 ollama_base_url: Optional[Union[str, List[Any]]] = None, use_cache: bool = True,
+                 profiler: Optional[Profiler] = None, warm_up: Optional[bool] = None,
+                 options: Optional[Dict[str, Any]] = None, decoder: str = "opencv",
+                 decoder_options: Optional[Dict[str, Any]] = None,
+                 max_visual_tokens: Optional[Union[int, str]] = None, use_index: bool = True):
         """
         Initialize the video analyzer.
 
         Args:
             model_name (str|None): Ollama model name. If None, reads from config.json
-            config_path (str): Path to config.json
-            ollama_base_url (str): Ollama HTTP endpoint
+            config_path (str): Path to config.json (relative to this file)
+            ollama_base_url (str|list|None): Ollama HTTP endpoint or list of endpoints
+                to load-balance across. If None, reads ollama.endpoints from config.json
+            use_cache (bool): Reuse cached responses for identical frames/prompts
+            profiler (Profiler|None): Collects per-stage timings (decode, convert,
+                encode, request, Ollama phases); disabled if None
+            warm_up (bool|None): Load the model now instead of on the first frame.
+                If None, reads ollama.warm_up from config.json (default: True)
+            options (dict|None): Ollama options overriding config.json
+                model.parameters for every request (e.g. {"num_ctx": 16384})
+            decoder (str): Frame decode backend: "opencv", "pyav" or "ffmpeg" (see decoders.py)
+            decoder_options (dict|None): FrameDecoder arguments (threads, hw_accel,
+                keyframes_only, max_side)
+            max_visual_tokens (int|str|None): Per-frame visual token budget or preset
+                ("low", "medium", "high", "max", "off"). If None, reads
+                image_encoding.max_visual_tokens from config.json
+            use_index (bool): Use a video's frame index sidecar when it has an
+                up-to-date one (exact timestamps, keyframe seeks; see frame_index.py)
         """
-        # Load config
-        cfg = None
-        cfg_path_full = os.path.join(os.path.dirname(__file__), config_path)
-        if os.path.exists(cfg_path_full):
-            try:
-                with open(cfg_path_full, "r", encoding="utf-8") as f:
-                    cfg = json.load(f)
-            except Exception:
-                cfg = None
-
-        # Get model name
-        if model_name is None:
-            if cfg and "model" in cfg and "name" in cfg["model"]:
-                model_name = cfg["model"]["name"]
-        self.model_name = model_name or "qwen3-vl-8b-ctx32k-explicit:latest"
-
-        # Get parameters
-        params = {}
-        if cfg and "model" in cfg and "parameters" in cfg["model"]:
-            params = cfg["model"]["parameters"]
-        self.max_new_tokens = params.get("max_new_tokens", 512)
+        self.settings = load_settings(os.path.join(os.path.dirname(__file__), config_path))
+        self.model_name = model_name or self.settings.model_name
+        model_options = self.settings.options.with_overrides(**(options or {}))
+        self.max_new_tokens = model_options.num_predict or 512
+
+        # Frames are encoded in memory; downscaling to the model's working
+        # resolution keeps encode, upload and prefill cheap
+        self.image_format = self.settings.image_format
+        self.image_quality = self.settings.image_quality
+        self.max_image_side = self.settings.max_image_side
+
+        self.profiler = profiler or Profiler(enabled=False)
+        self.chat_session: Optional[ChatSession] = None
+
+        # Shard worker processes rebuild an equivalent analyzer from these
+        self.shard_kwargs = {"model_name": self.model_name, "config_path": config_path,
+                             "ollama_base_url": ollama_base_url, "use_cache": use_cache, "options": options,
+                             "decoder": decoder, "decoder_options": decoder_options,
+                             "max_visual_tokens": max_visual_tokens, "use_index": use_index}
+
+        # OpenCV frames stay full size (encoding downscales them); the other
+        # backends scale to the encode size while converting, at no extra cost
+        decoder_options = dict(decoder_options or {})
+        if decoder != "opencv":
+            decoder_options.setdefault("max_side", self.max_image_side)
+        self.decoder = make_decoder(decoder, profiler=self.profiler, **decoder_options)
+        self.use_index = use_index
+        self._indexes: Dict[str, Optional[FrameIndex]] = {}
+
+        # Response cache (see config.json "cache")
+        self.cache = cache_from_config(self.settings.raw, self.settings.base_dir) if use_cache else None
 
         # Initialize Ollama client
-        self.ollama = OllamaClient(model=self.model_name, base_url=ollama_base_url)
-        print(f"Using Ollama model: {self.model_name} (HTTP endpoint: {ollama_base_url})")
+        client_kwargs = self.settings.client_kwargs()
+        client_kwargs["options"] = model_options
+        if max_visual_tokens is not None:
+            client_kwargs["max_visual_tokens"] = max_visual_tokens
+        if ollama_base_url is not None:
+            client_kwargs["base_url"] = ollama_base_url
+        self.ollama = OllamaClient(model=self.model_name, cache=self.cache, profiler=self.profiler, **client_kwargs)
+        endpoints = ", ".join(h.url for h in self.ollama.hosts)
+        print(f"Using Ollama model: {self.model_name} (HTTP endpoint: {endpoints})")
+
+        # Pay the model load up front so it doesn't show up as a slow first frame
+        self.warm_up_s: Dict[str, float] = {}
+        if self.settings.warm_up if warm_up is None else warm_up:
+            self.warm_up_s = self.ollama.warm_up()
+            for url, seconds in self.warm_up_s.items():
+                print(f"Model ready on {url} (warm-up {seconds:.2f}s)")
         
-    def extract_frames(self, video_path: str, frame_interval: int = 30, start_time: float = 0, end_time: float = None) -> List[tuple]:
-        """Extract frames from video at specified intervals."""
+    @staticmethod
+    def video_info(video_path: str) -> Tuple[float, int]:
+        """Return (fps, frame_count) as reported by the container (count may be 0 if unknown)."""
         cap = cv2.VideoCapture(video_path)
-        fps = cap.get(cv2.CAP_PROP_FPS)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        start_frame = int(start_time * fps)
-        end_frame = int(end_time * fps) if end_time else total_frames
-        
-        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-        
-        frames = []
-        frame_count = start_frame
-        
-        while frame_count < end_frame:
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            if (frame_count - start_frame) % frame_interval == 0:
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                timestamp = frame_count / fps
-                frames.append((frame_rgb, timestamp))
-                
-            frame_count += 1
-            
         cap.release()
-        return frames
-    
-    def analyze_frame(self, frame: np.ndarray) -> str:
-        """Analyze a single frame."""
-        image = Image.fromarray(frame)
-
-        prompt = (
-            "Analyze this video frame and describe:\n"
-            "1. People present (number, age, gender, clothing)\n"
-            "2. Environment (indoor/outdoor, setting, lighting)\n"
-            "3. Actions being performed\n"
-            "4. Camera style (wide shot, close-up, etc.)\n"
-            "5. Camera movement (pan, zoom, shake, etc.)\n\n"
-            "Be concise and specific in your descriptions."
-        )
-
-        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-            tmp_path = tmp.name
-            image.save(tmp_path)
+        return fps, total_frames
+
+    def frame_index(self, video_path: str, build: bool = False) -> Optional[FrameIndex]:
+        """
+        The video's frame index sidecar (None if it has none, it is out of date or
+        use_index is off). With `build`, a missing or stale index is built first.
+        """
+        if not self.use_index:
+            return None
+        key = os.path.abspath(video_path)
+        if self._indexes.get(key) is None:
+            index = load_frame_index(video_path)
+            if index is None and build:
+                print(f"Indexing frames of {video_path} (one-time, saved to {index_path(video_path)})...")
+                with self.profiler.span("frame_index"):
+                    index = build_frame_index(video_path)
+            self._indexes[key] = index
+        return self._indexes[key]
+
+    def frame_time(self, video_path: str, frame: int, fps: float) -> float:
+        """Timestamp of frame number `frame` (exact with a frame index, frame / fps otherwise)."""
+        index = self.frame_index(video_path)
+        if index is not None and frame < len(index):
+            return index.timestamp(frame)
+        return frame / fps
+
+    def _frame_range(self, video_path: str, start_time: float = 0, end_time: float = None) -> Tuple[float, int, int]:
+        """Return (fps, start_frame, end_frame) for a time range, clamped to the video length."""
+        index = self.frame_index(video_path)
+        if index is not None:
+            # Exact for variable frame rates too; fps is the average
+            end_frame = index.frame_at(end_time) if end_time else len(index)
+            return index.fps, index.frame_at(start_time), end_frame
+        fps, total_frames = self.video_info(video_path)
+        # Rounding absorbs float error, so frame / fps maps back to the same frame
+        start_frame = int(round(start_time * fps, 6))
+        end_frame = int(round(end_time * fps, 6)) if end_time else total_frames
+        if total_frames > 0:
+            end_frame = min(end_frame, total_frames)
+        return fps, start_frame, end_frame
+
+    def iter_frames_at(self, video_path: str, frame_indices: Iterable[int]) -> Iterator[Tuple[np.ndarray, float]]:
+        """
+        Lazily yield (frame_rgb, timestamp) for the given increasing frame indices,
+        using the configured decode backend (see decoders.py).
+        """
+        return self.decoder.iter_frames_at(video_path, frame_indices, index=self.frame_index(video_path))
+
+    def sample_indices(self, video_path: str, frame_interval: int = 30, start_time: float = 0,
+                       end_time: float = None) -> Tuple[range, float]:
+        """Return (frame indices sampled every `frame_interval` frames, fps) for a time range."""
+        fps, start_frame, end_frame = self._frame_range(video_path, start_time, end_time)
+        if end_frame <= 0:
+            # Frame count unknown: sample until the stream ends
+            end_frame = sys.maxsize
+        return range(start_frame, end_frame, max(1, int(frame_interval))), fps
+
+    def iter_frames(self, video_path: str, frame_interval: int = 30, start_time: float = 0, end_time: float = None) -> Iterator[Tuple[np.ndarray, float]]:
+        """
+        Lazily yield (frame_rgb, timestamp) pairs sampled every `frame_interval` frames.
+
+        Skipped frames are only grabbed (demuxed, not converted), and for sparse
+        intervals the capture seeks straight to the next sampled frame instead.
+        """
+        indices, _ = self.sample_indices(video_path, frame_interval, start_time, end_time)
+        return self.iter_frames_at(video_path, indices)
+
+    def count_sampled_frames(self, video_path: str, frame_interval: int = 30, start_time: float = 0, end_time: float = None) -> Optional[int]:
+        """Estimate how many frames iter_frames will yield (None if the container doesn't report it)."""
+        fps, start_frame, end_frame = self._frame_range(video_path, start_time, end_time)
+        if end_frame <= 0:
+            return None
+        if end_frame <= start_frame:
+            return 0
+        return math.ceil((end_frame - start_frame) / max(1, int(frame_interval)))
+
+    def shard_ranges(self, video_path: str, shards: int, frame_interval: int = 30, start_time: float = 0,
+                     end_time: float = None) -> List[Tuple[float, float]]:
+        """
+        Split a time range into up to `shards` contiguous (start_time, end_time) segments.
+
+        Boundaries fall on the sampling grid (every `frame_interval` frames from
+        the start frame), so the shards together sample exactly the frames one
+        run over the whole range would. A video of unknown length is not split.
+        """
+        fps, start_frame, end_frame = self._frame_range(video_path, start_time, end_time)
+        if end_frame <= start_frame:
+            return [(start_time, end_time)]
+        step = max(1, int(frame_interval))
+        samples = math.ceil((end_frame - start_frame) / step)
+        shards = max(1, min(shards, samples))
+        bounds = [start_frame + samples * k // shards * step for k in range(shards)] + [end_frame]
+        times = [self.frame_time(video_path, b, fps) for b in bounds]
+        return [(times[k], times[k + 1]) for k in range(shards)]
+
+    def detect_shots(self, video_path: str, start_time: float = 0, end_time: float = None,
+                     threshold: float = 0.15, probe_fps: float = 6.0) -> Tuple[List[Tuple[int, int]], float]:
+        """
+        Find shot boundaries with a cheap frame-difference measure.
 
+        Probes `probe_fps` frames per second, shrinks each to a 64x36 grayscale
+        thumbnail and starts a new shot wherever the mean absolute difference
+        to the previous probe exceeds `threshold` (0-1). With a frame index the
+        stored 8x8 thumbnails are compared instead, without decoding.
+
+        Returns:
+            ([(first_frame, end_frame_exclusive), ...], fps)
+        """
+        fps, start_frame, end_frame = self._frame_range(video_path, start_time, end_time)
+        if end_frame <= 0:
+            end_frame = sys.maxsize
+        step = max(1, int(round(fps / probe_fps)))
+        index = self.frame_index(video_path)
+        if index is not None:
+            return index.detect_shots(start_frame, end_frame, threshold, step), fps
+
+        cap = cv2.VideoCapture(video_path)
+        shots = []
         try:
-            resp = self.ollama.generate(prompt, image_path=tmp_path, max_tokens=self.max_new_tokens)
+            if start_frame > 0:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+            shot_start = start_frame
+            prev = None
+            frame_count = start_frame
+            while frame_count < end_frame:
+                if not cap.grab():
+                    break
+                if (frame_count - start_frame) % step == 0:
+                    ret, frame = cap.retrieve()
+                    if not ret:
+                        break
+                    thumb = cv2.cvtColor(cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA),
+                                         cv2.COLOR_BGR2GRAY).astype(np.float32)
+                    if prev is not None and float(np.abs(thumb - prev).mean()) / 255.0 >= threshold:
+                        shots.append((shot_start, frame_count))
+                        shot_start = frame_count
+                    prev = thumb
+                frame_count += 1
+            if frame_count > shot_start:
+                shots.append((shot_start, frame_count))
         finally:
-            try:
-                os.remove(tmp_path)
-            except Exception:
-                pass
+            cap.release()
+        return shots, fps
+
+    @staticmethod
+    def plan_adaptive_samples(shots: List[Tuple[int, int]], fps: float, max_per_minute: float = 12,
+                              max_gap: float = 10.0) -> List[int]:
+        """
+        Choose representative frame indices for a list of shots.
+
+        Every shot gets one frame at its middle; shots longer than `max_gap`
+        seconds get evenly spaced extra frames. If that exceeds the budget of
+        `max_per_minute` frames per minute of footage (on average), the first
+        frame of the longest shots is kept first, then extra frames.
+        """
+        if not shots:
+            return []
+        duration = sum(end - start for start, end in shots) / fps
+        budget = max(1, math.ceil(duration / 60.0 * max_per_minute))
+
+        candidates = []  # (rank within shot, -shot length, frame index)
+        for start, end in shots:
+            length = end - start
+            count = max(1, math.ceil(length / fps / max_gap))
+            for k in range(count):
+                candidates.append((k, -length, start + int((k + 0.5) * length / count)))
+        candidates.sort()
+        return sorted(idx for _, _, idx in candidates[:budget])
+
+    def extract_frames(self, video_path: str, frame_interval: int = 30, start_time: float = 0, end_time: float = None) -> List[tuple]:
+        """Extract frames from video at specified intervals (materialized version of iter_frames)."""
+        return list(self.iter_frames(video_path, frame_interval, start_time, end_time))
+    
+    def start_session(self, context_tokens: int = SESSION_CONTEXT_TOKENS) -> ChatSession:
+        """
+        Send following single-frame requests through a ChatSession: FRAME_PROMPT
+        becomes a fixed system prompt (prefix reused by Ollama's prompt cache)
+        and up to `context_tokens` of earlier frames' analyses are carried along.
+
+        The summary budget is capped so prompt, image and reply still fit in
+        config.json model.max_context_length.
+        """
+        max_context = self.settings.max_context_length
+        if max_context:
+            reserved = (self.max_new_tokens + self._image_tokens() + estimate_tokens(FRAME_PROMPT)
+                        + estimate_tokens(SESSION_FRAME_PROMPT) + 64)
+            context_tokens = max(0, min(context_tokens, max_context - reserved))
+        self.chat_session = self.ollama.chat_session(FRAME_PROMPT, context_tokens=context_tokens)
+        return self.chat_session
+
+    def _image_tokens(self) -> int:
+        """Visual tokens of one frame, worst case: a square frame at max_image_side."""
+        side = self.max_image_side or 1280
+        w, h = token_grid_size(side, side, self.ollama.max_visual_tokens, self.ollama.visual_token_pixels)
+        return (w // self.ollama.visual_token_pixels) * (h // self.ollama.visual_token_pixels)
+
+    def max_batch_size(self) -> Optional[int]:
+        """
+        Most frames one analyze_frames request can take with every frame's image
+        and full reply (max_new_tokens) inside model.max_context_length
+        (None if the context length is not configured).
+        """
+        max_context = self.settings.max_context_length
+        if not max_context:
+            return None
+        per_frame = self._image_tokens() + self.max_new_tokens + 16  # + timestamp in the prompt
+        return max(1, (max_context - estimate_tokens(FRAME_PROMPT) - 128) // per_frame)
+
+    def end_session(self):
+        self.chat_session = None
+
+    def analyze_frame(self, frame: np.ndarray, metrics: Optional[dict] = None,
+                      on_token: Optional[Callable[[str], None]] = None,
+                      options: Optional[Dict[str, Any]] = None, timestamp: Optional[float] = None) -> str:
+        """
+        Analyze a single frame (optionally streaming tokens to `on_token` and filling `metrics`).
+
+        `options` overrides Ollama options for this frame only (e.g. {"num_predict": 64}).
+        In session mode (see start_session) `timestamp` orders the frame in the
+        rolling summary.
+        """
+        options = options or {}
+        max_tokens = None if "num_predict" in options else self.max_new_tokens
+        session = self.chat_session
+        if session is None:
+            return self.ollama.generate(FRAME_PROMPT, image=frame, max_tokens=max_tokens,
+                                        on_token=on_token, metrics=metrics, options=options)
+
+        resp = session.generate(SESSION_FRAME_PROMPT.format(timestamp=timestamp or 0.0), image=frame,
+                                max_tokens=max_tokens, on_token=on_token, metrics=metrics, options=options)
+        if not is_failed_analysis(resp):
+            session.remember(f"{timestamp or 0.0:.2f}s: {resp}", key=timestamp)
 
         return resp
+
+    def analyze_frames(self, frames: List[np.ndarray], timestamps: Optional[List[float]] = None,
+                       metrics: Optional[dict] = None) -> List[str]:
+        """
+        Analyze several consecutive frames in one request (one answer per frame).
+
+        Sharing a request saves re-processing the prompt for each frame and
+        lets the model compare neighbouring frames for camera movement.
+        """
+        if len(frames) == 1:
+            return [self.analyze_frame(frames[0], metrics=metrics)]
+        prompt = FRAME_PROMPT
+        if timestamps:
+            times = ", ".join(f"{i}: {t:.2f}s" for i, t in enumerate(timestamps, 1))
+            prompt = (f"{FRAME_PROMPT}\n\nThe images are consecutive frames from one video "
+                      f"(timestamps {times}). Use the neighbouring frames to judge camera movement.")
+        max_tokens = self.max_new_tokens * len(frames)
+        if self.settings.max_context_length:
+            # The images and prompt share the context with the reply
+            budget = (self.settings.max_context_length - self._image_tokens() * len(frames)
+                      - estimate_tokens(prompt) - 128)
+            max_tokens = max(self.max_new_tokens, min(max_tokens, budget))
+        return self.ollama.generate_batch(prompt, frames, max_tokens=max_tokens, metrics=metrics)
     
-    def analyze_video(self, video_path: str, frame_interval: int = 30, start_time: float = 0, end_time: float = None) -> List[Dict[str, Any]]:
-        """Analyze entire video and return frame-by-frame results."""
+    def iter_analyses(self, frames: Iterable[Tuple[np.ndarray, float]], workers: int = 1,
+                      dedup: Optional[float] = None, batch_size: int = 1,
+                      on_token: Optional[Callable[[str], None]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Analyze frames and yield {"timestamp", "analysis", ...} records in input order.
+
+        With workers > 1 requests are sent to Ollama concurrently; at most
+        2 * workers requests' worth of frames are held in memory (in flight or
+        awaiting their turn), so results stay ordered without buffering the
+        whole video.
+
+        With `dedup` set (a similarity in 0-1), frames at least that similar to
+        the last analyzed frame are not sent to the model; they reuse its
+        analysis and are marked with "reused_from" and "similarity".
+
+        With batch_size > 1, up to that many frames are sent per request
+        (see analyze_frames) and the answer is split back per frame.
+
+        Analyzed records carry the request's "metrics" (latency, time to first
+        token, tokens/s). `on_token` streams the reply text as it arrives; it is
+        only used for sequential single-frame requests, where output can't interleave.
+        """
+        deduplicator = FrameDeduplicator(dedup) if dedup else None
+        batch_size = max(1, batch_size)
+        max_pending = (workers * 2 if workers > 1 else 1) * batch_size
+        pending: "deque" = deque()  # (record, batch, index within batch)
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analyze") if workers > 1 else None
+
+        stream = on_token if pool is None and batch_size == 1 else None
+
+        def run(frames: List[np.ndarray], timestamps: List[float]) -> Tuple[List[str], dict]:
+            metrics: Dict[str, Any] = {}
+            if len(frames) == 1:
+                if stream is not None:
+                    stream(f"\n--- Time: {timestamps[0]:.2f}s ---\n")
+                return [self.analyze_frame(frames[0], metrics=metrics, on_token=stream,
+                                           timestamp=timestamps[0])], metrics
+            metrics["frames_in_request"] = len(frames)
+            return self.analyze_frames(frames, timestamps, metrics=metrics), metrics
+
+        def submit(batch: _FrameBatch):
+            # Hand the pixels to the request; the batch only keeps its future
+            frames, batch.frames = batch.frames, []
+            if pool is not None:
+                batch.future = pool.submit(run, frames, batch.timestamps)
+            else:
+                batch.future = Future()
+                try:
+                    batch.future.set_result(run(frames, batch.timestamps))
+                except Exception as e:
+                    batch.future.set_exception(e)
+
+        def drain(keep: int) -> Iterator[Dict[str, Any]]:
+            while len(pending) > keep and pending[0][1].future is not None:
+                record, batch, index = pending.popleft()
+                texts, metrics = batch.future.result()
+                record["analysis"] = texts[index]
+                if "reused_from" not in record:
+                    record["metrics"] = metrics
+                yield record
+
+        try:
+            batch = _FrameBatch()
+            reference = None  # (timestamp, batch, index) of the last analyzed frame
+            for frame, timestamp in frames:
+                similarity = deduplicator.check(frame) if deduplicator else None
+                if similarity is not None and reference is not None:
+                    record = {"timestamp": timestamp, "reused_from": round(reference[0], 2),
+                              "similarity": round(similarity, 3)}
+                    pending.append((record, reference[1], reference[2]))
+                else:
+                    reference = (timestamp, batch, batch.add(frame, timestamp))
+                    pending.append(({"timestamp": timestamp}, batch, reference[2]))
+                    if len(batch.timestamps) >= batch_size:
+                        submit(batch)
+                        batch = _FrameBatch()
+                yield from drain(max_pending - 1)
+            if batch.timestamps and batch.future is None:
+                submit(batch)
+            yield from drain(0)
+        finally:
+            for _, b, _ in pending:
+                if b.future is not None:
+                    b.future.cancel()
+            if pool is not None:
+                pool.shutdown(wait=True)
+
+    def iter_tiered_analyses(self, frames: Iterable[Tuple[np.ndarray, float]], workers: int = 1,
+                             change_threshold: float = 0.25, triage_tokens: int = 48) -> Iterator[Dict[str, Any]]:
+        """
+        Coarse-to-fine analysis: yield {"timestamp", "analysis", "tier", ...} records in input order.
+
+        Every frame first gets a cheap triage pass (one-sentence caption,
+        `triage_tokens` tokens, image shrunk to TRIAGE_MAX_SIDE). Only frames
+        with new content get the detailed FRAME_PROMPT pass; the others reuse
+        the last detailed analysis ("reused_from") and keep their own caption
+        ("triage"). A frame has new content if its pixel change against the
+        last detailed frame (frame_distance, 0-1) reaches `change_threshold`,
+        its caption shares less than CAPTION_SIMILARITY of its words with that
+        frame's caption, or TIER_MAX_GAP seconds have passed.
+
+        Both passes share one pool of `workers` concurrent requests.
+        """
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analyze") if workers > 1 else None
+        max_pending = workers * 2 if workers > 1 else 1
+
+        def triage(item: Tuple[np.ndarray, float]) -> Tuple[str, dict]:
+            metrics: Dict[str, Any] = {}
+            small = shrink_frame(item[0], TRIAGE_MAX_SIDE)
+            caption = self.ollama.generate(TRIAGE_PROMPT, image=small, max_tokens=triage_tokens, metrics=metrics)
+            return caption.strip(), metrics
+
+        def decide(triaged: Iterator) -> Iterator[Tuple[Optional[np.ndarray], Dict[str, Any]]]:
+            reference = None  # (timestamp, signature, caption) of the last detailed frame
+            for (frame, timestamp), (caption, metrics) in triaged:
+                sig = signature(frame)
+                record = {"timestamp": timestamp, "triage": caption, "triage_metrics": metrics}
+                if reference is None:
+                    new = True
+                else:
+                    change = frame_distance(sig, reference[1])
+                    record["change"] = round(change, 3)
+                    new = (change >= change_threshold or is_failed_analysis(caption)
+                           or caption_similarity(caption, reference[2]) < CAPTION_SIMILARITY
+                           or timestamp - reference[0] >= TIER_MAX_GAP)
+                if new:
+                    reference = (timestamp, sig, caption)
+                    yield frame, record
+                else:
+                    record["reused_from"] = round(reference[0], 2)
+                    yield None, record
+
+        def detail(item: Tuple[Optional[np.ndarray], Dict[str, Any]]) -> Optional[Tuple[str, dict]]:
+            frame = item[0]
+            if frame is None:
+                return None
+            metrics: Dict[str, Any] = {}
+            return self.analyze_frame(frame, metrics=metrics, timestamp=item[1]["timestamp"]), metrics
+
+        try:
+            triaged = ordered_map(triage, frames, pool, max_pending)
+            last_detail = ""
+            for (_, record), result in ordered_map(detail, decide(triaged), pool, max_pending):
+                if result is None:
+                    record["analysis"] = last_detail
+                    record["tier"] = "triage"
+                else:
+                    last_detail, record["metrics"] = result
+                    record["analysis"] = last_detail
+                    record["tier"] = "detailed"
+                yield record
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True)
+
+    def analyze_video(self, video_path: str, frame_interval: int = 30, start_time: float = 0, end_time: float = None,
+                      prefetch: int = 4, workers: int = 1, dedup: Optional[float] = None,
+                      sampling: str = "interval", max_per_minute: float = 12,
+                      scene_threshold: float = 0.15, batch_size: int = 1,
+                      checkpoint_path: Optional[str] = None, resume: bool = False,
+                      stream: bool = False, tiered: bool = False, change_threshold: float = 0.25,
+                      triage_tokens: int = 48, session: bool = False,
+                      context_tokens: int = SESSION_CONTEXT_TOKENS,
+                      progress: Optional[Callable[[int, Optional[int]], None]] = None,
+                      build_index: bool = False) -> List[Dict[str, Any]]:
+        """
+        Analyze entire video and return frame-by-frame results.
+
+        `sampling` is "interval" (every `frame_interval` frames) or "adaptive"
+        (representative frames per detected shot, at most `max_per_minute`
+        frames per minute on average; see detect_shots/plan_adaptive_samples).
+        `batch_size` packs that many frames into each request.
+
+        Frames are decoded in a background thread and handed over through a
+        queue of at most `prefetch` frames, so memory stays bounded no matter
+        how long the video is. `workers` sets how many frames are analyzed
+        concurrently (match it to the server's OLLAMA_NUM_PARALLEL). `dedup`
+        skips inference for near-duplicate frames (see iter_analyses).
+
+        With a frame index sidecar (see frame_index.py; `build_index` creates a
+        missing one first), time ranges map to exact frames, seeks go to
+        keyframes, and shots and `dedup` duplicates are found from the stored
+        signatures, so duplicate frames are never decoded.
+
+        With `checkpoint_path`, every finished frame is appended to that JSON
+        Lines file as soon as it is done. With `resume`, timestamps already
+        recorded there (without an error) are skipped and merged into the result.
+
+        With `stream`, replies are printed token by token as they arrive
+        (sequential single-frame requests only).
+
+        With `tiered`, every frame gets a cheap triage caption and only frames
+        with new content get the detailed analysis (see iter_tiered_analyses);
+        `dedup`, `batch_size` and `stream` do not apply.
+
+        With `session`, single-frame requests share FRAME_PROMPT as a fixed
+        system prompt and carry a rolling summary of up to `context_tokens`
+        tokens of earlier frames (see start_session). Multi-frame requests
+        (batch_size > 1) are unaffected.
+
+        `progress(done, expected)` is called after every finished frame
+        (`expected` may be None); an exception it raises stops the analysis.
+        """
         print(f"Analyzing video: {video_path}")
+        index = self.frame_index(video_path, build=build_index)
+        if index is not None:
+            print(f"Using frame index: {len(index)} frames, {len(index.keyframes)} keyframes, "
+                  f"{index.fps:.3f} fps avg")
+        
+        done: Dict[float, Dict[str, Any]] = {}
+        if checkpoint_path and resume:
+            done = load_checkpoint(checkpoint_path)
+            if done:
+                print(f"Resuming: {len(done)} frames already analyzed in {checkpoint_path}")
         
-        print("Extracting frames...")
-        frames = self.extract_frames(video_path, frame_interval, start_time, end_time)
-        print(f"Extracted {len(frames)} frames")
+        if sampling == "adaptive":
+            print("Detecting shots...")
+            with self.profiler.span("shot_detection"):
+                shots, fps = self.detect_shots(video_path, start_time, end_time, threshold=scene_threshold)
+            indices = self.plan_adaptive_samples(shots, fps, max_per_minute=max_per_minute)
+            expected = len(indices)
+            print(f"Found {len(shots)} shots, sampling {expected} frames")
+        elif sampling == "interval":
+            indices, fps = self.sample_indices(video_path, frame_interval, start_time, end_time)
+            expected = self.count_sampled_frames(video_path, frame_interval, start_time, end_time)
+            if expected is not None:
+                print(f"Sampling ~{expected} frames (every {frame_interval} frames)")
+        else:
+            raise ValueError(f"Unknown sampling mode: {sampling}")
         
-        print("Analyzing frames...")
+        duplicates: Dict[int, Tuple[int, float]] = {}
+        planned_dedup = bool(dedup) and index is not None and not tiered
+        if planned_dedup:
+            # The index holds every frame's signature: duplicates are never decoded
+            indices = list(indices)
+            duplicates = index.plan_dedup(indices, dedup)
+            indices = [idx for idx in indices if idx not in duplicates]
+            print(f"Frame index: {len(duplicates)} near-duplicate frames reuse an earlier analysis")
+        
+        if done:
+            # Skip finished frames before they are even decoded
+            indices = (idx for idx in indices if round(self.frame_time(video_path, idx, fps), 2) not in done)
+            if expected is not None:
+                expected = max(0, expected - len(done))
+        
+        print(f"Analyzing frames... (workers: {workers}, frames per request: {max(1, batch_size)})")
+        frames = prefetch_iter(self.iter_frames_at(video_path, indices), max(prefetch, workers * max(1, batch_size)))
         frame_analyses = []
-        for i, (frame, timestamp) in enumerate(tqdm(frames)):
-            analysis = self.analyze_frame(frame)
-            frame_analyses.append({
-                "frame_number": i + 1,
-                "timestamp": round(timestamp, 2),
-                "analysis": analysis
-            })
+        checkpoint = None
+        if checkpoint_path:
+            checkpoint = open(checkpoint_path, "a" if resume else "w", encoding="utf-8")
+        streaming = stream and workers <= 1 and batch_size <= 1 and not tiered
+        if stream and not streaming:
+            print("Note: --stream only applies with --workers 1 and --batch 1 (and not --tiered)")
+        on_token = (lambda t: (sys.stdout.write(t), sys.stdout.flush())) if streaming else None
+        if session:
+            chat = self.start_session(context_tokens)
+            print(f"Session mode: shared system prompt, rolling summary of up to {chat.context_tokens} tokens")
+            if batch_size > 1 and not tiered:
+                print("Note: session mode only applies to single-frame requests (--batch 1)")
+        try:
+            if tiered:
+                analyses = self.iter_tiered_analyses(frames, workers, change_threshold=change_threshold,
+                                                     triage_tokens=triage_tokens)
+            elif planned_dedup:
+                analyses = self._splice_duplicates(self.iter_analyses(frames, workers, None, batch_size,
+                                                                      on_token=on_token),
+                                                   duplicates, video_path, fps, done)
+            else:
+                analyses = self.iter_analyses(frames, workers, dedup, batch_size, on_token=on_token)
+            for record in tqdm(analyses, total=expected, disable=streaming):
+                result = {
+                    "timestamp": round(record["timestamp"], 2),
+                    "analysis": record["analysis"]
+                }
+                if "reused_from" in record:
+                    self.profiler.count("frames_reused")
+                    result["reused"] = True
+                    result["reused_from"] = record["reused_from"]
+                for key in ("similarity", "tier", "triage", "change", "metrics", "triage_metrics"):
+                    if key in record:
+                        result[key] = record[key]
+                frame_analyses.append(result)
+                if checkpoint is not None:
+                    checkpoint.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    checkpoint.flush()
+                if progress is not None:
+                    progress(len(frame_analyses), expected)
+        finally:
+            frames.close()  # stops the decode thread if analysis was interrupted
+            if session:
+                self.end_session()
+            if checkpoint is not None:
+                checkpoint.close()
+        
+        reused = sum(1 for r in frame_analyses if r.get("reused"))
+        if reused and tiered:
+            print(f"Detailed analysis on {len(frame_analyses) - reused} frames; "
+                  f"{reused} frames without new content reuse it with their own triage caption")
+        elif reused:
+            print(f"Reused analysis for {reused} near-duplicate frames")
         
-        return frame_analyses
+        # Merge with resumed frames and number everything in time order
+        new_timestamps = {r["timestamp"] for r in frame_analyses}
+        frame_analyses += [r for ts, r in done.items() if ts not in new_timestamps]
+        frame_analyses.sort(key=lambda r: r["timestamp"])
+        return [{"frame_number": i, **r} for i, r in enumerate(frame_analyses, 1)]
+
+    def summarize(self, results: List[Dict[str, Any]], window_s: float = 60.0, scene_s: float = 300.0,
+                  workers: int = 1, summary_tokens: int = 384) -> Dict[str, Any]:
+        """
+        Window, scene and whole-video summaries of analyze_video results (see
+        video_summary.py), each call within config.json model.max_context_length.
+        """
+        summarizer = VideoSummarizer(self.ollama, context_tokens=self.settings.max_context_length or 32000,
+                                     summary_tokens=summary_tokens, window_s=window_s, scene_s=scene_s,
+                                     workers=workers, use_cache=self.cache is not None)
+        with self.profiler.span("summary"):
+            return summarizer.summarize(results)
+
+    def _splice_duplicates(self, records: Iterable[Dict[str, Any]], duplicates: Dict[int, Tuple[int, float]],
+                           video_path: str, fps: float,
+                           done: Dict[float, Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Yield analysis `records` with the near-duplicates planned from the frame
+        index (see FrameIndex.plan_dedup) following their reference frame, in the
+        form iter_analyses gives reused frames. Frames in `done` are not repeated.
+        """
+        followers: Dict[int, List[Tuple[int, float]]] = {}
+        for frame, (reference, similarity) in sorted(duplicates.items()):
+            followers.setdefault(reference, []).append((frame, similarity))
+        by_time = {round(self.frame_time(video_path, ref, fps), 2): ref for ref in followers}
+
+        def reuse(reference: int, analysis: str) -> Iterator[Dict[str, Any]]:
+            reused_from = round(self.frame_time(video_path, reference, fps), 2)
+            for frame, similarity in followers.pop(reference, []):
+                timestamp = self.frame_time(video_path, frame, fps)
+                if round(timestamp, 2) not in done:
+                    yield {"timestamp": timestamp, "analysis": analysis, "reused_from": reused_from,
+                           "similarity": round(similarity, 3)}
+
+        # References analyzed by an earlier (resumed) run
+        for timestamp, record in done.items():
+            if timestamp in by_time:
+                yield from reuse(by_time[timestamp], record["analysis"])
+        for record in records:
+            yield record
+            reference = by_time.get(round(record["timestamp"], 2))
+            if reference is not None:
+                yield from reuse(reference, record["analysis"])
+
+    def analyze_video_sharded(self, video_path: str, shards: int, frame_interval: int = 30, start_time: float = 0,
+                              end_time: float = None, checkpoint_path: Optional[str] = None,
+                              resume: bool = False, **kwargs) -> Dict[str, Any]:
+        """
+        Analyze a video as `shards` time segments, each in its own worker process
+        (own decoder, Ollama client and `workers` pool), and merge the results.
+
+        Each shard checkpoints to `<checkpoint>.shard<N>.jsonl`; with `resume`,
+        each shard skips what its file already holds (use the same shard count).
+        Other keyword arguments go to analyze_video in every shard. Sampling,
+        dedup, tiered triage and session summaries restart at each shard boundary.
+
+        Returns:
+            {"results": merged frame records numbered in time order,
+             "shards": per-shard {"range", "frames", "cache", "hosts"} reports}
+        """
+        sampling = kwargs.get("sampling", "interval")
+        if kwargs.pop("build_index", False):
+            # Once here, so every shard finds it on disk
+            self.frame_index(video_path, build=True)
+        grid = frame_interval if sampling == "interval" else 1
+        ranges = self.shard_ranges(video_path, shards, grid, start_time, end_time)
+        if len(ranges) < 2:
+            print("Video length unknown or too short to shard; analyzing in this process")
+            results = self.analyze_video(video_path, frame_interval=frame_interval, start_time=start_time,
+                                         end_time=end_time, checkpoint_path=checkpoint_path, resume=resume,
+                                         **kwargs)
+            return {"results": results, "shards": []}
+
+        print(f"Analyzing video: {video_path}")
+        print(f"Sharding into {len(ranges)} processes: "
+              + ", ".join(f"{a:.2f}-{b:.2f}s" for a, b in ranges))
+        expected = None
+        if sampling == "interval":
+            expected = self.count_sampled_frames(video_path, frame_interval, start_time, end_time)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            stem = os.path.splitext(checkpoint_path)[0] if checkpoint_path else os.path.join(tmp, "progress")
+            paths = [f"{stem}.shard{i}.jsonl" for i in range(1, len(ranges) + 1)]
+            # Streaming needs the console; shard output is discarded
+            kwargs["stream"] = False
+            jobs = [(self.shard_kwargs, self.profiler.enabled, video_path,
+                     dict(kwargs, frame_interval=frame_interval, start_time=a, end_time=b,
+                          checkpoint_path=path, resume=resume))
+                    for (a, b), path in zip(ranges, paths)]
+            # spawn: CUDA/OpenCV/HTTP state doesn't survive fork reliably
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=len(jobs), mp_context=context) as pool:
+                futures = [pool.submit(_run_shard, *job) for job in jobs]
+                # Progress comes from the shards' checkpoint files
+                with tqdm(total=expected) as bar:
+                    while True:
+                        finished, _ = wait(futures, timeout=0.5)
+                        lines = 0
+                        for path in paths:
+                            if os.path.exists(path):
+                                with open(path, "rb") as f:
+                                    lines += f.read().count(b"\n")
+                        bar.update(max(0, lines - bar.n))
+                        if len(finished) == len(futures):
+                            break
+                reports = [future.result() for future in futures]
+
+        merged: Dict[float, Dict[str, Any]] = {}
+        shard_reports = []
+        for (a, b), report in zip(ranges, reports):
+            for record in report["results"]:
+                record.pop("frame_number", None)
+                merged.setdefault(record["timestamp"], record)
+            self.profiler.merge(report["profile"], label=f"shard {len(shard_reports) + 1}")
+            shard_reports.append({"range": [round(a, 2), round(b, 2)], "frames": len(report["results"]),
+                                  "cache": report["cache"], "hosts": report["hosts"]})
+        results = sorted(merged.values(), key=lambda r: r["timestamp"])
+        return {"results": [{"frame_number": i, **r} for i, r in enumerate(results, 1)], "shards": shard_reports}
+
+
+def _run_shard(analyzer_kwargs: Dict[str, Any], profile: bool, video_path: str,
+               analyze_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Worker process entry point for analyze_video_sharded (console output is discarded)."""
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull), redirect_stderr(devnull):
+        # The parent already warmed up the model
+        analyzer = VideoAnalyzer(profiler=Profiler(enabled=profile), warm_up=False, **analyzer_kwargs)
+        try:
+            results = analyzer.analyze_video(video_path, **analyze_kwargs)
+        finally:
+            analyzer.ollama.close()
+    return {
+        "results": results,
+        "cache": analyzer.cache.stats() if analyzer.cache is not None else None,
+        "hosts": analyzer.ollama.host_stats(),
+        "profile": analyzer.profiler.export(),
+    }
+
+
+class _FrameBatch:
+    """Frames grouped into one request (frames are handed off when it is submitted)."""
+
+    def __init__(self):
+        self.frames: List[np.ndarray] = []
+        self.timestamps: List[float] = []
+        self.future: Optional[Future] = None
+
+    def add(self, frame: np.ndarray, timestamp: float) -> int:
+        self.frames.append(frame)
+        self.timestamps.append(timestamp)
+        return len(self.timestamps) - 1
+
+
+def summarize_metrics(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Aggregate per-request metrics (latency percentiles, time to first token, tokens/s).
+
+    Model loads are reported on their own: "cold_loads" counts requests that
+    had to load the model and "warm_total_s" is latency minus load time.
+    Frames resumed from a checkpoint were timed by an earlier run and are skipped.
+    """
+    metrics = [r["metrics"] for r in results
+               if r.get("metrics") and not r["metrics"].get("cached") and not r.get("resumed")]
+    # Frames that shared a batch request share one metrics dict; count it once
+    unique = list({id(m): m for m in metrics}.values())
+    summary: Dict[str, Any] = {"requests": len(unique)}
+    summary["cold_loads"] = sum(1 for m in unique if (m.get("load_duration_s") or 0) >= COLD_LOAD_THRESHOLD)
+    series = {field: [m[field] for m in unique if m.get(field) is not None]
+              for field in ("total_s", "ttft_s", "tokens_per_s", "load_duration_s", "visual_tokens",
+                            "queue_wait_s")}
+    series["warm_total_s"] = [m["total_s"] - (m.get("load_duration_s") or 0)
+                              for m in unique if m.get("total_s") is not None]
+    for field, values in series.items():
+        if values:
+            summary[field] = {
+                "mean": round(float(np.mean(values)), 4),
+                "p50": round(float(np.percentile(values, 50)), 4),
+                "p95": round(float(np.percentile(values, 95)), 4),
+            }
+    return summary
+
+
+def shrink_frame(frame: np.ndarray, max_side: int) -> np.ndarray:
+    """Area-downscale a frame so its longest side is at most `max_side` (never upscales)."""
+    h, w = frame.shape[:2]
+    scale = max_side / float(max(h, w))
+    if scale >= 1.0:
+        return frame
+    return cv2.resize(frame, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+def caption_similarity(a: str, b: str) -> float:
+    """Jaccard overlap (0-1) of the words of three or more letters in two captions."""
+    words_a, words_b = (set(re.findall(r"[a-z]{3,}", text.lower())) for text in (a, b))
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def ordered_map(fn: Callable[[Any], Any], items: Iterable, pool: Optional[ThreadPoolExecutor],
+                max_pending: int) -> Iterator[Tuple[Any, Any]]:
+    """
+    Yield (item, fn(item)) in input order, running fn on `pool` with at most
+    `max_pending` calls in flight (inline when pool is None).
+    """
+    pending: "deque" = deque()
+    try:
+        for item in items:
+            if pool is None:
+                yield item, fn(item)
+                continue
+            pending.append((item, pool.submit(fn, item)))
+            while len(pending) >= max_pending:
+                done_item, future = pending.popleft()
+                yield done_item, future.result()
+        while pending:
+            done_item, future = pending.popleft()
+            yield done_item, future.result()
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+def load_checkpoint(path: str) -> Dict[float, Dict[str, Any]]:
+    """
+    Read a JSON Lines checkpoint into {timestamp: record}.
+
+    Failed analyses and a truncated last line (from a crash mid-write) are
+    ignored, so those frames are analyzed again. Records are marked
+    "resumed": their metrics describe requests of the earlier run.
+    """
+    done: Dict[float, Dict[str, Any]] = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(record, dict) or "timestamp" not in record:
+                continue
+            if is_failed_analysis(str(record.get("analysis", ""))):
+                continue
+            record.pop("frame_number", None)
+            record["resumed"] = True
+            done[round(float(record["timestamp"]), 2)] = record
+    return done
+
+
+def prefetch_iter(iterable: Iterable, size: int = 4) -> Iterator:
+    """
+    Run `iterable` in a background thread, buffering at most `size` items.
+
+    Exceptions raised by the producer are re-raised in the consumer.
+    """
+    if size <= 0:
+        yield from iterable
+        return
+
+    q: "queue.Queue" = queue.Queue(maxsize=size)
+    stop = threading.Event()
+    done = object()
+
+    def _producer():
+        it = iter(iterable)
+        try:
+            for item in it:
+                while not stop.is_set():
+                    try:
+                        q.put(("item", item), timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            q.put(("done", done))
+        except BaseException as e:  # propagate to consumer
+            q.put(("error", e))
+        finally:
+            close = getattr(it, "close", None)
+            if close is not None:
+                close()
+
+    t = threading.Thread(target=_producer, daemon=True)
+    t.start()
+    try:
+        while True:
+            kind, item = q.get()
+            if kind == "item":
+                yield item
+            elif kind == "error":
+                raise item
+            else:
+                break
+    finally:
+        stop.set()
+        # Drain so a blocked producer can observe `stop`
+        while t.is_alive():
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                t.join(timeout=0.1)
 
 
 def parse_time(time_str):
@@ -145,15 +1036,92 @@ def parse_time(time_str):
 
 
 def main():
+    settings = load_settings()
     parser = argparse.ArgumentParser(description='Analyze video frames using Qwen3-VL')
     parser.add_argument('video_path', help='Path to video file')
     parser.add_argument('--start', default='0:00', help='Start time (mm:ss)')
     parser.add_argument('--end', default=None, help='End time (mm:ss)')
-    parser.add_argument('--interval', type=int, default=30, help='Frame interval (default: 30)')
+    parser.add_argument('--interval', type=int, default=settings.frame_interval,
+                        help=f'Frame interval (default: video_analysis.frame_interval in config.json, '
+                             f'{settings.frame_interval})')
+    parser.add_argument('--sampling', choices=['interval', 'adaptive'], default='interval',
+                        help='interval: every --interval frames; adaptive: representative frames per shot')
+    parser.add_argument('--max-per-minute', type=float, default=12,
+                        help='Adaptive sampling budget in frames per minute of video (default: 12)')
+    parser.add_argument('--scene-threshold', type=float, default=0.15,
+                        help='Adaptive sampling shot-cut threshold, mean pixel change 0-1 (default: 0.15)')
+    parser.add_argument('--tiered', action='store_true',
+                        help='Cheap triage caption for every frame, detailed analysis only for frames with new content')
+    parser.add_argument('--change-threshold', type=float, default=0.25,
+                        help='Tiered mode: pixel change (0-1) vs the last detailed frame that counts as new content '
+                             '(default: 0.25)')
+    parser.add_argument('--triage-tokens', type=int, default=48,
+                        help='Tiered mode: max tokens for the triage caption (default: 48)')
+    parser.add_argument('--session', action='store_true',
+                        help='Send the instructions once as a shared system prompt and give each frame '
+                             'a rolling summary of earlier frames (better camera-movement answers)')
+    parser.add_argument('--context-tokens', type=int, default=SESSION_CONTEXT_TOKENS,
+                        help=f'Session mode: token budget for the rolling summary, 0 to disable '
+                             f'(default: {SESSION_CONTEXT_TOKENS}, capped by model.max_context_length)')
+    parser.add_argument('--summary', action='store_true',
+                        help='Also summarize the video: time windows, then scenes, then the whole video '
+                             '(saved to <output>_summary.json)')
+    parser.add_argument('--summary-window', type=float, default=60.0,
+                        help='Summary: window length in seconds (default: 60)')
+    parser.add_argument('--summary-scene', type=float, default=300.0,
+                        help='Summary: scene length in seconds (default: 300)')
     parser.add_argument('--output', default=None, help='Output JSON path (default: auto)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Skip frames already recorded in the .jsonl checkpoint next to the output')
     parser.add_argument('--model', default=None, help='Model name (default: from config.json)')
+    parser.add_argument('--batch', type=int, default=1, metavar='N',
+                        help='Frames sent per request (default: 1); consecutive frames are analyzed together')
+    parser.add_argument('--dedup', type=float, default=None, metavar='SIMILARITY',
+                        help='Reuse the previous analysis for frames at least this similar (0-1, e.g. 0.95)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Print each reply token by token as it arrives (sequential mode only)')
+    parser.add_argument('--no-cache', action='store_true', help='Ignore and do not update the result cache')
+    parser.add_argument('--option', action='append', default=None, metavar='KEY=VALUE',
+                        help='Override an Ollama option from config.json model.parameters, e.g. '
+                             '--option temperature=0.2 --option num_ctx=16384 (repeatable)')
+    parser.add_argument('--decoder', choices=DECODERS, default='opencv',
+                        help='Frame decode backend: opencv (default), pyav (pip install av) or ffmpeg '
+                             '(subprocess piping frames at the encode resolution)')
+    parser.add_argument('--decode-threads', type=int, default=0,
+                        help='Decoder threads (default: 0, backend decides)')
+    parser.add_argument('--hw-accel', action='store_true',
+                        help='Use hardware video decoding where available (opencv, ffmpeg)')
+    parser.add_argument('--keyframes-only', action='store_true',
+                        help='pyav decoder: decode keyframes only (fast, frames snap to the next keyframe)')
+    parser.add_argument('--index', action='store_true',
+                        help='Build the frame index sidecar (<video>.frames.npz) if missing: exact timestamps and '
+                             'keyframe seeks, shots and --dedup planned without decoding; used whenever present')
+    parser.add_argument('--no-index', action='store_true', help='Ignore the frame index sidecar')
+    parser.add_argument('--visual-tokens', default=None, metavar='N|PRESET',
+                        help=f'Visual token budget per frame; frames are resized to the model\'s token grid within '
+                             f'it. A number, a preset ({", ".join(VISUAL_TOKEN_PRESETS)}) or off '
+                             f'(default: image_encoding.max_visual_tokens in config.json)')
+    parser.add_argument('--no-warmup', action='store_true',
+                        help='Do not load the model before the first frame (default: ollama.warm_up in config.json)')
+    parser.add_argument('--host', action='append', default=None, metavar='URL',
+                        help='Ollama endpoint; repeat to spread frames across several servers '
+                             '(default: ollama.endpoints from config.json)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Frames analyzed concurrently at most (default: 1); with ollama.concurrency.adaptive '
+                             'the client keeps in-flight requests at what the server handles without queueing')
+    parser.add_argument('--shards', type=int, default=1, metavar='N',
+                        help='Split the time range into N segments analyzed by separate processes, each with '
+                             'its own decoder and --workers requests in flight (default: 1)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Time each stage; print a summary and write a per-frame breakdown next to the output')
+    parser.add_argument('--trace', default=None, metavar='PATH',
+                        help='Write a Chrome trace (chrome://tracing, ui.perfetto.dev) of all stages; implies --profile')
     
     args = parser.parse_args()
+    try:
+        options = parse_option_overrides(args.option)
+    except ValueError as e:
+        parser.error(str(e))
     
     if not os.path.exists(args.video_path):
         print(f"Error: Video not found: {args.video_path}")
@@ -169,33 +1137,139 @@ def main():
     if end_time:
         print(f"  End: {end_time}s ({args.end})")
         print(f"  Duration: {end_time - start_time}s")
-    print(f"  Frame interval: every {args.interval} frames")
+    if args.sampling == 'adaptive':
+        print(f"  Sampling: adaptive (<= {args.max_per_minute:g} frames/min, cut threshold {args.scene_threshold})")
+    else:
+        print(f"  Frame interval: every {args.interval} frames")
+    print(f"  Workers: {args.workers}" + (f" per shard, {args.shards} shards" if args.shards > 1 else ""))
+    if args.decoder != 'opencv' or args.decode_threads:
+        print(f"  Decoder: {args.decoder}" + (f" ({args.decode_threads} threads)" if args.decode_threads else ""))
+    if args.batch > 1:
+        print(f"  Frames per request: {args.batch}")
+    if args.dedup:
+        print(f"  Dedup: skip frames >= {args.dedup:.0%} similar")
+    if args.visual_tokens:
+        print(f"  Visual tokens per frame: {args.visual_tokens}")
+    if args.tiered:
+        print(f"  Tiered: triage every frame, detailed pass on new content (change >= {args.change_threshold})")
+    if options:
+        print(f"  Options: {', '.join(f'{k}={v}' for k, v in options.items())}")
     print()
     
-    analyzer = VideoAnalyzer(model_name=args.model)
+    profiler = Profiler(enabled=args.profile or args.trace is not None)
+    analyzer = VideoAnalyzer(model_name=args.model, ollama_base_url=args.host, use_cache=not args.no_cache,
+                             profiler=profiler, warm_up=False if args.no_warmup else None, options=options,
+                             decoder=args.decoder,
+                             decoder_options={"threads": args.decode_threads, "hw_accel": args.hw_accel,
+                                              "keyframes_only": args.keyframes_only},
+                             max_visual_tokens=args.visual_tokens, use_index=not args.no_index)
     
+    max_batch = analyzer.max_batch_size()
+    if max_batch is not None and args.batch > max_batch:
+        parser.error(f"--batch {args.batch} does not fit the model's {analyzer.settings.max_context_length}-token "
+                     f"context; use at most {max_batch} (or lower --visual-tokens)")
+
     if args.output is None:
         video_basename = os.path.splitext(os.path.basename(args.video_path))[0]
         results_dir = os.path.join(os.path.dirname(__file__), '..', 'results')
         os.makedirs(results_dir, exist_ok=True)
         args.output = os.path.join(results_dir, f"{video_basename}_analysis.json")
+    # Frames are appended here as they finish, so an interrupted run can --resume
+    checkpoint_path = os.path.splitext(args.output)[0] + ".jsonl"
     
     print("Starting analysis...\n")
-    results = analyzer.analyze_video(args.video_path, start_time=start_time, end_time=end_time)
+    analyze_kwargs = dict(frame_interval=args.interval, start_time=start_time, end_time=end_time,
+                          workers=args.workers, dedup=args.dedup, sampling=args.sampling,
+                          max_per_minute=args.max_per_minute, scene_threshold=args.scene_threshold,
+                          batch_size=args.batch, checkpoint_path=checkpoint_path, resume=args.resume,
+                          stream=args.stream, tiered=args.tiered, change_threshold=args.change_threshold,
+                          triage_tokens=args.triage_tokens, session=args.session,
+                          context_tokens=args.context_tokens, build_index=args.index and not args.no_index)
+    shard_reports = []
+    with profiler.span("analyze_video"):
+        if args.shards > 1:
+            print(f"Writing progress to: {os.path.splitext(checkpoint_path)[0]}.shard<N>.jsonl")
+            sharded = analyzer.analyze_video_sharded(args.video_path, args.shards, **analyze_kwargs)
+            results, shard_reports = sharded["results"], sharded["shards"]
+        else:
+            print(f"Writing progress to: {checkpoint_path}")
+            results = analyzer.analyze_video(args.video_path, **analyze_kwargs)
     
     print("\n" + "="*70)
     print("VIDEO ANALYSIS RESULTS")
     print("="*70)
     
     for i, result in enumerate(results, 1):
-        print(f"\n--- Frame {i} (Time: {result.get('timestamp', 'N/A')}s) ---")
-        print(result.get('analysis', 'No analysis available'))
+        reused = f", reused from {result['reused_from']}s" if result.get('reused') else ""
+        print(f"\n--- Frame {i} (Time: {result.get('timestamp', 'N/A')}s{reused}) ---")
+        if result.get('tier') == 'triage':
+            print(result.get('triage', ''))
+        else:
+            print(result.get('analysis', 'No analysis available'))
     
     with open(args.output, 'w', encoding='utf-8') as f:
         json.dump(results, f, indent=2, ensure_ascii=False)
     
     print(f"\n✓ Results saved to: {args.output}")
     print(f"✓ Analysis complete! Processed {len(results)} frames.")
+    if args.summary:
+        print("\nSummarizing...")
+        summary = analyzer.summarize(results, window_s=args.summary_window, scene_s=args.summary_scene,
+                                     workers=args.workers)
+        print_summary(summary)
+        summary_path = os.path.splitext(args.output)[0] + "_summary.json"
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"✓ Summary saved to: {summary_path}")
+    summary = summarize_metrics(results)
+    if summary["requests"]:
+        parts = [f"{summary['requests']} requests"]
+        for field, label in (("total_s", "latency"), ("ttft_s", "TTFT")):
+            if field in summary:
+                parts.append(f"{label} p50 {summary[field]['p50']:.2f}s / p95 {summary[field]['p95']:.2f}s")
+        if "tokens_per_s" in summary:
+            parts.append(f"{summary['tokens_per_s']['mean']:.1f} tokens/s")
+        print(f"✓ Timing: {', '.join(parts)}")
+        if summary["cold_loads"]:
+            warm = summary["warm_total_s"]
+            print(f"✓ Model loads: {summary['cold_loads']} request(s) waited for the model to load "
+                  f"(latency without load p50 {warm['p50']:.2f}s / p95 {warm['p95']:.2f}s); "
+                  f"enable warm-up or raise ollama.keep_alive to avoid this")
+    for shard in shard_reports:
+        start, end = shard["range"]
+        print(f"✓ Shard {start:.2f}-{end:.2f}s: {shard['frames']} frames")
+    host_stats = analyzer.ollama.host_stats()
+    cache_stats = analyzer.cache.stats() if analyzer.cache is not None else None
+    if shard_reports:
+        # The work happened in the shard processes; add up their counters
+        host_stats = [dict(h, requests=sum(s["hosts"][i]["requests"] for s in shard_reports),
+                           failures=sum(s["hosts"][i]["failures"] for s in shard_reports),
+                           circuit_open=any(s["hosts"][i]["circuit_open"] for s in shard_reports))
+                      for i, h in enumerate(host_stats)]
+        if cache_stats is not None:
+            cache_stats = {k: sum(s["cache"][k] for s in shard_reports) for k in ("hits", "misses")}
+    concurrency = analyzer.ollama.concurrency_stats()
+    if concurrency and args.workers > 1 and not shard_reports:
+        print(f"✓ Concurrency: limit {concurrency['limit']} (range {concurrency['min_limit']}-"
+              f"{concurrency['max_limit']}, raised {concurrency['increases']}x, lowered {concurrency['decreases']}x), "
+              f"peak queue {concurrency['peak_queued']}, {concurrency['timeouts']} timeouts")
+    if len(host_stats) > 1:
+        for host in host_stats:
+            state = " (circuit open)" if host["circuit_open"] else ""
+            print(f"✓ Host {host['url']}: {host['requests']} requests, {host['failures']} failures{state}")
+    if cache_stats is not None:
+        print(f"✓ Cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    if profiler.enabled:
+        profile_path = os.path.splitext(args.output)[0] + "_profile.json"
+        with open(profile_path, 'w', encoding='utf-8') as f:
+            json.dump({"stages": profiler.stage_summary(), "counters": profiler.counters,
+                       "frames": frame_breakdown(profiler, results)}, f, indent=2)
+        print("\nStage timings (stages on different threads overlap):")
+        print(profiler.format_summary())
+        print(f"\n✓ Per-frame profile saved to: {profile_path}")
+        if args.trace:
+            profiler.write_chrome_trace(args.trace)
+            print(f"✓ Chrome trace saved to: {args.trace}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,135 @@
+"""
+Adaptive cap on in-flight Ollama requests (AIMD).
+
+Ollama processes OLLAMA_NUM_PARALLEL requests at once and queues the rest, so
+sending more than it can take only adds waiting time (and timeouts). The
+limiter starts low and raises the cap by one after every round of requests
+that finished without any of them queueing; it halves the cap on a timeout,
+a 5xx response or sustained queueing delay.
+
+Queueing delay is measured as a request's overhead: its latency minus the
+time Ollama spent generating tokens (eval_duration). That leaves prefill,
+transfer and time spent waiting for a slot; prefill and transfer stay roughly
+constant for similar requests, so overhead rising well above its recent
+low-water mark means requests are queueing on the server.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+
+class AdaptiveLimiter:
+    """Thread-safe AIMD limiter; callers acquire() before a request and release() after it."""
+
+    def __init__(self, initial: int = 2, min_limit: int = 1, max_limit: int = 8, tolerance: float = 2.0,
+                 backoff: float = 0.5, window: int = 50):
+        """
+        Args:
+            initial (int): Starting cap on in-flight requests
+            min_limit (int): Lower bound for the cap
+            max_limit (int): Upper bound for the cap
+            tolerance (float): Overhead above this multiple of its low-water mark counts as queueing
+            backoff (float): Factor the cap is multiplied by on congestion
+            window (int): Recent requests the overhead low-water mark is taken over
+        """
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.limit = min(max(int(initial), self.min_limit), self.max_limit)
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.in_flight = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.increases = 0
+        self.decreases = 0
+        self._overheads: deque = deque(maxlen=window)
+        self._smoothed: Optional[float] = None
+        # Requests sent before the last change don't count toward (or trigger) another
+        self._epoch = 0
+        self._successes = 0
+        self._saturated = False
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[int]:
+        """
+        Wait for a free slot. Returns a ticket for release(), or None if no
+        slot freed up within `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+            try:
+                while self.in_flight >= self.limit:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return None
+                    self._cond.wait(remaining)
+            finally:
+                self.queued -= 1
+            self.in_flight += 1
+            if self.in_flight >= self.limit:
+                self._saturated = True
+            return self._epoch
+
+    def release(self, ticket: int, overhead: Optional[float] = None, failed: bool = False):
+        """
+        Free a slot and adjust the cap.
+
+        Args:
+            ticket (int): Value returned by acquire()
+            overhead (float|None): Seconds the request took beyond token generation
+                (None if unknown, e.g. a cached or failed request)
+            failed (bool): The request timed out or the server returned a 5xx error
+        """
+        with self._cond:
+            self.in_flight -= 1
+            congested = failed
+            queued = False
+            if overhead is not None and not failed:
+                self._overheads.append(overhead)
+                self._smoothed = overhead if self._smoothed is None else 0.7 * self._smoothed + 0.3 * overhead
+                # A small absolute slack keeps tiny overheads from looking like queueing
+                threshold = min(self._overheads) * self.tolerance + 0.05
+                queued = overhead > threshold
+                # One slow request may be noise; a sustained rise is congestion
+                congested = self._smoothed > threshold
+            if ticket == self._epoch:
+                if congested:
+                    self._change(max(self.min_limit, int(self.limit * self.backoff)))
+                    self.decreases += 1
+                    # Start the comparison afresh at the new level
+                    self._smoothed = None
+                elif queued:
+                    # Not clean enough to grow on
+                    self._successes = 0
+                elif overhead is not None:
+                    self._successes += 1
+                    # Grow only when the cap was actually the bottleneck
+                    if self._successes >= self.limit and self._saturated and self.limit < self.max_limit:
+                        self._change(self.limit + 1)
+                        self.increases += 1
+            self._cond.notify_all()
+
+    def _change(self, limit: int):
+        self.limit = limit
+        self._epoch += 1
+        self._successes = 0
+        self._saturated = self.in_flight >= limit
+
+    def stats(self) -> Dict[str, Any]:
+        """Current cap, in-flight and waiting requests, and how often the cap moved."""
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "peak_queued": self.peak_queued,
+                "increases": self.increases,
+                "decreases": self.decreases,
+                "overhead_floor_s": round(min(self._overheads), 4) if self._overheads else None,
+            }
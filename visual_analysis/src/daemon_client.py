@@ -0,0 +1,191 @@
+"""
+Thin command-line client for the analysis daemon (see analysis_daemon.py).
+
+Only imports requests, so submitting a job costs no OpenCV/NumPy/PIL
+startup; the daemon does the work with its warm model.
+
+Usage:
+    python -m visual_analysis.src.daemon_client video video.mp4 --interval 15 --workers 4 --priority 5
+    python -m visual_analysis.src.daemon_client video video.mp4 --start 1:05 --end 2:45 --wait
+    python -m visual_analysis.src.daemon_client image data/photos/ --workers 4
+    python -m visual_analysis.src.daemon_client status           # all recent jobs
+    python -m visual_analysis.src.daemon_client status 12        # one job
+    python -m visual_analysis.src.daemon_client result 12 --output result.json
+    python -m visual_analysis.src.daemon_client cancel 12
+"""
+import sys
+import os
+import argparse
+import json
+import time
+from typing import Any, Dict, Optional
+
+import requests
+
+from .settings import load_settings
+
+
+class DaemonClient:
+    """HTTP client for the analysis daemon's job API."""
+
+    def __init__(self, url: Optional[str] = None, timeout: float = 10.0):
+        """
+        Args:
+            url (str|None): Daemon URL (default: daemon.host/port in config.json)
+            timeout (float): Seconds to wait for each API call
+        """
+        self.url = (url or load_settings().daemon_url).rstrip("/")
+        self.timeout = timeout
+
+    def _call(self, method: str, path: str, **kwargs) -> Any:
+        try:
+            r = requests.request(method, self.url + path, timeout=self.timeout, **kwargs)
+        except requests.ConnectionError:
+            raise RuntimeError(f"Analysis daemon not reachable at {self.url} "
+                               f"(start it with: python -m visual_analysis.src.analysis_daemon)") from None
+        body = r.json()
+        if r.status_code >= 400:
+            raise RuntimeError(body.get("error", f"HTTP {r.status_code}"))
+        return body
+
+    def status(self) -> Dict[str, Any]:
+        return self._call("GET", "/")
+
+    def submit(self, kind: str, path: str, params: Optional[Dict[str, Any]] = None,
+               priority: int = 0) -> Dict[str, Any]:
+        """Queue an image or video job; `path` is made absolute for the daemon."""
+        if not any(ch in path for ch in "*?["):
+            path = os.path.abspath(path)
+        return self._call("POST", "/jobs", json={"kind": kind, "path": path, "params": params or {},
+                                                 "priority": priority})
+
+    def job(self, job_id: int) -> Dict[str, Any]:
+        return self._call("GET", f"/jobs/{job_id}")
+
+    def jobs(self, status: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
+        params: Dict[str, Any] = {"limit": limit}
+        if status:
+            params["status"] = status
+        return self._call("GET", "/jobs", params=params)["jobs"]
+
+    def result(self, job_id: int) -> Any:
+        return self._call("GET", f"/jobs/{job_id}/result")["result"]
+
+    def cancel(self, job_id: int) -> Dict[str, Any]:
+        return self._call("DELETE", f"/jobs/{job_id}")
+
+    def wait(self, job_id: int, poll: float = 1.0) -> Dict[str, Any]:
+        """Poll until the job finishes, printing progress; returns the final job."""
+        last = None
+        while True:
+            job = self.job(job_id)
+            line = format_job(job)
+            if line != last:
+                print(line)
+                last = line
+            if job["status"] not in ("queued", "running"):
+                return job
+            time.sleep(poll)
+
+
+def format_job(job: Dict[str, Any]) -> str:
+    """One-line job status."""
+    progress = f"{job['progress']}/{job['total']}" if job.get("total") else str(job.get("progress", 0))
+    line = f"#{job['id']:<5} {job['status']:<9} {job['kind']:<5} p{job['priority']:<3} {progress:>9}  {job['path']}"
+    if job.get("error"):
+        line += f"  ({job['error']})"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Submit and track jobs on the Qwen3-VL analysis daemon')
+    parser.add_argument('--url', default=None, help='Daemon URL (default: daemon.host/port in config.json)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    video = sub.add_parser('video', help='Queue a video analysis')
+    video.add_argument('path', help='Path to video file')
+    video.add_argument('--start', default=None, help='Start time (mm:ss)')
+    video.add_argument('--end', default=None, help='End time (mm:ss)')
+    video.add_argument('--interval', type=int, default=None, help='Frame interval (default: from config.json)')
+    video.add_argument('--sampling', choices=['interval', 'adaptive'], default=None)
+    video.add_argument('--max-per-minute', type=float, default=None)
+    video.add_argument('--workers', type=int, default=None, help='Frames analyzed concurrently')
+    video.add_argument('--batch', type=int, default=None, metavar='N', help='Frames sent per request')
+    video.add_argument('--dedup', type=float, default=None, metavar='SIMILARITY')
+    video.add_argument('--tiered', action='store_true')
+    video.add_argument('--session', action='store_true')
+    video.add_argument('--resume', action='store_true', help='Skip frames in an existing checkpoint')
+    video.add_argument('--index', action='store_true', help='Build the frame index sidecar first if missing')
+    video.add_argument('--output', default=None,
+                       help="Output JSON file name in the daemon's results/ directory (default: auto)")
+
+    image = sub.add_parser('image', help='Queue an image (or directory / glob / manifest batch) analysis')
+    image.add_argument('path', help='Image file, directory, glob pattern or manifest')
+    image.add_argument('--workers', type=int, default=None, help='Batch mode: images analyzed concurrently')
+    image.add_argument('--force', action='store_true', help='Batch mode: re-analyze images that have results')
+    image.add_argument('--output', default=None,
+                       help="Output file name in the daemon's results/ directory (default: auto)")
+
+    for p in (video, image):
+        p.add_argument('--priority', type=int, default=0, help='Higher runs first (default: 0)')
+        p.add_argument('--wait', action='store_true', help='Wait and show progress until the job finishes')
+
+    status = sub.add_parser('status', help='Show the daemon and recent jobs, or one job')
+    status.add_argument('job_id', type=int, nargs='?', default=None)
+    status.add_argument('--status', dest='filter', default=None, help='Only jobs with this status')
+    result = sub.add_parser('result', help="Print or save a finished job's result")
+    result.add_argument('job_id', type=int)
+    result.add_argument('--output', default=None, help='Write the result JSON here instead of printing it')
+    cancel = sub.add_parser('cancel', help='Cancel a queued or running job')
+    cancel.add_argument('job_id', type=int)
+    args = parser.parse_args()
+
+    client = DaemonClient(args.url)
+    try:
+        if args.command in ('video', 'image'):
+            if args.command == 'video':
+                params = {"start": args.start, "end": args.end, "frame_interval": args.interval,
+                          "sampling": args.sampling, "max_per_minute": args.max_per_minute,
+                          "workers": args.workers, "batch_size": args.batch, "dedup": args.dedup,
+                          "tiered": args.tiered or None, "session": args.session or None,
+                          "resume": args.resume or None, "build_index": args.index or None,
+                          "output": args.output}
+            else:
+                params = {"workers": args.workers, "force": args.force or None, "output": args.output}
+            # Unset options fall back to the daemon's defaults
+            params = {k: v for k, v in params.items() if v is not None}
+            job = client.submit(args.command, args.path, params, priority=args.priority)
+            print(f"✓ Queued job {job['id']}")
+            if args.wait:
+                job = client.wait(job["id"])
+                if job["status"] != "done":
+                    sys.exit(1)
+                print(f"✓ Results saved to: {job['output']}")
+        elif args.command == 'status':
+            if args.job_id is not None:
+                print(json.dumps(client.job(args.job_id), indent=2, ensure_ascii=False))
+                return
+            info = client.status()
+            counts = ", ".join(f"{n} {s}" for s, n in info["jobs"].items() if n)
+            print(f"Daemon {client.url}: model {info['model']}, running job: {info['running'] or '-'}"
+                  + (f" ({counts})" if counts else ""))
+            for job in client.jobs(args.filter):
+                print(format_job(job))
+        elif args.command == 'result':
+            result = client.result(args.job_id)
+            if args.output:
+                with open(args.output, 'w', encoding='utf-8') as f:
+                    json.dump(result, f, indent=2, ensure_ascii=False)
+                print(f"✓ Results saved to: {args.output}")
+            else:
+                print(json.dumps(result, indent=2, ensure_ascii=False))
+        elif args.command == 'cancel':
+            job = client.cancel(args.job_id)
+            print(format_job(job))
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Video decode backends for frame extraction.
+
+Every backend yields (frame_rgb, timestamp) pairs for increasing frame indices
+(with a FrameIndex, timestamps are exact and seeks target the keyframe
+before each frame, see frame_index.py):
+
+    opencv  cv2.VideoCapture with a configurable decoder thread count and
+            optional hardware acceleration (default)
+    pyav    PyAV (FFmpeg bindings) with threaded decoding, scaling during the
+            RGB conversion and an optional keyframe-only mode
+    ffmpeg  an ffmpeg subprocess that decodes, selects and scales frames in
+            its own process and pipes raw RGB frames at the target resolution
+
+PyAV (`pip install av`) and the ffmpeg binary are optional and only needed
+when their backend is selected.
+"""
+
+import itertools
+import subprocess
+from typing import Iterable, Iterator, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from .frame_index import FrameIndex
+from .profiling import Profiler
+
+DECODERS = ("opencv", "pyav", "ffmpeg")
+
+# Gaps of at least this many frames seek directly instead of decoding every
+# skipped frame (seeking costs a keyframe decode, grabbing one demux+decode per frame)
+SEEK_INTERVAL_THRESHOLD = 300
+
+Frames = Iterator[Tuple[np.ndarray, float]]
+
+
+def scaled_size(width: int, height: int, max_side: Optional[int]) -> Tuple[int, int]:
+    """(width, height) shrunk so the longest side fits `max_side` (even sizes, never upscaled)."""
+    if not max_side or max(width, height) <= max_side:
+        return width, height
+    scale = max_side / float(max(width, height))
+    return max(2, int(round(width * scale / 2)) * 2), max(2, int(round(height * scale / 2)) * 2)
+
+
+class FrameDecoder:
+    """Base class: decode selected frames of a video as RGB uint8 arrays."""
+
+    name = ""
+
+    def __init__(self, threads: int = 0, max_side: Optional[int] = None, hw_accel: bool = False,
+                 keyframes_only: bool = False, profiler: Optional[Profiler] = None):
+        """
+        Args:
+            threads (int): Decoder threads (0 lets the backend choose)
+            max_side (int|None): Scale frames so the longest side fits (None keeps full size)
+            hw_accel (bool): Use hardware decoding where the backend supports it
+            keyframes_only (bool): Only decode keyframes; each requested index
+                yields the next keyframe at or after it (pyav only)
+            profiler (Profiler|None): Records decode/convert spans per frame
+        """
+        self.threads = threads
+        self.max_side = max_side
+        self.hw_accel = hw_accel
+        self.keyframes_only = keyframes_only
+        self.profiler = profiler or Profiler(enabled=False)
+
+    def iter_frames_at(self, video_path: str, frame_indices: Iterable[int],
+                       index: Optional[FrameIndex] = None) -> Frames:
+        """Yield (frame_rgb, timestamp) for `frame_indices`; `index` gives exact timestamps and keyframes."""
+        raise NotImplementedError
+
+
+def _should_seek(position: int, target: int, index: Optional[FrameIndex]) -> bool:
+    """Whether reaching `target` from the next frame to decode (`position`) is cheaper by seeking."""
+    if index is not None and len(index.keyframes):
+        # A keyframe past the current position means frames can be skipped for free
+        keyframe = index.keyframe_before(target)
+        return keyframe is not None and keyframe > position
+    return target - position >= SEEK_INTERVAL_THRESHOLD or (position == 0 and target > 0)
+
+
+class OpenCVDecoder(FrameDecoder):
+    """cv2.VideoCapture; frames between targets are grabbed without conversion."""
+
+    name = "opencv"
+
+    def _open(self, video_path: str) -> cv2.VideoCapture:
+        params = []
+        if self.threads:
+            params += [cv2.CAP_PROP_N_THREADS, self.threads]
+        if self.hw_accel:
+            params += [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        if params:
+            return cv2.VideoCapture(video_path, cv2.CAP_ANY, params)
+        return cv2.VideoCapture(video_path)
+
+    def iter_frames_at(self, video_path: str, frame_indices: Iterable[int],
+                       index: Optional[FrameIndex] = None) -> Frames:
+        profiler = self.profiler
+        cap = self._open(video_path)
+        try:
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+            frame_count = 0  # next frame grab() returns
+            for target in frame_indices:
+                if target < frame_count:
+                    continue
+                if index is not None and target >= len(index):
+                    return
+                timestamp = index.timestamp(target) if index is not None else target / fps
+                with profiler.span("decode", timestamp=round(timestamp, 2)):
+                    if _should_seek(frame_count, target, index):
+                        profiler.count("seeks")
+                        if index is not None and len(index.keyframes):
+                            landed = self._seek_indexed(cap, index, target, fps)
+                            if landed is None:
+                                return
+                            frame_count = landed + 1
+                        else:
+                            cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                            frame_count = target
+                    # Grab without decoding to RGB until the next sampled frame
+                    profiler.count("frames_grabbed", max(0, target - frame_count))
+                    while frame_count <= target:
+                        if not cap.grab():
+                            return
+                        frame_count += 1
+                    ret, frame = cap.retrieve()
+                if not ret:
+                    return
+                with profiler.span("convert", timestamp=round(timestamp, 2)):
+                    if self.max_side:
+                        size = scaled_size(frame.shape[1], frame.shape[0], self.max_side)
+                        if size != (frame.shape[1], frame.shape[0]):
+                            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                profiler.count("frames_decoded")
+                yield rgb, timestamp
+        finally:
+            cap.release()
+
+    @staticmethod
+    def _seek_indexed(cap: cv2.VideoCapture, index: FrameIndex, target: int, fps: float) -> Optional[int]:
+        """
+        Seek to the keyframe before `target` and grab one frame; returns that frame's
+        index (never past `target`), or None at the end of the stream.
+
+        OpenCV seeks by frame number at the container's nominal frame rate, which
+        misses for variable frame rates, so the landing frame is looked up in the
+        index by its timestamp and the seek repeated earlier if it overshot.
+        """
+        seek_time = index.timestamp(index.keyframe_before(target))
+        for _ in range(3):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, max(0, int(seek_time * fps)))
+            if not cap.grab():
+                return None
+            landed = index.nearest_frame(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0)
+            if landed <= target:
+                return landed
+            seek_time -= index.timestamp(landed) - index.timestamp(target) + 1.0
+        # Give up seeking: decode from the start
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return 0 if cap.grab() else None
+
+
+class PyAVDecoder(FrameDecoder):
+    """PyAV with frame-threaded decoding; scaling happens in the RGB conversion."""
+
+    name = "pyav"
+
+    def iter_frames_at(self, video_path: str, frame_indices: Iterable[int],
+                       index: Optional[FrameIndex] = None) -> Frames:
+        try:
+            import av
+        except ImportError:
+            raise ImportError("The pyav decoder needs PyAV: pip install av") from None
+
+        profiler = self.profiler
+        with av.open(video_path) as container:
+            stream = container.streams.video[0]
+            stream.thread_type = "AUTO"
+            if self.threads:
+                stream.codec_context.thread_count = self.threads
+            if self.keyframes_only:
+                stream.codec_context.skip_frame = "NONKEY"
+            fps = float(stream.average_rate or stream.guessed_rate or 30.0)
+            half_frame = 0.5 / fps
+            size = scaled_size(stream.codec_context.width, stream.codec_context.height, self.max_side)
+
+            decoded = container.decode(stream)
+            frame = None  # last decoded frame, may satisfy the next target too
+            position = -1  # frame index of `frame`
+            last_yielded = None
+            for target in frame_indices:
+                if index is not None:
+                    if target >= len(index):
+                        return
+                    timestamp = index.timestamp(target)
+                    # Half the gap to the previous frame, which may differ per frame (VFR)
+                    half_frame = (timestamp - index.timestamp(target - 1)) / 2 if target > 0 else half_frame
+                else:
+                    timestamp = target / fps
+                with profiler.span("decode", timestamp=round(timestamp, 2)):
+                    if _should_seek(position + 1, target, index):
+                        # Lands on the keyframe at or before the target; decode forward from there
+                        container.seek(int(timestamp / stream.time_base), stream=stream)
+                        profiler.count("seeks")
+                        decoded = container.decode(stream)
+                        frame = None
+                    while frame is None or (frame.time or 0.0) < timestamp - half_frame:
+                        frame = next(decoded, None)
+                        if frame is None:
+                            return
+                        if index is not None:
+                            position = index.frame_at((frame.time or 0.0) - half_frame)
+                        else:
+                            position = int(round((frame.time or 0.0) * fps))
+                if self.keyframes_only:
+                    if frame.time == last_yielded:
+                        continue  # several targets fall before the same keyframe
+                    timestamp = frame.time or 0.0
+                    last_yielded = frame.time
+                with profiler.span("convert", timestamp=round(timestamp, 2)):
+                    rgb = frame.reformat(width=size[0], height=size[1], format="rgb24").to_ndarray()
+                profiler.count("frames_decoded")
+                yield rgb, timestamp
+
+
+class FFmpegDecoder(FrameDecoder):
+    """
+    ffmpeg subprocess piping raw RGB frames.
+
+    Frames are selected inside ffmpeg, so only the sampled frames cross the
+    pipe: evenly spaced indices (a range) with one `mod(n, step)` filter, other
+    index lists with an `eq(n, k)` sum per chunk of SELECT_CHUNK indices (one
+    ffmpeg process per chunk, started at the chunk's first frame).
+    """
+
+    name = "ffmpeg"
+
+    # Indices per select expression; every term is evaluated for every decoded frame
+    SELECT_CHUNK = 200
+
+    def __init__(self, *args, executable: str = "ffmpeg", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.executable = executable
+
+    def _command(self, video_path: str, start: float, select: Optional[str], size: Tuple[int, int]) -> list:
+        cmd = [self.executable, "-nostdin", "-v", "error"]
+        if self.hw_accel:
+            cmd += ["-hwaccel", "auto"]
+        if self.threads:
+            cmd += ["-threads", str(self.threads)]
+        if start > 0:
+            cmd += ["-ss", f"{start:.6f}"]
+        filters = []
+        if select:
+            filters.append(f"select={select}")
+        filters.append(f"scale={size[0]}:{size[1]}:flags=area")
+        cmd += ["-i", video_path, "-an", "-sn", "-vf", ",".join(filters), "-vsync", "0",
+                "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"]
+        return cmd
+
+    @staticmethod
+    def _select(chunk: Sequence[int]) -> Optional[str]:
+        """Select expression keeping `chunk`; n counts from chunk[0], where the seek lands."""
+        first = chunk[0]
+        if isinstance(chunk, range):
+            return f"not(mod(n\\,{chunk.step}))" if chunk.step > 1 else None
+        if chunk[-1] - first == len(chunk) - 1:
+            return None  # consecutive frames: read them straight off the pipe
+        return "+".join(f"eq(n\\,{i - first})" for i in chunk)
+
+    def iter_frames_at(self, video_path: str, frame_indices: Iterable[int],
+                       index: Optional[FrameIndex] = None) -> Frames:
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+        if not width or not height:
+            return
+        size = scaled_size(width, height, self.max_side)
+        frame_bytes = size[0] * size[1] * 3
+        frame_time = index.timestamp if index is not None else (lambda i: i / fps)
+
+        if isinstance(frame_indices, range):
+            chunks = iter([frame_indices] if len(frame_indices) else [])
+        else:
+            indices = iter(frame_indices)
+            chunks = iter(lambda: list(itertools.islice(indices, self.SELECT_CHUNK)), [])
+        profiler = self.profiler
+        last = -1
+        for chunk in chunks:
+            if not isinstance(chunk, range):
+                # Indices must increase: repeated or earlier ones are skipped
+                kept = []
+                for i in chunk:
+                    if i > (kept[-1] if kept else last):
+                        kept.append(i)
+                if not kept:
+                    continue
+                chunk = kept
+            if index is not None and chunk[0] >= len(index):
+                return
+            # The pipe delivers exactly the frames in `chunk`, in order
+            try:
+                proc = subprocess.Popen(self._command(video_path, frame_time(chunk[0]), self._select(chunk), size),
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=frame_bytes)
+            except FileNotFoundError:
+                raise RuntimeError(f"The ffmpeg decoder needs the ffmpeg binary ({self.executable}) on PATH") from None
+            try:
+                for target in chunk:
+                    if index is not None and target >= len(index):
+                        return
+                    timestamp = frame_time(target)
+                    with profiler.span("decode", timestamp=round(timestamp, 2)):
+                        data = proc.stdout.read(frame_bytes)
+                    if len(data) < frame_bytes:
+                        return
+                    with profiler.span("convert", timestamp=round(timestamp, 2)):
+                        rgb = np.frombuffer(data, dtype=np.uint8).reshape(size[1], size[0], 3).copy()
+                    profiler.count("frames_decoded")
+                    yield rgb, timestamp
+                last = chunk[-1]
+            finally:
+                proc.kill()
+                proc.stdout.close()
+                proc.wait()
+
+
+def make_decoder(name: str = "opencv", **kwargs) -> FrameDecoder:
+    """Create the decode backend called `name` (one of DECODERS); kwargs go to FrameDecoder."""
+    backends = {cls.name: cls for cls in (OpenCVDecoder, PyAVDecoder, FFmpegDecoder)}
+    if name not in backends:
+        raise ValueError(f"Unknown decoder: {name} (expected one of {DECODERS})")
+    return backends[name](**kwargs)
@@ -0,0 +1,293 @@
+"""
+Per-video frame index sidecar.
+
+One decoding pass records, for every frame in presentation order, its exact
+timestamp (PTS), whether it is a keyframe, and its dedup signature (64-bit
+dHash plus 8x8 grayscale thumbnail, see frame_similarity.py). The index is
+saved next to the video as `<video>.frames.npz` and lets later runs:
+
+    - map times to frames exactly, also for variable frame rate files where
+      CAP_PROP_FPS / CAP_PROP_FRAME_COUNT are wrong
+    - seek to the keyframe before a target instead of guessing (see decoders.py)
+    - detect shots and plan dedup from the stored signatures without decoding
+
+The sidecar records the video's size and modification time; it is ignored
+once the video changes.
+
+Usage:
+    python -m visual_analysis.src.frame_index video.mp4 [more videos...] [--force]
+"""
+
+import os
+import sys
+import argparse
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from tqdm import tqdm
+
+from .frame_similarity import frame_distance, signature as frame_signature
+
+INDEX_SUFFIX = ".frames.npz"
+# 2: signatures taken like FrameDeduplicator's (frame_similarity.signature)
+# 3: no keyframe flags from the OpenCV fallback (they were shifted by the decoder delay)
+INDEX_VERSION = 3
+
+
+def index_path(video_path: str) -> str:
+    """Sidecar path for `video_path`."""
+    return video_path + INDEX_SUFFIX
+
+
+def _source_stamp(video_path: str) -> Tuple[int, int]:
+    st = os.stat(video_path)
+    return st.st_size, st.st_mtime_ns
+
+
+def _signature(frame: np.ndarray) -> Tuple[int, np.ndarray]:
+    """
+    frame_similarity.signature of an RGB frame (the one FrameDeduplicator takes),
+    packed for storage: (dHash as a uint64, 8x8 uint8 thumbnail).
+    """
+    bits, thumb = frame_signature(frame)
+    return int(np.packbits(bits.ravel()).view(">u8")[0]), np.clip(np.rint(thumb), 0, 255).astype(np.uint8)
+
+
+class FrameIndex:
+    """Frame timestamps, keyframes and signatures of one video."""
+
+    def __init__(self, pts: np.ndarray, keyframes: np.ndarray, hashes: np.ndarray, thumbs: np.ndarray,
+                 width: int = 0, height: int = 0, source: Tuple[int, int] = (0, 0)):
+        """
+        Args:
+            pts (np.ndarray): Timestamp in seconds of every frame (float64, increasing)
+            keyframes (np.ndarray): Indices of keyframes (int64, increasing; empty if unknown)
+            hashes (np.ndarray): dHash of every frame (uint64)
+            thumbs (np.ndarray): 8x8 grayscale thumbnail of every frame (uint8, N x 8 x 8)
+            width (int): Frame width in pixels
+            height (int): Frame height in pixels
+            source (tuple): (size, mtime_ns) of the video the index was built from
+        """
+        self.pts = pts
+        self.keyframes = keyframes
+        self.hashes = hashes
+        self.thumbs = thumbs
+        self.width = width
+        self.height = height
+        self.source = source
+
+    def __len__(self) -> int:
+        return len(self.pts)
+
+    @property
+    def duration(self) -> float:
+        """Seconds from the first frame to the end of the last one."""
+        if not len(self.pts):
+            return 0.0
+        return float(self.pts[-1] - self.pts[0]) + 1.0 / self.fps
+
+    @property
+    def fps(self) -> float:
+        """Average frame rate (the real one, also for variable frame rate files)."""
+        if len(self.pts) < 2 or self.pts[-1] <= self.pts[0]:
+            return 30.0
+        return (len(self.pts) - 1) / float(self.pts[-1] - self.pts[0])
+
+    def frame_at(self, timestamp: float) -> int:
+        """Index of the first frame shown at or after `timestamp` (len(self) past the end)."""
+        # Half a microsecond absorbs float error in timestamps computed from frame numbers
+        return int(np.searchsorted(self.pts, timestamp - 5e-7, side="left"))
+
+    def nearest_frame(self, timestamp: float) -> int:
+        """Index of the frame whose timestamp is closest to `timestamp`."""
+        frame = min(self.frame_at(timestamp), len(self) - 1)
+        if frame > 0 and timestamp - self.pts[frame - 1] < self.pts[frame] - timestamp:
+            return frame - 1
+        return frame
+
+    def timestamp(self, frame: int) -> float:
+        """Exact timestamp of frame `frame`."""
+        return float(self.pts[frame])
+
+    def keyframe_before(self, frame: int) -> Optional[int]:
+        """The last keyframe at or before `frame` (None if keyframes are unknown)."""
+        pos = int(np.searchsorted(self.keyframes, frame, side="right")) - 1
+        return int(self.keyframes[pos]) if pos >= 0 else None
+
+    def signature(self, frame: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Signature of frame `frame` in the form frame_similarity.frame_distance takes."""
+        bits = np.unpackbits(np.array([self.hashes[frame]], dtype=">u8").view(np.uint8)).astype(bool)
+        return bits.reshape(8, 8), self.thumbs[frame].astype(np.float64)
+
+    def detect_shots(self, start_frame: int = 0, end_frame: Optional[int] = None, threshold: float = 0.15,
+                     step: int = 1) -> List[Tuple[int, int]]:
+        """
+        Shot boundaries from the stored thumbnails: a new shot starts wherever the
+        mean absolute thumbnail difference between probes `step` frames apart
+        reaches `threshold` (0-1). Returns [(first_frame, end_frame_exclusive), ...].
+        """
+        end_frame = len(self) if end_frame is None else min(end_frame, len(self))
+        if end_frame <= start_frame:
+            return []
+        probes = np.arange(start_frame, end_frame, max(1, step))
+        thumbs = self.thumbs[probes].astype(np.float32)
+        diffs = np.abs(np.diff(thumbs, axis=0)).mean(axis=(1, 2)) / 255.0
+        cuts = probes[1:][diffs >= threshold].tolist()
+        bounds = [start_frame] + cuts + [end_frame]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def plan_dedup(self, frames: List[int], similarity: float) -> Dict[int, Tuple[int, float]]:
+        """
+        Near-duplicates among `frames` (in order), as FrameDeduplicator would find
+        them: {duplicate frame: (reference frame, similarity)}, where the
+        reference is the last frame that was not a duplicate.
+        """
+        duplicates = {}
+        reference = None
+        for frame in frames:
+            if frame >= len(self):
+                break
+            sig = self.signature(frame)
+            if reference is not None:
+                sim = 1.0 - frame_distance(sig, reference[1])
+                if sim >= similarity:
+                    duplicates[frame] = (reference[0], sim)
+                    continue
+            reference = (frame, sig)
+        return duplicates
+
+    def save(self, path: str):
+        """Write the index (atomically, so readers never see a partial file)."""
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                np.savez_compressed(f, version=INDEX_VERSION, pts=self.pts, keyframes=self.keyframes,
+                                    hashes=self.hashes, thumbs=self.thumbs, size=[self.width, self.height],
+                                    source=np.array(self.source, dtype=np.int64))
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "FrameIndex":
+        with np.load(path) as data:
+            if int(data["version"]) != INDEX_VERSION:
+                raise ValueError(f"Unsupported frame index version in {path}")
+            width, height = (int(v) for v in data["size"])
+            return cls(data["pts"], data["keyframes"], data["hashes"], data["thumbs"], width, height,
+                       tuple(int(v) for v in data["source"]))
+
+
+def load_frame_index(video_path: str) -> Optional[FrameIndex]:
+    """The video's sidecar index, or None if there is none or it is out of date."""
+    path = index_path(video_path)
+    if not os.path.exists(path) or not os.path.exists(video_path):
+        return None
+    try:
+        index = FrameIndex.load(path)
+    except (OSError, ValueError, KeyError):
+        return None
+    if index.source != _source_stamp(video_path):
+        return None
+    return index
+
+
+def _scan_pyav(video_path: str):
+    import av
+
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        yield stream.codec_context.width, stream.codec_context.height
+        for frame in container.decode(stream):
+            yield frame.time, bool(frame.key_frame), frame.to_ndarray(format="rgb24")
+
+
+def _scan_opencv(video_path: str):
+    # Keyframes are left unknown: OpenCV only reports whether the last demuxed packet
+    # was a keyframe, which runs ahead of the returned frame by the decoder delay, and
+    # seeks planned from shifted flags would land on the wrong frames
+    cap = cv2.VideoCapture(video_path)
+    try:
+        yield int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        while cap.grab():
+            pts = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            yield pts, False, frame[..., ::-1]  # BGR -> RGB view; signature strides it down first
+    finally:
+        cap.release()
+
+
+def build_frame_index(video_path: str, save: bool = True, show_progress: bool = True) -> FrameIndex:
+    """
+    Decode every frame once and build the video's index (PyAV if installed,
+    else OpenCV, which records no keyframes). With `save`, the index is written to the sidecar path; if
+    that fails (e.g. a read-only directory) the index is still returned.
+    """
+    try:
+        import av  # noqa: F401
+        scan = _scan_pyav(video_path)
+    except ImportError:
+        scan = _scan_opencv(video_path)
+
+    source = _source_stamp(video_path)
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or None  # only for the progress bar
+    cap.release()
+    width, height = next(scan)
+    pts, keys, hashes, thumbs = [], [], [], []
+    for timestamp, key, frame in tqdm(scan, total=total, disable=not show_progress, unit="frame"):
+        if timestamp is None:
+            # No PTS on this frame: assume it follows the previous one evenly
+            timestamp = pts[-1] + (pts[-1] - pts[-2] if len(pts) > 1 else 1 / 30.0) if pts else 0.0
+        bits, thumb = _signature(frame)
+        if key:
+            keys.append(len(pts))
+        pts.append(timestamp)
+        hashes.append(bits)
+        thumbs.append(thumb)
+
+    index = FrameIndex(np.array(pts, dtype=np.float64), np.array(keys, dtype=np.int64),
+                       np.array(hashes, dtype=np.uint64), np.array(thumbs, dtype=np.uint8).reshape(-1, 8, 8),
+                       width, height, source)
+    if save:
+        try:
+            index.save(index_path(video_path))
+        except OSError as e:
+            print(f"Warning: could not save frame index {index_path(video_path)} ({e}); using it for this run only")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build frame index sidecars (exact timestamps, keyframes, '
+                                                 'dedup signatures) for videos')
+    parser.add_argument('videos', nargs='+', help='Video files')
+    parser.add_argument('--force', action='store_true', help='Rebuild indexes that are already up to date')
+    args = parser.parse_args()
+
+    failed = False
+    for video_path in args.videos:
+        if not os.path.exists(video_path):
+            print(f"Error: Video not found: {video_path}")
+            failed = True
+            continue
+        if not args.force and load_frame_index(video_path) is not None:
+            print(f"✓ Up to date: {index_path(video_path)}")
+            continue
+        print(f"Indexing {video_path}...")
+        started = time.perf_counter()
+        index = build_frame_index(video_path)
+        print(f"✓ {len(index)} frames, {len(index.keyframes)} keyframes, {index.duration:.2f}s at "
+              f"{index.fps:.3f} fps avg ({time.perf_counter() - started:.1f}s) -> {index_path(video_path)}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
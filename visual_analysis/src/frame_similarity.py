@@ -0,0 +1,90 @@
+"""
+Cheap, vectorized frame similarity measures (NumPy only).
+
+Used to spot near-duplicate frames before they reach the model: a 64-bit
+difference hash (dHash) captures structure, and an 8x8 grayscale thumbnail
+captures overall brightness/color changes that dHash ignores.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Longest side frames are strided down to before any math (keeps 4K cheap)
+_PRE_SHRINK = 256
+
+
+def to_gray(frame: np.ndarray) -> np.ndarray:
+    """Convert an RGB (or already gray) uint8 frame to float32 luma, strided down to ~256 px."""
+    step = max(1, max(frame.shape[:2]) // _PRE_SHRINK)
+    small = frame[::step, ::step]
+    if small.ndim == 2:
+        return small.astype(np.float32)
+    return small[..., :3].astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def block_mean(gray: np.ndarray, rows: int, cols: int) -> np.ndarray:
+    """Area-average `gray` down to rows x cols using an integral image."""
+    h, w = gray.shape
+    rows, cols = min(rows, h), min(cols, w)
+    ys = np.linspace(0, h, rows + 1).astype(int)
+    xs = np.linspace(0, w, cols + 1).astype(int)
+    integral = np.pad(gray.cumsum(axis=0, dtype=np.float64).cumsum(axis=1), ((1, 0), (1, 0)))
+    sums = (integral[np.ix_(ys[1:], xs[1:])] - integral[np.ix_(ys[:-1], xs[1:])]
+            - integral[np.ix_(ys[1:], xs[:-1])] + integral[np.ix_(ys[:-1], xs[:-1])])
+    return sums / np.outer(np.diff(ys), np.diff(xs))
+
+
+def dhash(gray: np.ndarray, hash_size: int = 8) -> np.ndarray:
+    """Difference hash: hash_size x hash_size booleans (brighter than right neighbour)."""
+    small = block_mean(gray, hash_size, hash_size + 1)
+    return small[:, 1:] > small[:, :-1]
+
+
+def signature(frame: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(dHash bits, 8x8 thumbnail) used by frame_distance; also what frame_index.py stores."""
+    gray = to_gray(frame)
+    return dhash(gray), block_mean(gray, 8, 8)
+
+
+def frame_distance(a: Tuple[np.ndarray, np.ndarray], b: Tuple[np.ndarray, np.ndarray]) -> float:
+    """
+    Distance between two signatures in [0, 1] (0 = identical).
+
+    The larger of the normalized dHash Hamming distance and the mean absolute
+    thumbnail difference, so a frame only counts as similar if both agree.
+    """
+    hash_dist = np.count_nonzero(a[0] != b[0]) / a[0].size
+    thumb_dist = float(np.abs(a[1] - b[1]).mean()) / 255.0
+    return max(float(hash_dist), thumb_dist)
+
+
+class FrameDeduplicator:
+    """Flags frames that are near-duplicates of the last frame that was kept."""
+
+    def __init__(self, similarity: float = 0.95):
+        """
+        Args:
+            similarity (float): Frames at least this similar (0-1) to the
+                reference frame are reported as duplicates
+        """
+        self.similarity = similarity
+        self._reference = None
+
+    def check(self, frame: np.ndarray) -> Optional[float]:
+        """
+        Compare `frame` to the current reference.
+
+        Returns the similarity if it is a duplicate; otherwise makes `frame`
+        the new reference and returns None.
+        """
+        sig = signature(frame)
+        if self._reference is not None:
+            sim = 1.0 - frame_distance(sig, self._reference)
+            if sim >= self.similarity:
+                return sim
+        self._reference = sig
+        return None
+
+    def reset(self):
+        self._reference = None
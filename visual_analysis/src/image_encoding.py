@@ -0,0 +1,160 @@
+"""
+In-memory image encoding for Ollama requests.
+
+Turns file paths, raw bytes, numpy frames or PIL images into compressed bytes
+ready for base64 upload, optionally downscaling first. Nothing touches disk
+except reading an input path.
+
+With a visual-token budget, images are also resized to the model's token grid
+(both sides multiples of VISUAL_TOKEN_PIXELS), so the server doesn't resample
+them again and the number of image tokens the request costs is known up front.
+"""
+
+import io
+import math
+from typing import Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+ImageInput = Union[str, bytes, bytearray, np.ndarray, Image.Image]
+
+# Formats PIL can write that Ollama's image decoder accepts
+SUPPORTED_FORMATS = ("jpeg", "png", "webp")
+
+# Qwen3-VL splits images into 16x16 patches and merges each 2x2 group into one
+# visual token, so every 32x32 pixel block costs one token (Qwen2/2.5-VL: 28)
+VISUAL_TOKEN_PIXELS = 32
+
+# Named per-image visual-token budgets (1280x720 uploads as 1280x704, 880 tokens)
+VISUAL_TOKEN_PRESETS = {"low": 256, "medium": 640, "high": 1280, "max": 4096}
+
+
+def resolve_token_budget(value: Optional[Union[int, str]]) -> Optional[int]:
+    """Turn a token count, preset name (see VISUAL_TOKEN_PRESETS) or None/0/"off" into a budget."""
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if not value or value == "off":
+        return None
+    if isinstance(value, str):
+        if value not in VISUAL_TOKEN_PRESETS:
+            raise ValueError(f"Unknown visual token preset: {value} (expected a number or one of "
+                             f"{', '.join(VISUAL_TOKEN_PRESETS)})")
+        return VISUAL_TOKEN_PRESETS[value]
+    return int(value)
+
+
+def token_grid_size(width: int, height: int, max_tokens: Optional[int] = None,
+                    patch: int = VISUAL_TOKEN_PIXELS) -> Tuple[int, int]:
+    """
+    Size closest to (width, height) with both sides multiples of `patch` and,
+    if given, at most `max_tokens` patches; the aspect ratio is kept.
+    """
+    w = max(patch, round(width / patch) * patch)
+    h = max(patch, round(height / patch) * patch)
+    if max_tokens and (w // patch) * (h // patch) > max_tokens:
+        scale = math.sqrt(max_tokens * patch * patch / float(width * height))
+        w = max(patch, math.floor(width * scale / patch) * patch)
+        h = max(patch, math.floor(height * scale / patch) * patch)
+    return w, h
+
+
+def visual_tokens(width: int, height: int, patch: int = VISUAL_TOKEN_PIXELS) -> int:
+    """Visual tokens the model spends on a width x height image (after snapping it to the grid)."""
+    w, h = token_grid_size(width, height, patch=patch)
+    return (w // patch) * (h // patch)
+
+
+def to_pil(image: ImageInput) -> Image.Image:
+    """Load any supported image input as a PIL image."""
+    if isinstance(image, Image.Image):
+        return image
+    if isinstance(image, np.ndarray):
+        # Frames from analyze_video_cli are RGB uint8 arrays
+        if image.dtype != np.uint8:
+            image = np.clip(image, 0, 255).astype(np.uint8)
+        return Image.fromarray(image)
+    if isinstance(image, (bytes, bytearray)):
+        return Image.open(io.BytesIO(image))
+    if isinstance(image, str):
+        return Image.open(image)
+    raise TypeError(f"Unsupported image input: {type(image).__name__}")
+
+
+def downscale(img: Image.Image, max_side: Optional[int]) -> Image.Image:
+    """Shrink `img` so its longest side is at most `max_side` (never upscales)."""
+    if not max_side or max(img.size) <= max_side:
+        return img
+    scale = max_side / float(max(img.size))
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    return img.resize(size, Image.BICUBIC)
+
+
+def encode_image(image: ImageInput, fmt: Optional[str] = None, quality: int = 90,
+                 max_side: Optional[int] = None, max_tokens: Optional[int] = None,
+                 patch: int = VISUAL_TOKEN_PIXELS, info: Optional[dict] = None) -> bytes:
+    """
+    Encode an image to compressed bytes.
+
+    Args:
+        image: Path, already-encoded bytes, RGB numpy array or PIL image
+        fmt (str|None): "jpeg", "webp" or "png". None keeps already-encoded
+            inputs (paths/bytes) as-is and uses JPEG for raw pixels.
+        quality (int): JPEG/WebP quality (1-100)
+        max_side (int|None): Downscale so the longest side fits this size
+        max_tokens (int|None): Then resize to the token grid (sides multiples of
+            `patch`) within this many visual tokens
+        patch (int): Pixels per visual token along each side
+        info (dict|None): Filled with the uploaded "width", "height" and
+            estimated "visual_tokens"
+
+    Returns:
+        bytes: Encoded image
+    """
+    if fmt is not None:
+        fmt = fmt.lower()
+        if fmt == "jpg":
+            fmt = "jpeg"
+        if fmt not in SUPPORTED_FORMATS:
+            raise ValueError(f"Unsupported image format: {fmt} (expected one of {SUPPORTED_FORMATS})")
+
+    # Pass through encoded inputs untouched when no transformation is requested
+    if fmt is None and max_side is None and max_tokens is None:
+        data = None
+        if isinstance(image, (bytes, bytearray)):
+            data = bytes(image)
+        elif isinstance(image, str):
+            with open(image, "rb") as f:
+                data = f.read()
+        if data is not None:
+            if info is not None:
+                # Only the header is read
+                _describe(Image.open(io.BytesIO(data)).size, patch, info)
+            return data
+
+    img = downscale(to_pil(image), max_side)
+    if max_tokens:
+        size = token_grid_size(img.width, img.height, max_tokens, patch)
+        if size != img.size:
+            img = img.resize(size, Image.BICUBIC)
+    if info is not None:
+        _describe(img.size, patch, info)
+    fmt = fmt or "jpeg"
+    if fmt == "jpeg" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    elif img.mode not in ("RGB", "RGBA", "L"):
+        img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+
+    buf = io.BytesIO()
+    if fmt == "png":
+        # Fast compression; PNG is only used when lossless output is required
+        img.save(buf, format="PNG", compress_level=1)
+    elif fmt == "webp":
+        img.save(buf, format="WEBP", quality=quality, method=4)
+    else:
+        img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def _describe(size: Tuple[int, int], patch: int, info: dict):
+    info.update(width=size[0], height=size[1], visual_tokens=visual_tokens(size[0], size[1], patch))
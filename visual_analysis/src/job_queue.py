@@ -0,0 +1,154 @@
+"""
+Persistent priority queue of analysis jobs for the analysis daemon.
+
+Jobs live in a SQLite file, so queued work survives a daemon restart (jobs
+that were running when it stopped are queued again). Higher priority runs
+first; equal priorities run in submission order.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+_COLUMNS = ("id", "kind", "path", "params", "priority", "status", "progress", "total", "output",
+            "error", "summary", "cancel_requested", "created", "started", "finished")
+
+
+class JobQueue:
+    """SQLite-backed job queue (thread-safe)."""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): SQLite database file (parent directory is created)
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " kind TEXT NOT NULL,"
+            " path TEXT NOT NULL,"
+            " params TEXT NOT NULL,"
+            " priority INTEGER NOT NULL DEFAULT 0,"
+            " status TEXT NOT NULL,"
+            " progress INTEGER NOT NULL DEFAULT 0,"
+            " total INTEGER,"
+            " output TEXT,"
+            " error TEXT,"
+            " summary TEXT,"
+            " cancel_requested INTEGER NOT NULL DEFAULT 0,"
+            " created REAL NOT NULL,"
+            " started REAL,"
+            " finished REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_queued ON jobs(status, priority, id)")
+        # Jobs interrupted by a shutdown run again; video jobs resume from their checkpoint
+        self._conn.execute("UPDATE jobs SET params = json_set(params, '$.resume', json('true')) "
+                           "WHERE status = 'running' AND kind = 'video'")
+        self._conn.execute("UPDATE jobs SET status = 'queued', started = NULL, progress = 0 WHERE status = 'running'")
+        self._conn.commit()
+
+    def _row(self, row: Optional[tuple]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(zip(_COLUMNS, row))
+        job["params"] = json.loads(job["params"])
+        job["summary"] = json.loads(job["summary"]) if job["summary"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def _get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row)
+
+    def submit(self, kind: str, path: str, params: Optional[Dict[str, Any]] = None,
+               priority: int = 0) -> Dict[str, Any]:
+        """Queue a job and return it."""
+        with self._available:
+            cur = self._conn.execute(
+                "INSERT INTO jobs (kind, path, params, priority, status, created) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (kind, path, json.dumps(params or {}), int(priority), time.time()),
+            )
+            self._conn.commit()
+            self._available.notify()
+            return self._get(cur.lastrowid)
+
+    def next(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Mark the highest-priority queued job running and return it (None after `timeout` seconds)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._available:
+            while True:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY priority DESC, id ASC LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE jobs SET status = 'running', started = ? WHERE id = ?",
+                                       (time.time(), row[0]))
+                    self._conn.commit()
+                    return self._get(row[0])
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._available.wait(remaining)
+
+    def update(self, job_id: int, **fields: Any):
+        """Set job columns (summary is stored as JSON; a final status also sets `finished`)."""
+        unknown = set(fields) - set(_COLUMNS[1:])
+        if unknown:
+            raise ValueError(f"Unknown job fields: {sorted(unknown)}")
+        if "summary" in fields:
+            fields["summary"] = json.dumps(fields["summary"])
+        if fields.get("status") in ("done", "failed", "cancelled"):
+            fields.setdefault("finished", time.time())
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?",
+                               (*fields.values(), job_id))
+            self._conn.commit()
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._get(job_id)
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recent jobs first, optionally only those with `status`."""
+        query = f"SELECT {', '.join(_COLUMNS)} FROM jobs"
+        args: tuple = ()
+        if status:
+            query += " WHERE status = ?"
+            args = (status,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY id DESC LIMIT ?", (*args, int(limit))).fetchall()
+        return [self._row(r) for r in rows]
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per status."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: dict(rows).get(status, 0) for status in JOB_STATUSES}
+
+    def cancel(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Cancel a job: a queued job is cancelled at once, a running one is
+        flagged and stops at its next progress update. Returns the job (None if unknown).
+        """
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                               (time.time(), job_id))
+            self._conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+            self._conn.commit()
+            return self._get(job_id)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
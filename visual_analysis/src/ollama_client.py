@@ -2,82 +2,553 @@
 Simple Ollama client with HTTP + CLI fallback.
 
 This client attempts to call a local Ollama HTTP endpoint (default http://127.0.0.1:11434)
-and falls back to the `ollama` CLI if HTTP isn't available.
+and falls back to the `ollama` CLI if HTTP isn't available. Several endpoints can be
+given; requests then go to the least-loaded healthy host and are retried on another
+host when one fails.
 
-Note: image handling via Ollama HTTP may depend on your local Ollama server's expectations.
-This implementation sends the image as base64 under the `image_base64` key in JSON.
-If your Ollama instance expects a different format, we can adapt this quickly.
+Images can be given as a file path, encoded bytes, an RGB numpy array or a PIL
+image. They are encoded in memory (see image_encoding.py) and sent base64-encoded
+in the `images` list of the request, as Ollama expects.
 """
 
 import base64
 import json
 import os
+import re
 import subprocess
-from typing import Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from .concurrency import AdaptiveLimiter
+from .image_encoding import VISUAL_TOKEN_PIXELS, ImageInput, encode_image, resolve_token_budget
+from .profiling import Profiler
+from .result_cache import ResultCache, cache_key
+from .settings import ModelOptions
+
+
+EndpointSpec = Union[str, Dict[str, Any]]
+
+# Automatic request deadlines allow this multiple of the expected duration, within
+# [MIN_REQUEST_TIMEOUT, request_timeout] seconds
+DEADLINE_FACTOR = 3.0
+MIN_REQUEST_TIMEOUT = 60.0
+
+
+class OllamaHost:
+    """One Ollama server in the client's pool, with its own health and circuit-breaker state."""
+
+    def __init__(self, url: str, weight: float = 1.0):
+        self.url = url.rstrip("/")
+        self.weight = max(float(weight), 1e-6)
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0  # consecutive
+        self.total_failures = 0
+        self.open_until = 0.0  # circuit open (host skipped) until this monotonic time
+        self.healthy: Optional[bool] = None
+        self.health_checked_at = 0.0
+        # Endpoint that last answered successfully; tried first next time
+        self.endpoint: Optional[str] = None
+        self.last_dispatch = 0.0
+
+    @property
+    def load(self) -> float:
+        return (self.outstanding + 1) / self.weight
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.total_failures,
+            "circuit_open": self.open_until > time.monotonic(),
+        }
+
+
+def parse_endpoints(base_url: Union[EndpointSpec, Sequence[EndpointSpec]]) -> List[OllamaHost]:
+    """
+    Build hosts from a URL, a list of URLs, or {"url": ..., "weight": ...} dicts
+    (the `ollama.endpoints` format in config.json).
+    """
+    specs = [base_url] if isinstance(base_url, (str, dict)) else list(base_url)
+    hosts = []
+    for spec in specs:
+        if isinstance(spec, dict):
+            hosts.append(OllamaHost(spec["url"], spec.get("weight", 1.0)))
+        else:
+            hosts.append(OllamaHost(spec))
+    if not hosts:
+        raise ValueError("At least one Ollama endpoint is required")
+    return hosts
 
 
 class OllamaClient:
-    def __init__(self, model: str = "qwen3-vl-8b-ctx32k:latest", base_url: str = "http://127.0.0.1:11434"):
+    def __init__(self, model: str = "qwen3-vl-8b-ctx32k:latest",
+                 base_url: Union[EndpointSpec, Sequence[EndpointSpec]] = "http://127.0.0.1:11434",
+                 image_format: Optional[str] = None, image_quality: int = 90, max_image_side: Optional[int] = None,
+                 pool_size: int = 8, health_ttl: float = 30.0, cache: Optional[ResultCache] = None,
+                 failure_threshold: int = 2, cooldown: float = 30.0, profiler: Optional[Profiler] = None,
+                 keep_alive: Optional[Union[str, int]] = None,
+                 options: Optional[Union[ModelOptions, Dict[str, Any]]] = None,
+                 max_visual_tokens: Optional[Union[int, str]] = None,
+                 visual_token_pixels: int = VISUAL_TOKEN_PIXELS,
+                 concurrency: Optional[Union[AdaptiveLimiter, Dict[str, Any]]] = None,
+                 request_timeout: float = 300.0):
+        """
+        Args:
+            model (str): Ollama model name
+            base_url: Ollama HTTP endpoint, or a list of endpoints (URLs or
+                {"url", "weight"} dicts) to spread requests across
+            image_format (str|None): Re-encode images as "jpeg", "webp" or "png".
+                None sends files/bytes unchanged and JPEG-encodes raw pixels.
+            image_quality (int): JPEG/WebP quality
+            max_image_side (int|None): Downscale images so the longest side fits
+            pool_size (int): Keep-alive connections kept open per server
+            health_ttl (float): Seconds a health check result is trusted. Every
+                successful request refreshes it; any failure invalidates it.
+            cache (ResultCache|None): Response cache checked before any network call
+            failure_threshold (int): Consecutive failures before a host is taken
+                out of rotation (circuit opened)
+            cooldown (float): Seconds an opened circuit stays open before the
+                host is tried again
+            profiler (Profiler|None): Records encode/request spans and Ollama's
+                reported load/prompt_eval/eval phases
+            keep_alive (str|int|None): How long Ollama keeps the model loaded after
+                each request ("30m", seconds, or -1 for forever). None uses the
+                server default (5 minutes).
+            options (ModelOptions|dict|None): Default Ollama generation options
+                (temperature, top_p, num_ctx, ...). None uses ModelOptions'
+                Qwen3-VL defaults; a dict overrides individual defaults.
+            max_visual_tokens (int|str|None): Per-image visual token budget, or a
+                preset name ("low", "medium", "high", "max"). Images are resized to
+                the token grid within it; None only applies max_image_side.
+            visual_token_pixels (int): Pixels per visual token along each side
+                (32 for Qwen3-VL, 28 for Qwen2/2.5-VL)
+            concurrency (AdaptiveLimiter|dict|None): Adaptive cap on in-flight
+                requests across all threads, or AdaptiveLimiter arguments plus
+                "adaptive": false to disable it. None sends requests as they come.
+            request_timeout (float): Longest deadline for one request in seconds
+                (queueing included). Once replies have been timed, requests get
+                DEADLINE_FACTOR x their expected duration, at least MIN_REQUEST_TIMEOUT.
+        """
         self.model = model
-        self.base_url = base_url.rstrip("/")
+        self.hosts = parse_endpoints(base_url)
+        self.base_url = self.hosts[0].url
+        self.image_format = image_format
+        self.image_quality = image_quality
+        self.max_image_side = max_image_side
+        self.max_visual_tokens = resolve_token_budget(max_visual_tokens)
+        self.visual_token_pixels = visual_token_pixels
+        self.health_ttl = health_ttl
+        self.cache = cache
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.profiler = profiler or Profiler(enabled=False)
+        self.keep_alive = keep_alive
+        if not isinstance(options, ModelOptions):
+            options = ModelOptions().with_overrides(**(options or {}))
+        self.options = options
+        if isinstance(concurrency, dict):
+            settings = dict(concurrency)
+            concurrency = AdaptiveLimiter(**settings) if settings.pop("adaptive", True) else None
+        self.limiter: Optional[AdaptiveLimiter] = concurrency
+        self.request_timeout = request_timeout
+        # Observed generation speed and non-generation overhead, for automatic deadlines
+        self._tokens_per_s: Optional[float] = None
+        self._overhead_s: Optional[float] = None
+        self.timeouts = 0
+
+        # One pooled keep-alive session shared by all calls (and threads)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.hosts), pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
 
-    def _try_endpoints(self):
+    def _try_endpoints(self, host: Optional[OllamaHost] = None):
         # Ollama API endpoints (try chat first as it works better with vision models)
-        return [
+        endpoints = [
             "/api/chat",
             "/api/generate",
         ]
+        preferred = (host or self.hosts[0]).endpoint
+        if preferred in endpoints:
+            endpoints.remove(preferred)
+            endpoints.insert(0, preferred)
+        return endpoints
+
+    def _mark_health(self, host: OllamaHost, healthy: bool):
+        with self._lock:
+            host.healthy = healthy
+            host.health_checked_at = time.monotonic()
+
+    def _mark_failure(self, host: Optional[OllamaHost] = None):
+        """
+        Record a failed request: forget cached health/endpoint so the next call
+        re-checks, and open the host's circuit after repeated failures.
+        """
+        with self._lock:
+            for h in ([host] if host is not None else self.hosts):
+                h.healthy = None
+                h.health_checked_at = 0.0
+                h.endpoint = None
+                h.failures += 1
+                h.total_failures += 1
+                if h.failures >= self.failure_threshold:
+                    h.open_until = time.monotonic() + self.cooldown
 
-    def http_available(self, timeout: float = 1.0) -> bool:
+    def _check_host(self, host: OllamaHost, timeout: float = 1.0, force: bool = False) -> bool:
+        with self._lock:
+            fresh = time.monotonic() - host.health_checked_at < self.health_ttl
+            if not force and host.healthy is not None and fresh:
+                return host.healthy
         try:
-            url = f"{self.base_url}/"  # simple ping
-            r = requests.get(url, timeout=timeout)
-            return True
+            self.session.get(f"{host.url}/", timeout=timeout)  # simple ping
+            healthy = True
         except Exception:
-            return False
+            healthy = False
+        self._mark_health(host, healthy)
+        return healthy
 
-    def _post_try(self, chat_payload: dict, generate_payload: dict, timeout: float = 300.0, debug: bool = False) -> Optional[requests.Response]:
-        for p in self._try_endpoints():
-            try:
-                url = f"{self.base_url}{p}"
-                # Use appropriate payload for endpoint
-                payload = chat_payload if "chat" in p else generate_payload
-                r = requests.post(url, json=payload, timeout=timeout, stream=False)
-                if debug:
-                    print(f"DEBUG: POST {url}")
-                    print(f"DEBUG: Status {r.status_code}")
-                    print(f"DEBUG: Response: {r.text[:500]}")
-                if r.status_code == 200:
-                    return r
-            except Exception as e:
-                if debug:
-                    print(f"DEBUG: Exception at {p}: {e}")
+    def http_available(self, timeout: float = 1.0, force: bool = False) -> bool:
+        """
+        Whether any host's HTTP API is reachable (cached per host for
+        `health_ttl` seconds unless `force`). Hosts with an open circuit are skipped.
+        """
+        now = time.monotonic()
+        for host in self.hosts:
+            if host.open_until > now and not force:
                 continue
+            if self._check_host(host, timeout=timeout, force=force):
+                return True
+        return False
+
+    def _acquire_host(self, exclude: Set[str]) -> Optional[OllamaHost]:
+        """Reserve the least-loaded (outstanding / weight) usable host not in `exclude`."""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [h for h in self.hosts if h.url not in exclude and h.open_until <= now
+                          and h.healthy is not False]
+            if not candidates:
+                return None
+            host = min(candidates, key=lambda h: (h.load, h.last_dispatch))
+            host.outstanding += 1
+            host.requests += 1
+            host.last_dispatch = now
+            return host
+
+    def _release_host(self, host: OllamaHost):
+        with self._lock:
+            host.outstanding -= 1
+
+    def _post_try(self, chat_payload: dict, generate_payload: dict, deadline: Optional[float] = None,
+                  debug: bool = False, stream: bool = False,
+                  errors: Optional[List[str]] = None) -> Tuple[Optional[requests.Response], Optional[OllamaHost]]:
+        """
+        POST to the least-loaded host, retrying on the next host if it fails.
+
+        Every attempt gets the time left until `deadline` (a time.monotonic()
+        value; default request_timeout from now) as its timeout. Timeouts and
+        5xx responses are appended to `errors` ("timeout" or the status code).
+
+        Returns (response, host); the host stays reserved until the caller
+        passes it to _release_host (after reading a streamed body).
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.request_timeout
+        tried: Set[str] = set()
+        while True:
+            host = self._acquire_host(tried)
+            if host is None:
+                return None, None
+            tried.add(host.url)
+            for p in self._try_endpoints(host):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._release_host(host)
+                    return None, None
+                try:
+                    url = f"{host.url}{p}"
+                    # Use appropriate payload for endpoint
+                    payload = chat_payload if "chat" in p else generate_payload
+                    r = self.session.post(url, json=payload, timeout=(min(10.0, remaining), remaining),
+                                          stream=stream)
+                    if debug:
+                        print(f"DEBUG: POST {url}")
+                        print(f"DEBUG: Status {r.status_code}")
+                        if not stream:
+                            print(f"DEBUG: Response: {r.text[:500]}")
+                    if r.status_code == 200:
+                        with self._lock:
+                            host.endpoint = p
+                            host.failures = 0
+                            host.open_until = 0.0
+                        self._mark_health(host, True)
+                        return r, host
+                    if r.status_code >= 500 and errors is not None:
+                        errors.append(str(r.status_code))
+                    r.close()
+                except Exception as e:
+                    if debug:
+                        print(f"DEBUG: Exception at {host.url}{p}: {e}")
+                    if isinstance(e, requests.Timeout) and errors is not None:
+                        errors.append("timeout")
+                    continue
+            self._mark_failure(host)
+            self._release_host(host)
+
+    def warm_up(self, timeout: float = 300.0) -> Dict[str, float]:
+        """
+        Load the model on every reachable host before the first real request.
+
+        Sends an empty /api/generate request, which only loads the model (and
+        applies keep_alive), so the multi-GB load isn't charged to the first frame.
+
+        Returns:
+            {host url: seconds the load took}; unreachable or failing hosts are left out
+        """
+        now = time.monotonic()
+        hosts = [h for h in self.hosts if h.open_until <= now and self._check_host(h)]
+        payload: Dict[str, Any] = {"model": self.model}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+
+        def load(host: OllamaHost) -> Optional[float]:
+            started = time.perf_counter()
+            try:
+                with self.profiler.span("warm_up", host=host.url):
+                    r = self.session.post(f"{host.url}/api/generate", json=payload, timeout=timeout)
+                    r.close()
+            except Exception:
+                return None
+            return time.perf_counter() - started if r.status_code == 200 else None
+
+        if len(hosts) > 1:
+            with ThreadPoolExecutor(max_workers=len(hosts)) as pool:
+                durations = list(pool.map(load, hosts))
+        else:
+            durations = [load(h) for h in hosts]
+        return {h.url: round(d, 3) for h, d in zip(hosts, durations) if d is not None}
+
+    def chat_session(self, system: str, context_tokens: int = 0) -> "ChatSession":
+        """Start a ChatSession sharing `system` as a fixed prefix (see ChatSession)."""
+        return ChatSession(self, system, context_tokens=context_tokens)
+
+    def concurrency_stats(self) -> Optional[Dict[str, Any]]:
+        """The adaptive limiter's current cap and queue depth (None without a limiter)."""
+        if self.limiter is None:
+            return None
+        stats = self.limiter.stats()
+        stats["timeouts"] = self.timeouts
+        return stats
+
+    def _request_timeout(self, num_predict: Optional[int]) -> float:
+        """Deadline in seconds for a request generating up to `num_predict` tokens."""
+        with self._lock:
+            speed, overhead = self._tokens_per_s, self._overhead_s
+        if not speed or overhead is None or not num_predict:
+            return self.request_timeout
+        expected = overhead + num_predict / speed
+        return min(self.request_timeout, max(MIN_REQUEST_TIMEOUT, DEADLINE_FACTOR * expected))
+
+    def _observe(self, metrics: dict, overhead: float):
+        """Fold a finished request into the speed/overhead estimates used for deadlines."""
+        with self._lock:
+            if metrics.get("tokens_per_s"):
+                speed = metrics["tokens_per_s"]
+                self._tokens_per_s = speed if self._tokens_per_s is None else 0.8 * self._tokens_per_s + 0.2 * speed
+            # Track the slow end so deadlines stay generous
+            self._overhead_s = overhead if self._overhead_s is None else max(0.9 * self._overhead_s, overhead)
+
+    def host_stats(self) -> List[Dict[str, Any]]:
+        """Per-host dispatch counters and circuit state."""
+        with self._lock:
+            return [h.stats() for h in self.hosts]
+
+    def close(self):
+        """Close pooled connections."""
+        self.session.close()
+
+    def encode_image_b64(self, image: ImageInput, info: Optional[dict] = None) -> str:
+        """
+        Encode an image with this client's format/quality/size/token settings as
+        base64 (`info` receives the uploaded width, height and visual_tokens).
+        """
+        b = encode_image(image, fmt=self.image_format, quality=self.image_quality, max_side=self.max_image_side,
+                         max_tokens=self.max_visual_tokens, patch=self.visual_token_pixels, info=info)
+        return base64.b64encode(b).decode("ascii")
+
+    @staticmethod
+    def _extract_text(j: dict) -> Optional[str]:
+        """Pull the generated text out of an Ollama response (None if there is none)."""
+        # Ollama returns 'response' key for /api/generate
+        if "response" in j and j["response"]:
+            return str(j["response"])
+        
+        # Qwen3-VL models may use 'thinking' field for reasoning (in generate endpoint)
+        if "thinking" in j and j["thinking"]:
+            return str(j["thinking"])
+        
+        # For /api/chat, check 'message' -> 'content' or 'thinking'
+        if "message" in j:
+            msg = j["message"]
+            # Check content first
+            if "content" in msg and msg["content"]:
+                return str(msg["content"])
+            # Check thinking field (Qwen3-VL specific)
+            if "thinking" in msg and msg["thinking"]:
+                return str(msg["thinking"])
         return None
 
     def generate(self, prompt: str, image_path: Optional[str] = None, max_tokens: Optional[int] = None, 
-                 debug: bool = False) -> str:
-        # Load image as base64 if provided
-        image_b64 = None
+                 debug: bool = False, image: Optional[ImageInput] = None, use_cache: bool = True,
+                 on_token: Optional[Callable[[str], None]] = None, metrics: Optional[dict] = None,
+                 options: Optional[Dict[str, Any]] = None, system: Optional[str] = None,
+                 timeout: Optional[float] = None) -> str:
+        """
+        Run the model on a prompt with an optional image.
+
+        Args:
+            prompt (str): Text prompt
+            image_path (str|None): Path to an image file
+            max_tokens (int|None): Maximum tokens to generate (num_predict)
+            debug (bool): Print request/response details
+            image: In-memory image (bytes, numpy RGB array or PIL image); takes
+                precedence over image_path and is never written to disk
+            use_cache (bool): Look up / store the response in the client's cache
+            on_token (callable|None): If given, the response is streamed and
+                this is called with each text delta as it arrives
+            metrics (dict|None): Filled with timing and token counts (see request_metrics)
+            options (dict|None): Ollama options overriding the client's defaults
+                for this call only (max_tokens still wins for num_predict)
+            system (str|None): System prompt sent ahead of the user message
+            timeout (float|None): Deadline in seconds, queueing included (default:
+                from observed speed, at most the client's request_timeout)
+        """
+        images_b64 = self._encode_inputs(image, image_path, metrics)
+        chunks = self._iter_request(prompt, images_b64, max_tokens=max_tokens, debug=debug, use_cache=use_cache,
+                                    stream=on_token is not None, metrics=metrics, options=options, system=system,
+                                    timeout=timeout)
+        parts = []
+        for delta in chunks:
+            if on_token is not None:
+                on_token(delta)
+            parts.append(delta)
+        return "".join(parts)
+
+    def generate_stream(self, prompt: str, image_path: Optional[str] = None, max_tokens: Optional[int] = None,
+                        debug: bool = False, image: Optional[ImageInput] = None, use_cache: bool = True,
+                        metrics: Optional[dict] = None, options: Optional[Dict[str, Any]] = None,
+                        system: Optional[str] = None, timeout: Optional[float] = None) -> Iterator[str]:
+        """
+        Like generate(), but return a generator of text deltas as Ollama produces them.
+
+        `metrics` (if given) is filled once the generator is exhausted.
+        """
+        images_b64 = self._encode_inputs(image, image_path, metrics)
+        return self._iter_request(prompt, images_b64, max_tokens=max_tokens, debug=debug, use_cache=use_cache,
+                                  stream=True, metrics=metrics, options=options, system=system, timeout=timeout)
+
+    def _encode_inputs(self, image: Optional[ImageInput], image_path: Optional[str],
+                       metrics: Optional[dict] = None) -> List[str]:
+        if image is not None:
+            return self._encode_all([image], metrics)
         if image_path is not None and os.path.exists(image_path):
-            with open(image_path, "rb") as f:
-                b = f.read()
-            image_b64 = base64.b64encode(b).decode("ascii")
-        
-        # Build options with optimal Qwen3-VL sampling parameters
-        # Based on official docs: https://huggingface.co/Qwen/Qwen3-VL-32B-Instruct
-        options = {}
+            return self._encode_all([image_path], metrics)
+        return []
+
+    def _encode_all(self, images: Sequence[ImageInput], metrics: Optional[dict] = None) -> List[str]:
+        """
+        Encode images to base64. metrics gets "encode_s" (time spent), "image_sizes"
+        (uploaded "WxH" per image) and "visual_tokens" (estimated total).
+        """
+        started = time.perf_counter()
+        encoded = []
+        infos = []
+        for img in images:
+            info: Dict[str, Any] = {}
+            with self.profiler.span("encode"):
+                encoded.append(self.encode_image_b64(img, info=info))
+            infos.append(info)
+        if metrics is not None:
+            metrics["encode_s"] = round(time.perf_counter() - started, 4)
+            metrics["image_sizes"] = [f"{i['width']}x{i['height']}" for i in infos]
+            metrics["visual_tokens"] = sum(i["visual_tokens"] for i in infos)
+        return encoded
+
+    def generate_batch(self, prompt: str, images: Sequence[ImageInput], max_tokens: Optional[int] = None,
+                       debug: bool = False, use_cache: bool = True, metrics: Optional[dict] = None,
+                       options: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> List[str]:
+        """
+        Analyze several images in a single request and return one answer per image.
+
+        All images go into one chat message, so the prompt is only prefilled
+        once and the model can compare images (e.g. consecutive video frames).
+        The model is asked for a JSON array with one entry per image; if the
+        reply can't be split, every entry holds the full reply.
+
+        Args:
+            prompt (str): Instructions applied to every image
+            images: Images in order (paths, bytes, numpy RGB arrays or PIL images)
+            max_tokens (int|None): Maximum tokens for the whole reply
+            debug (bool): Print request/response details
+            use_cache (bool): Look up / store the response in the client's cache
+            metrics (dict|None): Filled with timing and token counts for the request
+            options (dict|None): Ollama options overriding the client's defaults
+            timeout (float|None): Deadline in seconds for the whole request
+        """
+        if not images:
+            return []
+        images_b64 = self._encode_all(images, metrics)
+        n = len(images_b64)
+        batch_prompt = (
+            f"{prompt}\n\n"
+            f"You are given {n} images, numbered 1 to {n} in the order they are attached. "
+            f"Answer for every image separately. Respond with only a JSON array of exactly {n} objects "
+            f'in image order, each of the form {{"image": <number>, "analysis": "<your answer for that image>"}}.'
+        )
+        text = "".join(self._iter_request(batch_prompt, images_b64, max_tokens=max_tokens, debug=debug,
+                                          use_cache=use_cache, metrics=metrics, options=options,
+                                          timeout=timeout))
+        parts = split_batch_response(text, n)
+        if parts is None:
+            if debug:
+                print("DEBUG: Could not split batch response; returning full text for each image")
+            return [text] * n
+        return parts
+
+    @staticmethod
+    def _extract_delta(j: dict) -> str:
+        """Text carried by one streamed chunk (thinking and/or content)."""
+        if "message" in j:
+            msg = j["message"] or {}
+            return (msg.get("thinking") or "") + (msg.get("content") or "")
+        return (j.get("thinking") or "") + (j.get("response") or "")
+
+    def _iter_request(self, prompt: str, images_b64: List[str], max_tokens: Optional[int] = None,
+                      debug: bool = False, use_cache: bool = True, stream: bool = False,
+                      metrics: Optional[dict] = None, options: Optional[Dict[str, Any]] = None,
+                      system: Optional[str] = None, timeout: Optional[float] = None) -> Iterator[str]:
+        """
+        Send one prompt with already-encoded images (cache, HTTP, then CLI fallback).
+
+        Yields the reply: as deltas while it is generated when `stream` is set,
+        otherwise in one piece. Timing and token counts go into `metrics`.
+        The request must finish within `timeout` seconds (default: see
+        _request_timeout), including any wait for a concurrency slot.
+        """
+        # Client defaults (config.json model.parameters), then per-call overrides
+        request_options = self.options.with_overrides(**(options or {}))
         if max_tokens is not None:
-            options["num_predict"] = max_tokens
-        
-        # Qwen3-VL-Instruct optimal parameters for vision-language tasks:
-        # temperature=0.7, top_p=0.8, top_k=20, presence_penalty=1.5
-        options["temperature"] = 0.7
-        options["top_p"] = 0.8
-        options["top_k"] = 20
-        options["presence_penalty"] = 1.5  # Reduces repetition in responses
+            request_options = request_options.with_overrides(num_predict=max_tokens)
+        options = request_options.to_ollama()
         
         # Try /api/chat format first (works better with vision models)
         chat_payload = {
@@ -88,36 +559,113 @@ class OllamaClient:
                     "content": prompt
                 }
             ],
-            "stream": False
+            "stream": stream
         }
-        if image_b64:
-            chat_payload["messages"][0]["images"] = [image_b64]
+        if images_b64:
+            chat_payload["messages"][0]["images"] = images_b64
+        if system:
+            # First in the prompt and identical across a session: Ollama reuses its cached prefix
+            chat_payload["messages"].insert(0, {"role": "system", "content": system})
         if options:
             chat_payload["options"] = options
+        if self.keep_alive is not None:
+            chat_payload["keep_alive"] = self.keep_alive
         
         # Build /api/generate format as fallback
         generate_payload = {
             "model": self.model,
             "prompt": prompt,
-            "stream": False
+            "stream": stream
         }
-        if image_b64:
-            generate_payload["images"] = [image_b64]
+        if images_b64:
+            generate_payload["images"] = images_b64
+        if system:
+            generate_payload["system"] = system
         if options:
             generate_payload["options"] = options
+        if self.keep_alive is not None:
+            generate_payload["keep_alive"] = self.keep_alive
         
-        # Choose payload based on endpoint
-        payload = chat_payload  # Try chat first
-
         if debug:
             print(f"DEBUG: Chat payload keys: {list(chat_payload.keys())}")
-            if image_b64:
+            for image_b64 in images_b64:
                 print(f"DEBUG: Image base64 length: {len(image_b64)}")
 
+        started = time.perf_counter()
+
+        # Identical request already answered? Skip the network entirely.
+        key = None
+        if self.cache is not None and use_cache:
+            key = cache_key(self.model, prompt, images_b64, options, extra={"system": system} if system else None)
+            cached = self.cache.get(key)
+            if cached is not None:
+                if debug:
+                    print(f"DEBUG: Cache hit {key[:12]}")
+                if metrics is not None:
+                    metrics.update(cached=True, total_s=time.perf_counter() - started)
+                self.profiler.count("cache_hits")
+                yield cached
+                return
+
         # Try HTTP API first
         if self.http_available():
+            yielded = False
+            host = None
+            ticket = None
+            overhead = None
+            errors: List[str] = []
+            if timeout is None:
+                timeout = self._request_timeout(request_options.num_predict)
+            # Waiting for a concurrency slot counts against the deadline
+            deadline = time.monotonic() + timeout
+            if metrics is not None:
+                metrics["deadline_s"] = round(timeout, 1)
             try:
-                r = self._post_try(chat_payload, generate_payload, debug=debug)
+                if self.limiter is not None:
+                    waited = time.perf_counter()
+                    with self.profiler.span("queue_wait"):
+                        ticket = self.limiter.acquire(timeout=timeout)
+                    if metrics is not None:
+                        metrics["queue_wait_s"] = round(time.perf_counter() - waited, 4)
+                        metrics["concurrency_limit"] = self.limiter.limit
+                    if ticket is None:
+                        raise TimeoutError("no free request slot")
+                sent_at = time.perf_counter()
+                r, host = self._post_try(chat_payload, generate_payload, deadline=deadline, debug=debug,
+                                         stream=stream, errors=errors)
+                if r is None and time.monotonic() >= deadline:
+                    raise TimeoutError("no response")
+                if host is not None and metrics is not None and len(self.hosts) > 1:
+                    metrics["host"] = host.url
+                if r is not None and stream:
+                    parts = []
+                    final = {}
+                    first_token_at = None
+                    with r:
+                        for line in r.iter_lines():
+                            if time.monotonic() > deadline:
+                                raise TimeoutError("reply still streaming")
+                            if not line:
+                                continue
+                            j = json.loads(line)
+                            if j.get("error"):
+                                yield f"<error> {j['error']}"
+                                return
+                            delta = self._extract_delta(j)
+                            if delta:
+                                if first_token_at is None:
+                                    first_token_at = time.perf_counter()
+                                parts.append(delta)
+                                yielded = True
+                                yield delta
+                            if j.get("done"):
+                                final = j
+                                break
+                    overhead = self._finish_request(final, started, sent_at, metrics, first_token_at)
+                    # A stream that ended without done: true was cut off; don't persist the partial reply
+                    if key is not None and parts and final.get("done"):
+                        self.cache.put(key, "".join(parts))
+                    return
                 if r is not None:
                     # Parse Ollama response format
                     try:
@@ -125,33 +673,75 @@ class OllamaClient:
                         if debug:
                             print(f"DEBUG: Response JSON keys: {list(j.keys())}")
                             print(f"DEBUG: Full response: {j}")
-                        
-                        # Ollama returns 'response' key for /api/generate
-                        if "response" in j and j["response"]:
-                            return str(j["response"])
-                        
-                        # Qwen3-VL models may use 'thinking' field for reasoning (in generate endpoint)
-                        if "thinking" in j and j["thinking"]:
-                            return str(j["thinking"])
-                        
-                        # For /api/chat, check 'message' -> 'content' or 'thinking'
-                        if "message" in j:
-                            msg = j["message"]
-                            # Check content first
-                            if "content" in msg and msg["content"]:
-                                return str(msg["content"])
-                            # Check thinking field (Qwen3-VL specific)
-                            if "thinking" in msg and msg["thinking"]:
-                                return str(msg["thinking"])
-                        
-                        # Fallback to full JSON
-                        return json.dumps(j)
+                        text = self._extract_text(j)
                     except Exception as e:
-                        return f"<json-parse-error> {str(e)}: {r.text[:500]}"
+                        yield f"<json-parse-error> {str(e)}: {r.text[:500]}"
+                        return
+                    overhead = self._finish_request(j, started, sent_at, metrics)
+                    if text is None:
+                        # Fallback to full JSON
+                        yield json.dumps(j)
+                        return
+                    if key is not None:
+                        self.cache.put(key, text)
+                    yield text
+                    return
             except Exception as e:
-                pass
+                timed_out = isinstance(e, (TimeoutError, requests.Timeout))
+                if timed_out:
+                    # Out of time, not a broken host: don't trip its circuit or fall back to the CLI
+                    errors.append("timeout")
+                    with self._lock:
+                        self.timeouts += 1
+                    prefix = "\n" if yielded else ""
+                    yield f"{prefix}<error> Request deadline of {timeout:.0f}s exceeded ({e})"
+                    return
+                if host is not None:
+                    self._mark_failure(host)
+                if yielded:
+                    # Part of the reply was already delivered; don't mix in a CLI answer
+                    yield f"\n<error> Stream interrupted: {str(e)}"
+                    return
+            finally:
+                if host is not None:
+                    self._release_host(host)
+                if ticket is not None:
+                    self.limiter.release(ticket, overhead=overhead, failed=bool(errors))
 
         # Fallback to CLI `ollama run <model>` if available
+        yield self._run_cli(prompt)
+
+    def _finish_request(self, final: dict, started: float, sent_at: float, metrics: Optional[dict],
+                        first_token_at: Optional[float] = None) -> float:
+        """
+        Record a completed request's metrics and trace; returns its overhead
+        (seconds from sending to the end of the reply, minus token generation).
+        """
+        m = request_metrics(final, started, first_token_at)
+        if metrics is not None:
+            metrics.update(m)
+        self._trace_request(sent_at, final)
+        overhead = max(0.0, time.perf_counter() - sent_at - m.get("eval_duration_s", 0.0))
+        self._observe(m, overhead)
+        return overhead
+
+    def _trace_request(self, sent_at: float, j: dict):
+        """Record the HTTP round trip and, nested inside it, the phases Ollama reports."""
+        if not self.profiler.enabled:
+            return
+        end = time.perf_counter()
+        self.profiler.add("request", sent_at, end - sent_at)
+        self.profiler.count("requests")
+        # Server phases run back to back and end roughly when the reply does
+        t = end
+        for field, name in (("eval_duration", "ollama.eval"), ("prompt_eval_duration", "ollama.prompt_eval"),
+                            ("load_duration", "ollama.load")):
+            duration = (j.get(field) or 0) / 1e9
+            if duration > 0:
+                t -= duration
+                self.profiler.add(name, t, duration)
+
+    def _run_cli(self, prompt: str) -> str:
         try:
             cli_cmd = ["ollama", "run", self.model]
             # send prompt via stdin
@@ -168,7 +758,131 @@ class OllamaClient:
             return f"<error> {str(e)}"
 
 
+class ChatSession:
+    """
+    A series of related requests sharing one fixed system prompt.
+
+    The system prompt goes first and is byte-identical on every call, so
+    Ollama's prompt cache can reuse it instead of re-processing the
+    instructions each time. With `context_tokens` > 0 the session also
+    carries a rolling summary of earlier results (added with remember()),
+    prepended to each prompt and trimmed oldest first to that many tokens.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, client: "OllamaClient", system: str, context_tokens: int = 0, note_chars: int = 240):
+        """
+        Args:
+            client (OllamaClient): Client used for the requests
+            system (str): Fixed instructions sent as the system prompt
+            context_tokens (int): Token budget for the rolling summary (0 disables it)
+            note_chars (int): Notes longer than this are cut to keep the summary compact
+        """
+        self.client = client
+        self.system = system
+        self.context_tokens = max(0, context_tokens)
+        self.note_chars = note_chars
+        self._notes: List[Tuple[float, str]] = []  # (order key, note), sorted by key
+        self._lock = threading.Lock()
+
+    def remember(self, note: str, key: Optional[float] = None):
+        """Add a note to the rolling summary, ordered by `key` (default: insertion order)."""
+        if not self.context_tokens:
+            return
+        note = " ".join(note.split())
+        if len(note) > self.note_chars:
+            note = note[:self.note_chars].rsplit(" ", 1)[0] + " ..."
+        with self._lock:
+            if key is None:
+                key = self._notes[-1][0] + 1 if self._notes else 0.0
+            self._notes.append((key, note))
+            self._notes.sort(key=lambda n: n[0])
+            # Drop the oldest notes until the summary fits its budget
+            while self._notes and estimate_tokens("\n".join(n for _, n in self._notes)) > self.context_tokens:
+                self._notes.pop(0)
+
+    def context(self) -> str:
+        """The current rolling summary (empty if there is none)."""
+        with self._lock:
+            return "\n".join(f"- {note}" for _, note in self._notes)
+
+    def generate(self, prompt: str, **kwargs) -> str:
+        """OllamaClient.generate() with the session's system prompt and rolling summary."""
+        context = self.context()
+        if context:
+            prompt = f"Summary of the previous results in this sequence:\n{context}\n\n{prompt}"
+        return self.client.generate(prompt, system=self.system, **kwargs)
+
+
+def is_failed_analysis(analysis: str) -> bool:
+    """Whether a reply is one of OllamaClient's error markers."""
+    return analysis.startswith(("<error>", "<ollama-cli-error>", "<json-parse-error>"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for English text (about 4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def request_metrics(j: dict, started: float, first_token_at: Optional[float] = None) -> dict:
+    """
+    Timing metrics for one request.
+
+    total_s / ttft_s are measured on the client (ttft_s only for streamed
+    requests); the rest come from Ollama's final response (durations are
+    reported in nanoseconds and converted to seconds).
+    """
+    m = {"total_s": round(time.perf_counter() - started, 4)}
+    if first_token_at is not None:
+        m["ttft_s"] = round(first_token_at - started, 4)
+    for field in ("prompt_eval_count", "eval_count"):
+        if j.get(field) is not None:
+            m[field] = j[field]
+    for field in ("load_duration", "prompt_eval_duration", "eval_duration", "total_duration"):
+        if j.get(field) is not None:
+            m[f"{field}_s"] = round(j[field] / 1e9, 4)
+    if j.get("eval_count") and j.get("eval_duration"):
+        m["tokens_per_s"] = round(j["eval_count"] / (j["eval_duration"] / 1e9), 2)
+    return m
+
+
+def split_batch_response(text: str, n: int) -> Optional[List[str]]:
+    """
+    Split a generate_batch reply into `n` per-image answers.
+
+    Accepts a JSON array of {"image", "analysis"} objects (optionally inside a
+    ```json fence) or, failing that, "Image 1:" / "Frame 1:" style sections.
+    Returns None if neither yields exactly `n` answers.
+    """
+    start, end = text.find("["), text.rfind("]")
+    if start != -1 and end > start:
+        try:
+            items = json.loads(text[start:end + 1])
+        except ValueError:
+            items = None
+        if isinstance(items, list) and len(items) == n:
+            if all(isinstance(it, dict) and isinstance(it.get("image"), int) for it in items):
+                items = sorted(items, key=lambda it: it["image"])
+            parts = []
+            for it in items:
+                if isinstance(it, dict):
+                    value = it.get("analysis", it)
+                    parts.append(value if isinstance(value, str) else json.dumps(value, ensure_ascii=False))
+                else:
+                    parts.append(str(it))
+            return parts
+
+    # Plain-text fallback: sections introduced by "Image k" or "Frame k"
+    matches = list(re.finditer(r"^\W*(?:image|frame)\s*(\d+)\W*", text, flags=re.IGNORECASE | re.MULTILINE))
+    if len(matches) == n and [int(m.group(1)) for m in matches] == list(range(1, n + 1)):
+        return [text[m.end():(matches[i + 1].start() if i + 1 < n else len(text))].strip()
+                for i, m in enumerate(matches)]
+    return None
+
+
 if __name__ == "__main__":
     c = OllamaClient()
     print("HTTP available:", c.http_available())
-    print(c.generate("Say hello"))
+    m = {}
+    c.generate("Say hello", on_token=lambda t: print(t, end="", flush=True), metrics=m)
+    print("\n", m)
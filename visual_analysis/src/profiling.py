@@ -0,0 +1,181 @@
+"""
+Lightweight stage timing for the analysis pipeline.
+
+A Profiler records named spans (start time, duration, thread, optional args)
+and counters from any thread. It can print a per-stage summary table and
+export a Chrome trace (open in chrome://tracing or https://ui.perfetto.dev).
+A disabled profiler (the default everywhere) costs one attribute check per span.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, List
+
+import numpy as np
+
+_NULL_SPAN = nullcontext()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "args", "start")
+
+    def __init__(self, profiler: "Profiler", name: str, args: Dict[str, Any]):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, self.start, time.perf_counter() - self.start, **self.args)
+        return False
+
+
+class Profiler:
+    """Thread-safe collector of timed spans and counters."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.events: List[Dict[str, Any]] = []
+        self.counters: Dict[str, int] = {}
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def span(self, name: str, **args):
+        """Context manager timing a block as stage `name` (args are kept with the event)."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def add(self, name: str, start: float, duration: float, **args):
+        """Record a span measured elsewhere (`start` is a time.perf_counter() value)."""
+        if not self.enabled:
+            return
+        thread = threading.current_thread()
+        with self._lock:
+            self._threads.setdefault(thread.ident, thread.name)
+            self.events.append({"name": name, "start": start, "dur": duration, "tid": thread.ident, "args": args})
+
+    def count(self, name: str, n: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def export(self) -> Dict[str, Any]:
+        """Spans, counters and thread names as plain data (e.g. to send to another process)."""
+        with self._lock:
+            return {"events": list(self.events), "counters": dict(self.counters), "threads": dict(self._threads)}
+
+    def merge(self, data: Dict[str, Any], label: str = ""):
+        """
+        Add another profiler's export(). Spans keep their start times (perf_counter
+        is system-wide), threads get their own tracks named "<label> <thread>".
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            tids = {}
+            for tid, name in data.get("threads", {}).items():
+                # Thread ids are only unique within a process
+                tids[tid] = hash((label, tid)) & 0x7FFFFFFF
+                self._threads[tids[tid]] = f"{label} {name}".strip()
+            for e in data.get("events", []):
+                self.events.append(dict(e, tid=tids.get(e["tid"], e["tid"])))
+            for name, value in data.get("counters", {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def stage_summary(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage count, total and mean/p50/p95 duration in seconds."""
+        with self._lock:
+            events = list(self.events)
+        durations: Dict[str, List[float]] = {}
+        for e in events:
+            durations.setdefault(e["name"], []).append(e["dur"])
+        summary = {}
+        for name, values in durations.items():
+            summary[name] = {
+                "count": len(values),
+                "total_s": round(float(np.sum(values)), 4),
+                "mean_s": round(float(np.mean(values)), 5),
+                "p50_s": round(float(np.percentile(values, 50)), 5),
+                "p95_s": round(float(np.percentile(values, 95)), 5),
+            }
+        return summary
+
+    def format_summary(self) -> str:
+        """Summary table, stages sorted by total time (stages on different threads overlap)."""
+        summary = self.stage_summary()
+        lines = [f"{'Stage':<20} {'Count':>7} {'Total s':>9} {'Mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}"]
+        for name, s in sorted(summary.items(), key=lambda kv: -kv[1]["total_s"]):
+            lines.append(f"{name:<20} {s['count']:>7} {s['total_s']:>9.3f} {s['mean_s'] * 1000:>9.1f} "
+                         f"{s['p50_s'] * 1000:>9.1f} {s['p95_s'] * 1000:>9.1f}")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name:<20} {value:>7}")
+        return "\n".join(lines)
+
+    def write_chrome_trace(self, path: str):
+        """Write all spans in Chrome Trace Event format (one track per thread)."""
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+            threads = dict(self._threads)
+        trace = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                 for tid, name in threads.items()]
+        for e in events:
+            trace.append({
+                "name": e["name"], "ph": "X", "pid": pid, "tid": e["tid"],
+                "ts": round((e["start"] - self._origin) * 1e6, 1),
+                "dur": round(e["dur"] * 1e6, 1),
+                "args": e["args"],
+            })
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+
+def frame_breakdown(profiler: Profiler, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Per-frame stage times in seconds, joining the profiler's decode/convert
+    spans (tagged with the frame's timestamp) with each result's request metrics.
+
+    network_s is what the client waited beyond Ollama's own total_duration
+    (transfer plus queueing on the server).
+    """
+    local: Dict[float, Dict[str, float]] = {}
+    with profiler._lock:
+        events = list(profiler.events)
+    for e in events:
+        ts = e["args"].get("timestamp")
+        if ts is not None:
+            stages = local.setdefault(ts, {})
+            stages[f"{e['name']}_s"] = stages.get(f"{e['name']}_s", 0.0) + e["dur"]
+
+    rows = []
+    for r in results:
+        row: Dict[str, Any] = {"timestamp": r["timestamp"]}
+        row.update({k: round(v, 5) for k, v in local.get(r["timestamp"], {}).items()})
+        m = r.get("metrics") or {}
+        if r.get("reused"):
+            row["reused"] = True
+        elif r.get("resumed"):
+            row["resumed"] = True
+            m = {}  # timed by an earlier run
+        elif m.get("cached"):
+            row["cached"] = True
+        for field in ("encode_s", "load_duration_s", "prompt_eval_duration_s", "eval_duration_s"):
+            if field in m:
+                row[field] = m[field]
+        if "total_s" in m:
+            row["request_s"] = m["total_s"]
+            if "total_duration_s" in m:
+                row["network_s"] = round(max(0.0, m["total_s"] - m["total_duration_s"]), 4)
+        if m.get("frames_in_request"):
+            row["frames_in_request"] = m["frames_in_request"]
+        rows.append(row)
+    return rows
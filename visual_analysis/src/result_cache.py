@@ -0,0 +1,137 @@
+"""
+Content-addressed on-disk cache for model responses.
+
+Entries are keyed by a SHA-256 of the exact request content (model, prompt,
+image bytes and sampling options) and stored in a single SQLite file. When the
+total size exceeds the configured limit, least recently used entries are evicted.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence
+
+
+def cache_key(model: str, prompt: str, images: Sequence[str] = (), options: Optional[Dict[str, Any]] = None,
+              extra: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Build a cache key for a request.
+
+    Args:
+        model (str): Model name
+        prompt (str): Prompt text
+        images: Base64-encoded images exactly as uploaded
+        options (dict|None): Ollama sampling options
+        extra (dict|None): Any other request fields that change the output
+    """
+    h = hashlib.sha256()
+    header = {"model": model, "prompt": prompt, "options": options or {}, "extra": extra or {}}
+    h.update(json.dumps(header, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    for img in images:
+        h.update(b"\0")
+        h.update(hashlib.sha256(img.encode("ascii")).digest())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """SQLite-backed response cache with size-based LRU eviction (thread-safe)."""
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Args:
+            path (str): SQLite database file (parent directory is created)
+            max_bytes (int): Evict least recently used entries above this total size
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value for `key` (and mark it recently used), or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str):
+        """Store `value` under `key`, evicting old entries if over the size limit."""
+        size = len(value.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC").fetchall()
+        stale = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", stale)
+
+    def stats(self) -> Dict[str, int]:
+        """Entry count, total stored bytes and hit/miss counters for this process."""
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": count, "bytes": total, "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def cache_from_config(cfg: Optional[dict], base_dir: str) -> Optional[ResultCache]:
+    """
+    Build the cache described by the `cache` section of config.json.
+
+    Relative paths are resolved against `base_dir` (the visual_analysis folder).
+    Returns None when caching is disabled.
+    """
+    section = (cfg or {}).get("cache", {})
+    if not section.get("enabled", True):
+        return None
+    path = section.get("path", "cache/results.sqlite")
+    if not os.path.isabs(path):
+        path = os.path.join(base_dir, path)
+    max_bytes = int(section.get("max_size_mb", 512)) * 1024 * 1024
+    return ResultCache(path, max_bytes=max_bytes)
@@ -0,0 +1,188 @@
+"""
+Typed view of visual_analysis/config.json, shared by both CLIs and OllamaClient.
+
+config.json is read once per process (load_settings caches it). The
+`model.parameters` section becomes a ModelOptions, which maps onto Ollama's
+request `options`; any call site can override individual values, e.g. a short
+num_predict for a quick triage pass.
+"""
+
+import dataclasses
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Union
+
+DEFAULT_CONFIG_PATH = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "config.json"))
+DEFAULT_MODEL = "qwen3-vl-8b-ctx32k-explicit:latest"
+DEFAULT_OLLAMA_URL = "http://127.0.0.1:11434"
+DEFAULT_DAEMON_PORT = 8765
+
+# config.json spellings that differ from the Ollama option name
+_PARAMETER_ALIASES = {"max_new_tokens": "num_predict", "max_tokens": "num_predict"}
+
+
+@dataclass
+class ModelOptions:
+    """
+    Ollama generation options. None leaves a value to the model's Modelfile.
+
+    The defaults are Qwen3-VL-Instruct's recommended sampling settings
+    (https://huggingface.co/Qwen/Qwen3-VL-32B-Instruct). Options Ollama
+    accepts but this class doesn't name (seed, min_p, num_thread, ...) go in `extra`.
+    """
+    num_predict: Optional[int] = None
+    temperature: Optional[float] = 0.7
+    top_p: Optional[float] = 0.8
+    top_k: Optional[int] = 20
+    presence_penalty: Optional[float] = 1.5
+    repeat_penalty: Optional[float] = None
+    num_ctx: Optional[int] = None
+    num_batch: Optional[int] = None
+    num_gpu: Optional[int] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_parameters(cls, params: Optional[Dict[str, Any]]) -> "ModelOptions":
+        """Build options from a config.json `model.parameters` section."""
+        return cls().with_overrides(**(params or {}))
+
+    def with_overrides(self, **overrides: Any) -> "ModelOptions":
+        """Copy with some options replaced (None removes an option; unknown names go to `extra`)."""
+        known = {f.name for f in dataclasses.fields(self)} - {"extra"}
+        changes: Dict[str, Any] = {}
+        extra = dict(self.extra)
+        for name, value in overrides.items():
+            name = _PARAMETER_ALIASES.get(name, name)
+            if name in known:
+                changes[name] = value
+            elif value is None:
+                extra.pop(name, None)
+            else:
+                extra[name] = value
+        return dataclasses.replace(self, extra=extra, **changes)
+
+    def to_ollama(self) -> Dict[str, Any]:
+        """The `options` object for an Ollama request (unset values omitted)."""
+        options = {f.name: getattr(self, f.name) for f in dataclasses.fields(self) if f.name != "extra"}
+        options.update(self.extra)
+        return {k: v for k, v in options.items() if v is not None}
+
+
+@dataclass
+class Settings:
+    """Everything the CLIs read from config.json, with defaults for missing keys."""
+    model_name: str = DEFAULT_MODEL
+    # Context window the model was created with; used for prompt budgeting.
+    # Not sent as num_ctx (a different num_ctx makes Ollama reload the model).
+    max_context_length: Optional[int] = None
+    options: ModelOptions = field(default_factory=ModelOptions)
+    endpoints: List[Any] = field(default_factory=lambda: [DEFAULT_OLLAMA_URL])
+    keep_alive: Optional[Union[str, int]] = None
+    warm_up: bool = True
+    # AdaptiveLimiter arguments ("adaptive": false disables it) and the longest request deadline
+    concurrency: Optional[Dict[str, Any]] = None
+    request_timeout: float = 300.0
+    image_format: Optional[str] = "jpeg"
+    image_quality: int = 90
+    max_image_side: Optional[int] = 1280
+    # Per-image visual token budget (count or preset name) and token grid size
+    max_visual_tokens: Optional[Union[int, str]] = None
+    visual_token_pixels: int = 32
+    frame_interval: int = 30
+    daemon_host: str = "127.0.0.1"
+    daemon_port: int = DEFAULT_DAEMON_PORT
+    jobs_db: str = "cache/jobs.sqlite"
+    raw: Dict[str, Any] = field(default_factory=dict)
+    base_dir: str = os.path.dirname(DEFAULT_CONFIG_PATH)
+
+    @classmethod
+    def from_dict(cls, cfg: Optional[Dict[str, Any]], base_dir: Optional[str] = None) -> "Settings":
+        cfg = cfg or {}
+        model = cfg.get("model", {})
+        ollama = cfg.get("ollama", {})
+        enc = cfg.get("image_encoding", {})
+        daemon = cfg.get("daemon", {})
+        defaults = cls()
+        return cls(
+            model_name=model.get("name") or DEFAULT_MODEL,
+            max_context_length=model.get("max_context_length"),
+            options=ModelOptions.from_parameters(model.get("parameters")),
+            endpoints=ollama.get("endpoints") or [DEFAULT_OLLAMA_URL],
+            keep_alive=ollama.get("keep_alive"),
+            warm_up=ollama.get("warm_up", True),
+            concurrency=ollama.get("concurrency"),
+            request_timeout=ollama.get("request_timeout", defaults.request_timeout),
+            image_format=enc.get("format", defaults.image_format),
+            image_quality=enc.get("quality", defaults.image_quality),
+            max_image_side=enc.get("max_side", defaults.max_image_side),
+            max_visual_tokens=enc.get("max_visual_tokens", defaults.max_visual_tokens),
+            visual_token_pixels=enc.get("visual_token_pixels", defaults.visual_token_pixels),
+            frame_interval=cfg.get("video_analysis", {}).get("frame_interval", defaults.frame_interval),
+            daemon_host=daemon.get("host", defaults.daemon_host),
+            daemon_port=daemon.get("port", defaults.daemon_port),
+            jobs_db=daemon.get("jobs_db", defaults.jobs_db),
+            raw=cfg,
+            base_dir=base_dir or defaults.base_dir,
+        )
+
+    @property
+    def daemon_url(self) -> str:
+        return f"http://{self.daemon_host}:{self.daemon_port}"
+
+    def client_kwargs(self) -> Dict[str, Any]:
+        """OllamaClient keyword arguments for these settings (model, cache and profiler excluded)."""
+        return {
+            "base_url": self.endpoints,
+            "image_format": self.image_format,
+            "image_quality": self.image_quality,
+            "max_image_side": self.max_image_side,
+            "max_visual_tokens": self.max_visual_tokens,
+            "visual_token_pixels": self.visual_token_pixels,
+            "keep_alive": self.keep_alive,
+            "options": self.options,
+            "concurrency": self.concurrency,
+            "request_timeout": self.request_timeout,
+        }
+
+
+_loaded: Dict[str, Settings] = {}
+
+
+def load_settings(path: Optional[str] = None) -> Settings:
+    """
+    Load config.json (default: visual_analysis/config.json) once per process.
+
+    A missing file gives the defaults; an unreadable one prints a warning and
+    also falls back to the defaults.
+    """
+    path = os.path.abspath(path or DEFAULT_CONFIG_PATH)
+    if path not in _loaded:
+        cfg: Dict[str, Any] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    cfg = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Warning: could not read {path} ({e}); using defaults")
+        _loaded[path] = Settings.from_dict(cfg, base_dir=os.path.dirname(path))
+    return _loaded[path]
+
+
+def parse_option_overrides(items: Optional[List[str]]) -> Dict[str, Any]:
+    """
+    Parse CLI `--option KEY=VALUE` items into an options dict.
+
+    Values are read as JSON where possible (numbers, true/false, null) and
+    kept as strings otherwise.
+    """
+    overrides: Dict[str, Any] = {}
+    for item in items or []:
+        key, sep, value = item.partition("=")
+        if not sep or not key.strip():
+            raise ValueError(f"Expected KEY=VALUE, got: {item}")
+        try:
+            overrides[key.strip()] = json.loads(value)
+        except ValueError:
+            overrides[key.strip()] = value
+    return overrides
@@ -0,0 +1,268 @@
+"""
+Hierarchical (map-reduce) summary of a video's frame analyses.
+
+Frame analyses are grouped into time windows and each window is summarized
+(map, in parallel). Window summaries are then combined into scene summaries
+(consecutive windows within `scene_s` seconds) and the scenes into one video
+summary, over as many levels as needed (reduce). Every call's prompt plus
+reply fits the model's context window, so videos of any length can be
+summarized without truncating what the model sees.
+
+Requests go through OllamaClient's response cache: a window whose frame
+analyses did not change sends the same prompt and is answered from the
+cache, and so is every scene above it whose inputs are unchanged. Re-running
+after re-analyzing part of a video only recomputes the affected windows and
+their ancestors.
+
+Usage:
+    python -m visual_analysis.src.video_summary results/video_analysis.json
+    python -m visual_analysis.src.video_summary results/video_analysis.json --window 30 --scene 180
+"""
+import sys
+import os
+import argparse
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from .analyze_image_cli import build_client
+from .ollama_client import OllamaClient, estimate_tokens, is_failed_analysis
+from .settings import load_settings, parse_option_overrides
+
+WINDOW_PROMPT = (
+    "Below are descriptions of frames from a video between {start:.2f}s and {end:.2f}s, "
+    "one per line with its timestamp.\n"
+    "Summarize this part of the video in one paragraph: the people, the setting, what "
+    "happens in order, and how the camera is used. Do not describe frames one by one.\n\n"
+    "{items}"
+)
+REDUCE_PROMPT = (
+    "Below are summaries of consecutive parts of a video between {start:.2f}s and {end:.2f}s, "
+    "in order, each with its time range.\n"
+    "Combine them into one {level} summary paragraph: the people, the settings, how the "
+    "action develops, and the camera style. Keep the order of events; drop repetition.\n\n"
+    "{items}"
+)
+
+# Tokens kept free in every call for chat formatting and estimation error
+_MARGIN_TOKENS = 128
+
+
+def _node(start: float, end: float, summary: str, frames: int, cached: bool = False,
+          failed: bool = False) -> Dict[str, Any]:
+    return {"start": round(start, 2), "end": round(end, 2), "summary": summary, "frames": frames,
+            "cached": cached, "failed": failed}
+
+
+class VideoSummarizer:
+    """Map-reduce summarizer over analyze_video results."""
+
+    def __init__(self, client: OllamaClient, context_tokens: int = 32000, summary_tokens: int = 384,
+                 window_s: float = 60.0, scene_s: float = 300.0, fan_in: int = 8, workers: int = 1,
+                 use_cache: bool = True):
+        """
+        Args:
+            client (OllamaClient): Client for the (text-only) summary requests
+            context_tokens (int): Token budget of every call, prompt plus reply
+                (config.json model.max_context_length)
+            summary_tokens (int): Max tokens of each summary
+            window_s (float): Length of the windows frame analyses are grouped into
+            scene_s (float): Windows starting within the same `scene_s` seconds form a scene
+            fan_in (int): Max summaries combined per call above the scene level
+            workers (int): Summary requests sent concurrently
+            use_cache (bool): Use the client's response cache
+        """
+        self.client = client
+        self.summary_tokens = summary_tokens
+        self.window_s = window_s
+        self.scene_s = scene_s
+        self.fan_in = max(2, fan_in)
+        self.workers = max(1, workers)
+        self.use_cache = use_cache
+        template = max(estimate_tokens(WINDOW_PROMPT), estimate_tokens(REDUCE_PROMPT))
+        # Room for the items in each prompt
+        self.input_tokens = context_tokens - summary_tokens - template - _MARGIN_TOKENS
+        if self.input_tokens < 256:
+            raise ValueError(f"Context budget of {context_tokens} tokens leaves no room for summary input "
+                             f"(summary_tokens {summary_tokens})")
+        self.calls = 0
+        self.cached_calls = 0
+
+    @staticmethod
+    def _clip(text: str, tokens: int) -> str:
+        """`text` cut to about `tokens` tokens."""
+        return text if estimate_tokens(text) <= tokens else text[:tokens * 4].rstrip() + " ..."
+
+    def _pack(self, items: List[Dict[str, Any]], key: Callable[[Dict[str, Any]], Any],
+              max_items: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """Split items (with "text") into consecutive groups with the same key that fit the input budget."""
+        groups: List[List[Dict[str, Any]]] = []
+        used = 0
+        for item in items:
+            # Plus the time range / separator each item gets in the prompt
+            cost = estimate_tokens(item["text"]) + 8
+            if (not groups or used + cost > self.input_tokens or key(item) != key(groups[-1][0])
+                    or (max_items and len(groups[-1]) >= max_items)):
+                groups.append([])
+                used = 0
+            groups[-1].append(item)
+            used += cost
+        return groups
+
+    def _generate(self, prompt: str) -> Dict[str, Any]:
+        metrics: Dict[str, Any] = {}
+        text = self.client.generate(prompt, max_tokens=self.summary_tokens, use_cache=self.use_cache,
+                                    metrics=metrics).strip()
+        return {"text": text, "cached": bool(metrics.get("cached")), "failed": is_failed_analysis(text)}
+
+    def _run(self, prompts: List[Optional[str]]) -> List[Optional[Dict[str, Any]]]:
+        """Send the prompts (None entries are skipped) `workers` at a time, in order."""
+        todo = [p for p in prompts if p is not None]
+        if self.workers > 1 and len(todo) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="summary") as pool:
+                replies = iter(list(pool.map(self._generate, todo)))
+        else:
+            replies = iter([self._generate(p) for p in todo])
+        out = []
+        for prompt in prompts:
+            reply = next(replies) if prompt is not None else None
+            if reply is not None:
+                self.calls += 1
+                self.cached_calls += reply["cached"]
+            out.append(reply)
+        return out
+
+    def _reduce(self, groups: List[List[Dict[str, Any]]], level: str) -> List[Dict[str, Any]]:
+        """One summary per group of nodes; single-node groups pass through without a call."""
+        prompts = []
+        for group in groups:
+            usable = [n for n in group if not n["failed"]]
+            if len(usable) <= 1:
+                prompts.append(None)
+                continue
+            items = "\n\n".join(f"[{n['start']:.2f}s - {n['end']:.2f}s] {n['text']}" for n in usable)
+            prompts.append(REDUCE_PROMPT.format(start=group[0]["start"], end=group[-1]["end"], level=level,
+                                                items=items))
+        nodes = []
+        for group, reply in zip(groups, self._run(prompts)):
+            frames = sum(n["frames"] for n in group)
+            if reply is None:
+                usable = [n for n in group if not n["failed"]] or group
+                nodes.append(_node(group[0]["start"], group[-1]["end"], usable[0]["summary"], frames,
+                                   cached=usable[0]["cached"], failed=usable[0]["failed"]))
+            else:
+                nodes.append(_node(group[0]["start"], group[-1]["end"], reply["text"], frames,
+                                   cached=reply["cached"], failed=reply["failed"]))
+        return nodes
+
+    def summarize(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Summarize analyze_video results.
+
+        Returns:
+            {"summary": video summary text,
+             "windows": [{"start", "end", "summary", "frames", "cached", "failed"}, ...],
+             "scenes": [...same fields...],
+             "levels": number of summary levels, "calls": requests made,
+             "cached_calls": requests answered from the cache}
+        """
+        self.calls = self.cached_calls = 0
+        # Reused (near-duplicate) frames add nothing; failed frames have nothing to add
+        frames = []
+        for r in results:
+            if r.get("reused"):
+                continue
+            text = r.get("triage") if r.get("tier") == "triage" else r.get("analysis")
+            if not text or is_failed_analysis(text):
+                continue
+            line = f"[{r['timestamp']:.2f}s] {' '.join(str(text).split())}"
+            frames.append({"start": r["timestamp"], "text": self._clip(line, self.input_tokens)})
+        if not frames:
+            return {"summary": "", "windows": [], "scenes": [], "levels": 0, "calls": 0, "cached_calls": 0}
+
+        # Map: windows of frame analyses
+        origin = frames[0]["start"]
+        groups = self._pack(frames, key=lambda f: int((f["start"] - origin) // self.window_s))
+        prompts = [WINDOW_PROMPT.format(start=g[0]["start"], end=g[-1]["start"],
+                                        items="\n".join(f["text"] for f in g)) for g in groups]
+        windows = [_node(g[0]["start"], g[-1]["start"], reply["text"], len(g), reply["cached"], reply["failed"])
+                   for g, reply in zip(groups, self._run(prompts))]
+        levels = 1
+
+        # Any two summaries fit in one call, so every level shrinks
+        def as_items(nodes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            return [dict(n, text=self._clip(n["summary"], self.input_tokens // 2 - 16)) for n in nodes]
+
+        # Reduce: scenes, then the whole video
+        scene_of = lambda n: int((n["start"] - origin) // self.scene_s)  # noqa: E731
+        scenes = self._reduce(self._pack(as_items(windows), key=scene_of), "scene")
+        nodes = scenes
+        if len(scenes) < len(windows):
+            levels += 1
+        while len(nodes) > 1:
+            nodes = self._reduce(self._pack(as_items(nodes), key=lambda n: None, max_items=self.fan_in),
+                                 "whole-video" if len(nodes) <= self.fan_in else "part")
+            levels += 1
+        return {"summary": nodes[0]["summary"], "windows": windows, "scenes": scenes, "levels": levels,
+                "calls": self.calls, "cached_calls": self.cached_calls}
+
+
+def print_summary(summary: Dict[str, Any]):
+    """Print scene and video summaries."""
+    print("\n" + "=" * 70)
+    print("VIDEO SUMMARY")
+    print("=" * 70)
+    if len(summary["scenes"]) > 1:
+        for scene in summary["scenes"]:
+            print(f"\n--- Scene {scene['start']:.2f}-{scene['end']:.2f}s ({scene['frames']} frames) ---")
+            print(scene["summary"])
+        print("\n--- Whole video ---")
+    print(summary["summary"])
+    print(f"\n✓ Summary: {len(summary['windows'])} windows, {len(summary['scenes'])} scenes, "
+          f"{summary['levels']} levels, {summary['calls']} requests ({summary['cached_calls']} from cache)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize a video analysis (analyze_video_cli output) '
+                                                 'window by window, then by scene and for the whole video')
+    parser.add_argument('results', help='Analysis JSON written by analyze_video_cli')
+    parser.add_argument('--window', type=float, default=60.0, help='Window length in seconds (default: 60)')
+    parser.add_argument('--scene', type=float, default=300.0, help='Scene length in seconds (default: 300)')
+    parser.add_argument('--summary-tokens', type=int, default=384, help='Max tokens per summary (default: 384)')
+    parser.add_argument('--workers', type=int, default=1, help='Summary requests sent concurrently (default: 1)')
+    parser.add_argument('--model', default=None, help='Model name (default: from config.json)')
+    parser.add_argument('--host', action='append', default=None, metavar='URL',
+                        help='Ollama endpoint; repeatable (default: ollama.endpoints from config.json)')
+    parser.add_argument('--option', action='append', default=None, metavar='KEY=VALUE',
+                        help='Override an Ollama option from config.json model.parameters (repeatable)')
+    parser.add_argument('--no-cache', action='store_true', help='Ignore and do not update the result cache')
+    parser.add_argument('--output', default=None, help='Output JSON path (default: <results>_summary.json)')
+    args = parser.parse_args()
+    try:
+        options = parse_option_overrides(args.option)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if not os.path.exists(args.results):
+        print(f"Error: Results not found: {args.results}")
+        sys.exit(1)
+    with open(args.results, 'r', encoding='utf-8') as f:
+        results = json.load(f)
+
+    settings = load_settings()
+    client = build_client(settings, args.model, use_cache=not args.no_cache, options=options, base_url=args.host)
+    summarizer = VideoSummarizer(client, context_tokens=settings.max_context_length or 32000,
+                                 summary_tokens=args.summary_tokens, window_s=args.window, scene_s=args.scene,
+                                 workers=args.workers, use_cache=not args.no_cache)
+    print(f"Summarizing {len(results)} frame analyses from {args.results}...")
+    summary = summarizer.summarize(results)
+    print_summary(summary)
+
+    output = args.output or os.path.splitext(args.results)[0] + "_summary.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    print(f"✓ Summary saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+"""pytest setup: make `visual_analysis` importable and skip the manual scripts."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Manual scripts that call a running Ollama model at import time
+collect_ignore = ["test_quick.py", "test_detailed.py", "test_advance_prompt.py", "test_ollama_frame.py"]
@@ -0,0 +1,35 @@
+"""Tests for choosing adaptive sample frames from shots."""
+from visual_analysis.src.analyze_video_cli import VideoAnalyzer
+
+plan = VideoAnalyzer.plan_adaptive_samples
+
+
+def test_no_shots():
+    assert plan([], fps=30.0) == []
+
+
+def test_one_frame_per_short_shot_at_its_middle():
+    shots = [(0, 90), (90, 150), (150, 300)]
+    assert plan(shots, fps=30.0, max_per_minute=60) == [45, 120, 225]
+
+
+def test_long_shot_gets_evenly_spaced_frames():
+    # 30 s shot with a 10 s max gap: three frames at 1/6, 3/6 and 5/6
+    assert plan([(0, 900)], fps=30.0, max_per_minute=60) == [150, 450, 750]
+
+
+def test_budget_keeps_longest_shots_first():
+    # 20 s of footage at 6 frames/min -> budget of 2 frames for 4 shots
+    shots = [(0, 60), (60, 300), (300, 360), (360, 600)]
+    assert plan(shots, fps=30.0, max_per_minute=6) == [180, 480]
+
+
+def test_budget_prefers_first_frames_over_extra_ones():
+    # 34 s at 5 frames/min -> budget of 3: the long shot's extra frames are dropped
+    shots = [(0, 900), (900, 960), (960, 1020)]
+    assert plan(shots, fps=30.0, max_per_minute=5) == [150, 930, 990]
+    assert plan(shots, fps=30.0, max_per_minute=6) == [150, 450, 930, 990]
+
+
+def test_at_least_one_frame():
+    assert plan([(0, 10)], fps=30.0, max_per_minute=0.1) == [5]
@@ -0,0 +1,65 @@
+"""Tests for splitting batched replies and the batch token budget."""
+from visual_analysis.src.analyze_video_cli import VideoAnalyzer
+from visual_analysis.src.ollama_client import split_batch_response
+
+
+def test_json_array_is_reordered_by_image():
+    text = ('```json\n[{"image": 2, "analysis": "A car."}, {"image": 1, "analysis": "A street."}]\n```')
+    assert split_batch_response(text, 2) == ["A street.", "A car."]
+
+
+def test_non_string_analysis_is_kept_as_json():
+    text = '[{"image": 1, "analysis": {"objects": ["tree"]}}]'
+    assert split_batch_response(text, 1) == ['{"objects": ["tree"]}']
+
+
+def test_plain_text_sections_fallback():
+    text = "Image 1: A street at night.\n\n**Frame 2** - A car turns left.\nIt is raining."
+    assert split_batch_response(text, 2) == ["A street at night.", "A car turns left.\nIt is raining."]
+
+
+def test_wrong_count_falls_back_to_sections():
+    text = 'Image 1: a street [1]\nImage 2: a car [2]'
+    assert split_batch_response(text, 2) == ["a street [1]", "a car [2]"]
+
+
+def test_unsplittable_reply_returns_none():
+    assert split_batch_response("A street and then a car.", 2) is None
+    assert split_batch_response("Image 1: a\nImage 3: b", 2) is None
+    assert split_batch_response('[{"image": 1, "analysis": "a"}]', 2) is None
+
+
+class _Settings:
+    max_context_length = 32000
+
+
+class _Client:
+    max_visual_tokens = 1280
+    visual_token_pixels = 32
+
+    def __init__(self):
+        self.max_tokens = None
+
+    def generate_batch(self, prompt, frames, max_tokens=None, metrics=None):
+        self.max_tokens = max_tokens
+        return [""] * len(frames)
+
+
+def _analyzer():
+    analyzer = VideoAnalyzer.__new__(VideoAnalyzer)
+    analyzer.settings = _Settings()
+    analyzer.ollama = _Client()
+    analyzer.max_new_tokens = 3000
+    analyzer.max_image_side = 1280
+    return analyzer
+
+
+def test_batch_reply_budget_fits_context():
+    analyzer = _analyzer()
+    batch = analyzer.max_batch_size()
+    assert batch >= 2
+    image_tokens = analyzer._image_tokens()
+    analyzer.analyze_frames([None] * batch, timestamps=[float(i) for i in range(batch)])
+    assert analyzer.ollama.max_tokens + batch * image_tokens < _Settings.max_context_length
+    # One more frame would not leave every frame its full reply
+    assert (batch + 1) * (image_tokens + analyzer.max_new_tokens) > _Settings.max_context_length - 128
@@ -0,0 +1,36 @@
+"""Tests for video checkpoint loading and the resumed-frame timing summary."""
+import json
+
+from visual_analysis.src.analyze_video_cli import load_checkpoint, summarize_metrics
+
+
+def _write(path, records, tail=""):
+    path.write_text("".join(json.dumps(r) + "\n" for r in records) + tail, encoding="utf-8")
+
+
+def test_truncated_last_line_and_failures_are_dropped(tmp_path):
+    checkpoint = tmp_path / "video.jsonl"
+    _write(checkpoint, [
+        {"frame_number": 1, "timestamp": 0.0, "analysis": "A street."},
+        {"frame_number": 2, "timestamp": 1.0, "analysis": "<error> HTTP 500"},
+        {"frame_number": 3, "timestamp": 2.004, "analysis": "A car."},
+    ], tail='{"timestamp": 3.0, "analy')
+    done = load_checkpoint(str(checkpoint))
+    assert sorted(done) == [0.0, 2.0]
+    assert "frame_number" not in done[0.0]
+    assert all(r["resumed"] for r in done.values())
+
+
+def test_missing_checkpoint(tmp_path):
+    assert load_checkpoint(str(tmp_path / "none.jsonl")) == {}
+
+
+def test_resumed_frames_not_counted_as_requests(tmp_path):
+    checkpoint = tmp_path / "video.jsonl"
+    _write(checkpoint, [{"timestamp": 0.0, "analysis": "A street.", "metrics": {"total_s": 9.0}}])
+    resumed = list(load_checkpoint(str(checkpoint)).values())
+    new = [{"timestamp": 1.0, "analysis": "A car.", "metrics": {"total_s": 1.0}},
+           {"timestamp": 2.0, "analysis": "A bus.", "metrics": {"total_s": 1.0, "cached": True}}]
+    summary = summarize_metrics(resumed + new)
+    assert summary["requests"] == 1
+    assert summary["total_s"]["p95"] == 1.0
@@ -0,0 +1,59 @@
+"""Tests for the adaptive concurrency limiter."""
+from visual_analysis.src.concurrency import AdaptiveLimiter
+
+
+def _round(limiter, overhead=0.01, failed=False):
+    """Fill every slot, then release them all with the same outcome."""
+    tickets = [limiter.acquire(timeout=0) for _ in range(limiter.limit)]
+    assert None not in tickets
+    for ticket in tickets:
+        limiter.release(ticket, overhead=None if failed else overhead, failed=failed)
+
+
+def test_raises_after_clean_saturated_round():
+    limiter = AdaptiveLimiter(initial=2, max_limit=4)
+    _round(limiter)
+    assert limiter.limit == 3
+    _round(limiter)
+    _round(limiter)
+    assert limiter.limit == 4  # capped at max_limit
+    assert limiter.stats()["increases"] == 2
+
+
+def test_does_not_raise_when_not_saturated():
+    limiter = AdaptiveLimiter(initial=3)
+    for _ in range(10):
+        limiter.release(limiter.acquire(timeout=0), overhead=0.01)
+    assert limiter.limit == 3
+
+
+def test_failure_halves_limit():
+    limiter = AdaptiveLimiter(initial=8, min_limit=1, max_limit=8)
+    limiter.release(limiter.acquire(timeout=0), failed=True)
+    assert limiter.limit == 4
+    assert limiter.stats()["decreases"] == 1
+
+
+def test_sustained_overhead_halves_limit_once_per_epoch():
+    limiter = AdaptiveLimiter(initial=4, max_limit=8)
+    limiter.release(limiter.acquire(timeout=0), overhead=0.01)
+    # Requests sent before the cut don't cut again
+    tickets = [limiter.acquire(timeout=0) for _ in range(3)]
+    for ticket in tickets:
+        limiter.release(ticket, overhead=2.0)
+    assert limiter.limit == 2
+    assert limiter.stats()["decreases"] == 1
+
+
+def test_limit_never_below_min():
+    limiter = AdaptiveLimiter(initial=2, min_limit=2)
+    limiter.release(limiter.acquire(timeout=0), failed=True)
+    assert limiter.limit == 2
+
+
+def test_acquire_times_out_when_full():
+    limiter = AdaptiveLimiter(initial=1)
+    ticket = limiter.acquire(timeout=0)
+    assert limiter.acquire(timeout=0.01) is None
+    limiter.release(ticket)
+    assert limiter.acquire(timeout=0) is not None
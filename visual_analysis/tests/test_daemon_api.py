@@ -0,0 +1,97 @@
+"""Tests for the analysis daemon's HTTP API (with a stand-in daemon, no model)."""
+import http.client
+import json
+import os
+import threading
+from http.server import ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from visual_analysis.src.analysis_daemon import AnalysisDaemon, resolve_output
+from visual_analysis.src.analyze_image_cli import RESULTS_DIR
+from visual_analysis.src.job_queue import JobQueue
+
+
+@pytest.fixture
+def api(tmp_path):
+    image = tmp_path / "a.png"
+    image.write_bytes(b"png")
+    daemon = SimpleNamespace(jobs=JobQueue(str(tmp_path / "jobs.sqlite")), current=None,
+                             analyzer=SimpleNamespace(model_name="test"),
+                             allowed_hosts={"localhost", "127.0.0.1", "::1"})
+    daemon.validate = lambda kind, path, params: AnalysisDaemon.validate(daemon, kind, path, params)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), AnalysisDaemon._handler_class(daemon))
+    threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    def call(method, path, body=None, headers=None):
+        conn = http.client.HTTPConnection(*httpd.server_address[:2], timeout=5)
+        data = body if isinstance(body, (bytes, type(None))) else json.dumps(body).encode("utf-8")
+        conn.request(method, path, body=data,
+                     headers={"Content-Type": "application/json", **(headers or {})})
+        r = conn.getresponse()
+        result = r.status, json.loads(r.read())
+        conn.close()
+        return result
+
+    yield call, str(image)
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_submit_json(api):
+    call, image = api
+    status, job = call("POST", "/jobs", {"kind": "image", "path": image, "params": {"output": "a.json"}})
+    assert status == 201 and job["params"] == {"output": "a.json"}
+
+
+def test_rejects_non_json_content_type(api):
+    call, image = api
+    body = json.dumps({"kind": "image", "path": image}).encode("utf-8")
+    status, reply = call("POST", "/jobs", body, headers={"Content-Type": "text/plain"})
+    assert status == 415
+
+
+def test_rejects_foreign_host(api):
+    call, image = api
+    status, _ = call("GET", "/jobs", headers={"Host": "attacker.example:8765"})
+    assert status == 403
+    status, _ = call("POST", "/jobs", {"kind": "image", "path": image}, headers={"Host": "attacker.example"})
+    assert status == 403
+    assert call("GET", "/", headers={"Host": "localhost:8765"})[0] == 200
+
+
+@pytest.mark.parametrize("output", ["../escape.json", "/tmp/escape.json", "", 5])
+def test_rejects_output_outside_results(api, output):
+    call, image = api
+    status, reply = call("POST", "/jobs", {"kind": "image", "path": image, "params": {"output": output}})
+    assert status == 400 and "output" in reply["error"]
+
+
+def test_resolve_output():
+    root = os.path.realpath(RESULTS_DIR)
+    assert resolve_output("sub/a.json") == os.path.join(root, "sub", "a.json")
+    assert resolve_output(os.path.join(root, "a.json")) == os.path.join(root, "a.json")
+    assert resolve_output("../a.json") is None
+    assert resolve_output(".") is None
+
+
+@pytest.mark.parametrize("body, error", [
+    ({"kind": "image", "path": "a.png", "priority": "x"}, "priority"),
+    ({"kind": "image", "path": "a.png", "params": ["output"]}, "params"),
+    (["kind", "image"], "JSON object"),
+    ({"kind": "image", "path": ["a.png"]}, "path"),
+])
+def test_invalid_submissions_get_400(api, body, error):
+    call, image = api
+    if isinstance(body, dict) and body.get("path") == "a.png":
+        body["path"] = image
+    status, reply = call("POST", "/jobs", body)
+    assert status == 400 and error in reply["error"]
+
+
+@pytest.mark.parametrize("query", ["?limit=abc", "?limit=0"])
+def test_invalid_limit_gets_400(api, query):
+    call, _ = api
+    status, reply = call("GET", "/jobs" + query)
+    assert status == 400 and "limit" in reply["error"]
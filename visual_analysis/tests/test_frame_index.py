@@ -0,0 +1,90 @@
+"""Tests for the frame index sidecar on synthetic indexes and a tiny video."""
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+from visual_analysis.src.frame_index import FrameIndex, _signature, build_frame_index, index_path
+from visual_analysis.src.frame_similarity import FrameDeduplicator
+
+
+def _frame(value, stripe=None):
+    frame = np.full((72, 128, 3), value, dtype=np.uint8)
+    if stripe is not None:
+        frame[:, stripe:stripe + 16] = 255 - value
+    return frame
+
+
+def _index(frames, pts):
+    signatures = [_signature(f) for f in frames]
+    return FrameIndex(np.array(pts, dtype=np.float64), np.array([0], dtype=np.int64),
+                      np.array([s[0] for s in signatures], dtype=np.uint64),
+                      np.array([s[1] for s in signatures], dtype=np.uint8), 128, 72)
+
+
+def test_frame_at_variable_frame_rate():
+    index = _index([_frame(0)] * 5, [0.0, 0.04, 0.1, 0.5, 0.52])
+    assert index.frame_at(0.0) == 0
+    assert index.frame_at(0.1) == 2
+    assert index.frame_at(0.1000001) == 2  # float error in computed timestamps
+    assert index.frame_at(0.2) == 3
+    assert index.frame_at(9.0) == len(index)
+    assert index.nearest_frame(0.2) == 2
+    assert index.nearest_frame(9.0) == 4
+
+
+def test_plan_dedup_matches_frame_deduplicator():
+    frames = [_frame(40), _frame(40), _frame(41), _frame(40, stripe=20), _frame(40, stripe=20), _frame(200)]
+    index = _index(frames, [i / 30 for i in range(len(frames))])
+    duplicates = index.plan_dedup(list(range(len(frames))), 0.95)
+    assert sorted(duplicates) == [1, 2, 4]
+    assert duplicates[2][0] == 0 and duplicates[4][0] == 3
+
+    deduplicator = FrameDeduplicator(0.95)
+    live = [i for i, f in enumerate(frames) if deduplicator.check(f) is not None]
+    assert live == sorted(duplicates)
+
+
+def _video(tmp_path):
+    video = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*"MJPG"), 10, (128, 72))
+    for value in (0, 0, 120, 120):
+        writer.write(_frame(value))
+    writer.release()
+    return video
+
+
+def test_opencv_scan_leaves_keyframes_unknown(tmp_path, monkeypatch):
+    video = _video(tmp_path)
+    monkeypatch.setitem(sys.modules, "av", None)  # import av raises ImportError
+    index = build_frame_index(video, save=False, show_progress=False)
+    assert len(index) == 4
+    assert len(index.keyframes) == 0
+    assert index.keyframe_before(3) is None
+    assert np.allclose(index.pts, [0.0, 0.1, 0.2, 0.3])
+
+
+def test_index_survives_unwritable_sidecar(tmp_path, monkeypatch, capsys):
+    video = _video(tmp_path)
+
+    def fail(self, path):
+        raise PermissionError(13, "Permission denied", path)
+
+    monkeypatch.setattr(FrameIndex, "save", fail)
+    index = build_frame_index(video, show_progress=False)
+    assert len(index) == 4
+    assert not os.path.exists(index_path(video))
+    assert "could not save frame index" in capsys.readouterr().out
+
+
+def test_failed_save_leaves_no_partial_file(tmp_path):
+    index = _index([_frame(0)], [0.0])
+    target = tmp_path / "missing" / "clip.mp4.frames.npz"
+    with pytest.raises(OSError):
+        index.save(str(target))
+    assert not (tmp_path / "missing").exists()
+    index.save(str(tmp_path / "clip.mp4.frames.npz"))
+    loaded = FrameIndex.load(str(tmp_path / "clip.mp4.frames.npz"))
+    assert loaded.frame_at(0.0) == 0 and loaded.hashes[0] == index.hashes[0]
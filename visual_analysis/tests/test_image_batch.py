@@ -0,0 +1,41 @@
+"""Tests for batch-mode bookkeeping in analyze_image_cli."""
+import json
+import os
+
+from visual_analysis.src import analyze_image_cli
+from visual_analysis.src.analyze_image_cli import has_single_result, load_done, result_path_for
+from visual_analysis.src.ollama_client import is_failed_analysis
+
+
+def test_error_markers():
+    assert is_failed_analysis("<error> HTTP 500")
+    assert is_failed_analysis("<json-parse-error> Expecting value: line 1")
+    assert is_failed_analysis("<ollama-cli-error> not found")
+    # A valid reply that merely mentions a marker is not a failure
+    assert not is_failed_analysis("The screen shows the text <error> in red.")
+
+
+def test_load_done_skips_failures(tmp_path):
+    output = tmp_path / "batch.jsonl"
+    records = [
+        {"image": "/data/ok.png", "analysis": "A cat on a sofa; the TV shows <error>."},
+        {"image": "/data/http.png", "analysis": "<error> HTTP 500"},
+        {"image": "/data/json.png", "analysis": "<json-parse-error> bad reply"},
+    ]
+    output.write_text("\n".join(json.dumps(r) for r in records) + "\n{truncated", encoding="utf-8")
+    assert load_done(str(output)) == {"/data/ok.png"}
+
+
+def test_single_result_must_match_the_image(tmp_path, monkeypatch):
+    monkeypatch.setattr(analyze_image_cli, "RESULTS_DIR", str(tmp_path / "results"))
+    os.makedirs(analyze_image_cli.RESULTS_DIR)
+    first, second = tmp_path / "a" / "img.jpg", tmp_path / "b" / "img.jpg"
+    assert result_path_for(str(first)) == result_path_for(str(second))
+    with open(result_path_for(str(first)), "w", encoding="utf-8") as f:
+        json.dump({"image": str(first), "analysis": "A cat."}, f)
+    assert has_single_result(str(first))
+    assert not has_single_result(str(second))
+
+    with open(result_path_for(str(first)), "w", encoding="utf-8") as f:
+        json.dump({"image": str(first), "analysis": "<error> HTTP 500"}, f)
+    assert not has_single_result(str(first))
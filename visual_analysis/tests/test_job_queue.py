@@ -0,0 +1,37 @@
+"""Tests for the analysis daemon's persistent job queue."""
+from visual_analysis.src.job_queue import JobQueue
+
+
+def test_priority_then_submission_order(tmp_path):
+    jobs = JobQueue(str(tmp_path / "jobs.sqlite"))
+    first = jobs.submit("image", "a.png")
+    urgent = jobs.submit("image", "b.png", priority=5)
+    second = jobs.submit("image", "c.png")
+    assert [jobs.next(timeout=0)["id"] for _ in range(3)] == [urgent["id"], first["id"], second["id"]]
+    assert jobs.next(timeout=0) is None
+
+
+def test_interrupted_video_job_resumes_after_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    jobs = JobQueue(path)
+    video = jobs.submit("video", "v.mp4", {"frame_interval": 15})
+    image = jobs.submit("image", "a.png")
+    jobs.next(timeout=0)
+    jobs.next(timeout=0)
+    jobs.close()
+
+    jobs = JobQueue(path)
+    requeued = jobs.get(video["id"])
+    assert requeued["status"] == "queued"
+    assert requeued["params"] == {"frame_interval": 15, "resume": True}
+    assert jobs.get(image["id"])["params"] == {}
+
+
+def test_cancel_queued_and_running(tmp_path):
+    jobs = JobQueue(str(tmp_path / "jobs.sqlite"))
+    running = jobs.submit("video", "v.mp4")
+    queued = jobs.submit("video", "w.mp4")
+    jobs.next(timeout=0)
+    assert jobs.cancel(queued["id"])["status"] == "cancelled"
+    flagged = jobs.cancel(running["id"])
+    assert flagged["status"] == "running" and flagged["cancel_requested"]
@@ -0,0 +1,58 @@
+"""Tests for the on-disk response cache."""
+import itertools
+
+import pytest
+
+from visual_analysis.src import result_cache
+from visual_analysis.src.result_cache import ResultCache, cache_key
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # A strictly increasing clock so access order is unambiguous
+    clock = itertools.count(1)
+    monkeypatch.setattr(result_cache.time, "time", lambda: float(next(clock)))
+    cache = ResultCache(str(tmp_path / "cache" / "results.sqlite"), max_bytes=300)
+    yield cache
+    cache.close()
+
+
+def test_get_and_put(cache):
+    assert cache.get("a") is None
+    cache.put("a", "héllo")
+    assert cache.get("a") == "héllo"
+    assert cache.stats() == {"entries": 1, "bytes": 6, "hits": 1, "misses": 1}
+
+
+def test_evicts_least_recently_used_by_size(cache):
+    for key in "abc":
+        cache.put(key, key * 100)
+    cache.get("a")  # "b" is now the least recently used
+    cache.put("d", "d" * 100)
+    assert cache.get("b") is None
+    assert [cache.get(k) is not None for k in "acd"] == [True, True, True]
+    assert cache.stats()["bytes"] == 300
+
+
+def test_large_entry_evicts_several(cache):
+    for key in "abc":
+        cache.put(key, key * 100)
+    cache.put("big", "x" * 250)
+    assert [cache.get(k) for k in "abc"] == [None, None, None]
+    assert cache.get("big") == "x" * 250
+
+
+def test_replacing_entry_counts_its_new_size(cache):
+    cache.put("a", "a" * 100)
+    cache.put("b", "b" * 100)
+    cache.put("a", "a" * 200)
+    assert cache.stats()["bytes"] == 300
+    assert cache.get("b") is not None
+
+
+def test_cache_key_covers_images_and_options():
+    base = cache_key("m", "p", ["aW1n"], {"temperature": 0.7})
+    assert base == cache_key("m", "p", ["aW1n"], {"temperature": 0.7})
+    assert base != cache_key("m", "p", ["aW1o"], {"temperature": 0.7})
+    assert base != cache_key("m", "p", ["aW1n"], {"temperature": 0.2})
+    assert base != cache_key("m", "p", ["aW1n", "aW1n"], {"temperature": 0.7})